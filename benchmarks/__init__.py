@@ -0,0 +1,5 @@
+"""
+Benchmarks of the paths a deployment spends its time in.
+
+Run them with `python -m benchmarks.run`.
+"""
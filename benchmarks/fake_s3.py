@@ -0,0 +1,291 @@
+"""
+Defines an in-process stand-in for Amazon S3.
+
+The FakeS3 class answers the requests of real boto3 clients before they
+are sent, so that benchmarks exercise the same request signing, transfer
+and parsing code as a real deployment without touching the network.
+Objects are kept in memory as their size and ETag only; their content
+is read and hashed, as S3 would, and then discarded.
+"""
+
+from datetime import datetime, timezone
+import hashlib
+import itertools
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+
+class FakeRawResponse:
+
+    def __init__(self, content):
+        self.content = content
+
+    def stream(self, **kwargs):
+        yield self.content
+
+
+class FakeS3:
+
+    def __init__(self, latency=0.0, capacity=None):
+        """
+        Each request takes at least latency seconds, to imitate the
+        round trip to S3. If capacity is given, requests beyond that
+        many at the same time are throttled with a 503 SlowDown error.
+        """
+        self.latency = latency
+        self.capacity = capacity
+        self.objects = {}
+        self.request_count = 0
+        self.throttled_count = 0
+        self._active_requests = 0
+        self._upload_ids = itertools.count(1)
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def client(self, max_pool_connections=10):
+        """
+        Returns an S3 client whose requests are answered by this object.
+        """
+        session = boto3.session.Session(
+            aws_access_key_id='benchmark',
+            aws_secret_access_key='benchmark',
+            region_name='us-east-1'
+        )
+        client = session.client(
+            's3',
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                s3={'addressing_style': 'path'},
+                request_checksum_calculation='when_required',
+                response_checksum_validation='when_required'
+            )
+        )
+        client.meta.events.register('before-send.s3', self._handle)
+        return client
+
+    def _handle(self, request, **kwargs):
+        with self._lock:
+            self._active_requests += 1
+            throttled = (
+                self.capacity is not None
+                and self._active_requests > self.capacity
+            )
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if throttled:
+                with self._lock:
+                    self.throttled_count += 1
+                return self._response(request, ''.join([
+                    '<Error><Code>SlowDown</Code>',
+                    '<Message>Please reduce your request rate.</Message>',
+                    '</Error>',
+                ]), status_code=503)
+            return self._answer(request)
+        finally:
+            with self._lock:
+                self._active_requests -= 1
+
+    def _answer(self, request):
+        url = urlsplit(request.url)
+        _, bucket, key = (url.path.split('/', 2) + [''])[:3]
+        key = unquote(key)
+        query = parse_qs(url.query, keep_blank_values=True)
+        body = request.body
+        if hasattr(body, 'read'):
+            body = body.read()
+        body = body or b''
+        with self._lock:
+            self.request_count += 1
+        if request.method == 'PUT' and 'partNumber' in query:
+            return self._upload_part(request, query, body)
+        if request.method == 'PUT':
+            etag = hashlib.md5(body).hexdigest()
+            with self._lock:
+                self.objects[key] = (len(body), etag)
+            return self._response(request, headers={'ETag': f'"{etag}"'})
+        if request.method == 'POST' and 'uploads' in query:
+            with self._lock:
+                upload_id = f'upload-{next(self._upload_ids)}'
+                self._uploads[upload_id] = {
+                    'key': key,
+                    'initiated': datetime.now(timezone.utc),
+                    'parts': {},
+                }
+            return self._response(request, ''.join([
+                '<InitiateMultipartUploadResult>',
+                f'<Bucket>{escape(bucket)}</Bucket>',
+                f'<Key>{escape(key)}</Key>',
+                f'<UploadId>{upload_id}</UploadId>',
+                '</InitiateMultipartUploadResult>',
+            ]))
+        if 'uploadId' in query and query['uploadId'][0] not in self._uploads:
+            return self._response(
+                request,
+                '<Error><Code>NoSuchUpload</Code></Error>',
+                status_code=404
+            )
+        if request.method == 'POST' and 'uploadId' in query:
+            return self._complete_upload(request, query, bucket, key)
+        if request.method == 'DELETE' and 'uploadId' in query:
+            with self._lock:
+                self._uploads.pop(query['uploadId'][0], None)
+            return self._response(request, status_code=204)
+        if request.method == 'GET' and 'uploadId' in query:
+            return self._list_parts(request, query, bucket, key)
+        if request.method == 'GET' and 'uploads' in query:
+            return self._list_uploads(request, bucket)
+        if request.method == 'GET' and 'list-type' in query:
+            return self._list_objects(request, query, bucket)
+        return self._response(request, status_code=501)
+
+    def _upload_part(self, request, query, body):
+        upload_id = query['uploadId'][0]
+        part_number = int(query['partNumber'][0])
+        digest = hashlib.md5(body).digest()
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                return self._response(
+                    request,
+                    '<Error><Code>NoSuchUpload</Code></Error>',
+                    status_code=404
+                )
+            upload['parts'][part_number] = (len(body), digest)
+        return self._response(
+            request,
+            headers={'ETag': f'"{digest.hex()}"'}
+        )
+
+    def _complete_upload(self, request, query, bucket, key):
+        with self._lock:
+            parts = self._uploads.pop(query['uploadId'][0])['parts']
+            digests = b''.join(
+                digest for _, digest in
+                (parts[number] for number in sorted(parts))
+            )
+            etag = f'{hashlib.md5(digests).hexdigest()}-{len(parts)}'
+            self.objects[key] = (
+                sum(size for size, _ in parts.values()),
+                etag
+            )
+        return self._response(request, ''.join([
+            '<CompleteMultipartUploadResult>',
+            f'<Bucket>{escape(bucket)}</Bucket>',
+            f'<Key>{escape(key)}</Key>',
+            f'<ETag>"{etag}"</ETag>',
+            '</CompleteMultipartUploadResult>',
+        ]))
+
+    def _list_parts(self, request, query, bucket, key):
+        with self._lock:
+            parts = dict(self._uploads[query['uploadId'][0]]['parts'])
+        return self._response(request, ''.join([
+            '<ListPartsResult>',
+            f'<Bucket>{escape(bucket)}</Bucket>',
+            f'<Key>{escape(key)}</Key>',
+            f"<UploadId>{escape(query['uploadId'][0])}</UploadId>",
+            '<IsTruncated>false</IsTruncated>',
+            *(
+                ''.join([
+                    '<Part>',
+                    f'<PartNumber>{number}</PartNumber>',
+                    f'<ETag>"{parts[number][1].hex()}"</ETag>',
+                    f'<Size>{parts[number][0]}</Size>',
+                    '</Part>',
+                ])
+                for number in sorted(parts)
+            ),
+            '</ListPartsResult>',
+        ]))
+
+    def _list_uploads(self, request, bucket):
+        with self._lock:
+            uploads = [
+                (upload_id, upload['key'], upload['initiated'])
+                for upload_id, upload in self._uploads.items()
+            ]
+        return self._response(request, ''.join([
+            '<ListMultipartUploadsResult>',
+            f'<Bucket>{escape(bucket)}</Bucket>',
+            '<IsTruncated>false</IsTruncated>',
+            *(
+                ''.join([
+                    '<Upload>',
+                    f'<Key>{escape(key)}</Key>',
+                    f'<UploadId>{upload_id}</UploadId>',
+                    f'<Initiated>{initiated.isoformat()}</Initiated>',
+                    '</Upload>',
+                ])
+                for upload_id, key, initiated in uploads
+            ),
+            '</ListMultipartUploadsResult>',
+        ]))
+
+    def _list_objects(self, request, query, bucket):
+        prefix = query.get('prefix', [''])[0]
+        delimiter = query.get('delimiter', [''])[0]
+        start_after = query.get('continuation-token', [''])[0]
+        max_keys = int(query.get('max-keys', ['1000'])[0])
+        # Keys that contain the delimiter after the prefix are rolled up
+        # into a common prefix, which counts as a single entry.
+        entries = {}
+        with self._lock:
+            for key, entry in self.objects.items():
+                if not key.startswith(prefix):
+                    continue
+                if delimiter and delimiter in key[len(prefix):]:
+                    end = key.index(delimiter, len(prefix)) + len(delimiter)
+                    key, entry = key[:end], None
+                if key > start_after:
+                    entries[key] = entry
+        names = sorted(entries)
+        page = [(name, entries[name]) for name in names[:max_keys]]
+        truncated = len(names) > max_keys
+        contents = []
+        for name, entry in page:
+            if entry is None:
+                contents.extend([
+                    '<CommonPrefixes>',
+                    f'<Prefix>{escape(name)}</Prefix>',
+                    '</CommonPrefixes>',
+                ])
+            else:
+                contents.extend([
+                    '<Contents>',
+                    f'<Key>{escape(name)}</Key>',
+                    f'<Size>{entry[0]}</Size>',
+                    f'<ETag>"{entry[1]}"</ETag>',
+                    '</Contents>',
+                ])
+        next_token = ''
+        if truncated:
+            next_token = (
+                f'<NextContinuationToken>{escape(page[-1][0])}'
+                '</NextContinuationToken>'
+            )
+        return self._response(request, ''.join([
+            '<ListBucketResult>',
+            f'<Name>{escape(bucket)}</Name>',
+            f'<Prefix>{escape(prefix)}</Prefix>',
+            f'<KeyCount>{len(page)}</KeyCount>',
+            f'<MaxKeys>{max_keys}</MaxKeys>',
+            f'<IsTruncated>{str(truncated).lower()}</IsTruncated>',
+            *contents,
+            next_token,
+            '</ListBucketResult>',
+        ]))
+
+    def _response(self, request, body='', status_code=200, headers=None):
+        return AWSResponse(
+            request.url,
+            status_code,
+            headers or {},
+            FakeRawResponse(body.encode())
+        )
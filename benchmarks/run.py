@@ -0,0 +1,343 @@
+"""
+Runs the benchmarks and compares the results with a baseline.
+
+The benchmarks measure the walk of the source tree, the upload of
+every file to an in-process stand-in for S3, with the uploader
+configured as a deployment configures it, and the listing of a bucket
+that holds every file, for synthetic trees of each requested size, the
+synthesis of the CloudFormation template and the startup of the
+command-line tool. Results are written as JSON, and
+the command fails if any benchmark is slower than the baseline by more
+than the tolerance:
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --output results.json
+
+Pass --update-baseline to store the results as the new baseline.
+Timings depend on the machine, so a baseline should be recorded on the
+machine it is compared on.
+"""
+
+import argparse
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from troposphere import Template
+
+import definitions
+from benchmarks import fake_s3, trees
+from src import concurrency, listing, multipart, progress, upload, walker
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = ROOT_DIR / 'benchmarks' / 'baseline.json'
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# The range of upload concurrency, the defaults of the settings of the
+# same names.
+MIN_UPLOAD_CONCURRENCY = 2
+MAX_UPLOAD_CONCURRENCY = 64
+
+# How much slower than the baseline a benchmark may be, as a fraction.
+DEFAULT_TOLERANCE = 0.3
+
+# The ETag of the objects in the bucket that is listed; only the
+# number of objects matters.
+EMPTY_ETAG = 'd41d8cd98f00b204e9800998ecf8427e'
+
+
+def benchmark_walk(tree_directory, repeat=3):
+    """
+    Returns the fastest time taken to list every file in the tree.
+    """
+    timings = []
+    for _ in range(repeat):
+        source_walker = walker.SourceTreeWalker(
+            tree_directory,
+            ignore_patterns=[trees.DESCRIPTION_FILE]
+        )
+        start = time.perf_counter()
+        count = sum(1 for _ in source_walker.walk())
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    return {'seconds': seconds, 'files_per_second': count / seconds}
+
+
+def benchmark_upload(tree_directory, total_size, max_workers=10,
+                     latency=0.0):
+    """
+    Returns the time taken to upload every file in the tree to the
+    stand-in for S3.
+
+    The uploader reports its progress, adapts its concurrency and
+    records multipart uploads in a journal, as it does in a deployment.
+    """
+    s3 = fake_s3.FakeS3(latency=latency)
+    limiter = concurrency.AdaptiveConcurrencyLimiter(
+        max_workers,
+        floor=MIN_UPLOAD_CONCURRENCY,
+        ceiling=MAX_UPLOAD_CONCURRENCY
+    )
+    upload_progress = progress.UploadProgress(stream=io.StringIO())
+    source_walker = walker.SourceTreeWalker(
+        tree_directory,
+        ignore_patterns=[trees.DESCRIPTION_FILE]
+    )
+    jobs = (
+        upload.UploadJob(
+            record.path,
+            record.key,
+            {'ContentType': record.mime_type}
+        )
+        for record in source_walker.walk()
+    )
+    with tempfile.TemporaryDirectory() as state_directory:
+        uploader = upload.S3Uploader(
+            'benchmark-bucket',
+            max_workers=max_workers,
+            client=s3.client(max_pool_connections=(
+                MAX_UPLOAD_CONCURRENCY + multipart.MAX_WORKERS
+            )),
+            progress=upload_progress,
+            concurrency=limiter,
+            journal=multipart.UploadJournal(
+                os.path.join(state_directory, 'uploads.sqlite3')
+            )
+        )
+        start = time.perf_counter()
+        result = uploader.upload(jobs)
+        upload_progress.finish()
+        uploader.abort_orphaned_uploads()
+        seconds = time.perf_counter() - start
+    if result.failures:
+        raise RuntimeError(f'{len(result.failures)} upload(s) failed')
+    return {
+        'seconds': seconds,
+        'files_per_second': len(result.uploaded) / seconds,
+        'megabytes_per_second': total_size / (1024 * 1024) / seconds,
+        'requests': s3.request_count,
+        'final_concurrency': limiter.limit,
+    }
+
+
+def benchmark_listing(tree_directory, max_workers=10, latency=0.0):
+    """
+    Returns the time taken to list a bucket that holds every file in the
+    tree.
+    """
+    s3 = fake_s3.FakeS3(latency=latency)
+    source_walker = walker.SourceTreeWalker(
+        tree_directory,
+        ignore_patterns=[trees.DESCRIPTION_FILE]
+    )
+    for record in source_walker.walk():
+        s3.objects[record.key] = (record.size, EMPTY_ETAG)
+    lister = listing.BucketLister(
+        s3.client(max_pool_connections=max_workers),
+        'benchmark-bucket',
+        max_workers=max_workers
+    )
+    start = time.perf_counter()
+    index = lister.list()
+    seconds = time.perf_counter() - start
+    if len(index) != len(s3.objects):
+        raise RuntimeError(
+            f'Listed {len(index)} of {len(s3.objects)} object(s)'
+        )
+    return {
+        'seconds': seconds,
+        'objects_per_second': len(index) / seconds,
+        'requests': s3.request_count,
+    }
+
+
+def benchmark_synthesis(repeat=20):
+    """
+    Returns the median time taken to synthesize and render the
+    CloudFormation template.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        template = Template()
+        definitions.CloudFormationTemplate(
+            domain_name='example.com',
+            template=template,
+            homepage='index.html',
+            _404_page='404.html',
+            _500_page='500.html',
+            hosted_zone='1234',
+            certificate_arn='arn:aws:acm:us-east-1:1234:certificate/5678',
+            precompressed_variants=[('br', '.br'), ('gzip', '.gz')],
+            compressible_extensions=('.html', '.css', '.js')
+        )
+        template.to_yaml()
+        timings.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(timings)}
+
+
+def benchmark_startup(repeat=5):
+    """
+    Returns the median time taken to start the command-line tool.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(ROOT_DIR / 'main.py'), '--help'],
+            cwd=ROOT_DIR,
+            stdout=subprocess.DEVNULL,
+            check=True
+        )
+        timings.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(timings)}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, tree_directory=None,
+                   max_workers=10, latency=0.0):
+    """
+    Runs every benchmark and returns the results.
+
+    Trees are generated in tree_directory, where they are kept for
+    later runs, or in a temporary directory if it is None.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        for size in sizes:
+            directory = os.path.join(
+                tree_directory or temporary_directory,
+                f'tree-{size}'
+            )
+            total_size = trees.generate_tree(directory, size)
+            results[f'walk_{size}'] = benchmark_walk(directory)
+            results[f'upload_{size}'] = benchmark_upload(
+                directory,
+                total_size,
+                max_workers=max_workers,
+                latency=latency
+            )
+            results[f'list_{size}'] = benchmark_listing(
+                directory,
+                max_workers=max_workers,
+                latency=latency
+            )
+    results['synthesis'] = benchmark_synthesis()
+    results['startup'] = benchmark_startup()
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processors': os.cpu_count(),
+            'upload_workers': max_workers,
+            'latency': latency,
+        },
+        'benchmarks': results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns (name, baseline seconds, seconds) for each benchmark that
+    is slower than the baseline by more than the tolerance.
+
+    Benchmarks that are missing from either set of results are ignored.
+    """
+    regressions = []
+    for name, result in sorted(results['benchmarks'].items()):
+        expected = baseline['benchmarks'].get(name)
+        if expected is None:
+            continue
+        if result['seconds'] > expected['seconds'] * (1 + tolerance):
+            regressions.append((name, expected['seconds'], result['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=list(DEFAULT_SIZES),
+        help='The numbers of files in the synthetic trees'
+    )
+    parser.add_argument(
+        '--tree-directory',
+        help='Where to keep the synthetic trees between runs'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=10,
+        help='The number of upload worker threads'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='The simulated round trip time of each S3 request, in seconds'
+    )
+    parser.add_argument('--output', help='Where to write the results')
+    parser.add_argument(
+        '--baseline',
+        default=str(DEFAULT_BASELINE),
+        help='The results to compare with'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help='How much slower than the baseline is acceptable, e.g. 0.3'
+    )
+    parser.add_argument(
+        '--update-baseline',
+        action='store_true',
+        help='Store the results as the new baseline'
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        sizes=args.sizes,
+        tree_directory=args.tree_directory,
+        max_workers=args.workers,
+        latency=args.latency
+    )
+    for name, result in results['benchmarks'].items():
+        details = ', '.join(
+            f'{key}={value:.1f}' for key, value in result.items()
+            if key != 'seconds'
+        )
+        print(f"{name:<16} {result['seconds'] * 1000:10.1f} ms  {details}")
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            baseline_file.write(output + '\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        print(f'No baseline at {args.baseline}; nothing to compare with')
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for name, expected, actual in regressions:
+        print(''.join([
+            f'Regression in {name}: {actual * 1000:.1f} ms, ',
+            f'baseline {expected * 1000:.1f} ms',
+        ]))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Defines a generator of synthetic source trees for benchmarks.
+
+Trees have the mix of file types and sizes of a typical static site:
+mostly small pages, stylesheets and scripts alongside larger images.
+Files are created sparse, so even large trees are quick to create and
+take little disk space, but they are read in full like any other file.
+"""
+
+import json
+import math
+import os
+import random
+
+
+KB = 1024
+
+# The share of files of each kind, with the smallest and largest size
+# of a file of that kind. Sizes are spread evenly on a log scale.
+FILE_KINDS = (
+    (0.25, '.html', 2 * KB, 60 * KB),
+    (0.10, '.css', 1 * KB, 100 * KB),
+    (0.15, '.js', 1 * KB, 300 * KB),
+    (0.20, '.jpg', 20 * KB, 500 * KB),
+    (0.10, '.png', 5 * KB, 300 * KB),
+    (0.15, '.svg', 300, 20 * KB),
+    (0.05, '.woff2', 10 * KB, 80 * KB),
+)
+
+# The number of files in each directory.
+FILES_PER_DIRECTORY = 50
+
+# The name of the file that records how a tree was generated.
+DESCRIPTION_FILE = '.benchmark-tree.json'
+
+
+def file_sizes(count, seed=0):
+    """
+    Yields the extension and size of each file in a tree.
+    """
+    generator = random.Random(seed)
+    weights = [kind[0] for kind in FILE_KINDS]
+    for _ in range(count):
+        _, extension, smallest, largest = generator.choices(
+            FILE_KINDS,
+            weights
+        )[0]
+        size = math.exp(generator.uniform(
+            math.log(smallest),
+            math.log(largest)
+        ))
+        yield extension, int(size)
+
+
+def generate_tree(directory, count, seed=0):
+    """
+    Creates a tree of count files in the directory and returns their
+    total size in bytes.
+
+    A tree that was already generated in the directory with the same
+    arguments is reused.
+    """
+    description_path = os.path.join(directory, DESCRIPTION_FILE)
+    description = {'count': count, 'seed': seed}
+    try:
+        with open(description_path) as description_file:
+            existing = json.load(description_file)
+        if {key: existing.get(key) for key in description} == description:
+            return existing['total_size']
+    except (OSError, ValueError):
+        pass
+    total_size = 0
+    for number, (extension, size) in enumerate(file_sizes(count, seed)):
+        subdirectory = os.path.join(
+            directory,
+            f'section-{number // FILES_PER_DIRECTORY ** 2}',
+            f'page-{number // FILES_PER_DIRECTORY % FILES_PER_DIRECTORY}'
+        )
+        if number % FILES_PER_DIRECTORY == 0:
+            os.makedirs(subdirectory, exist_ok=True)
+        path = os.path.join(subdirectory, f'file-{number}{extension}')
+        with open(path, 'wb') as file:
+            file.write(f'benchmark file {number}\n'.encode())
+            file.truncate(size)
+        total_size += size
+    description['total_size'] = total_size
+    with open(description_path, 'w') as description_file:
+        json.dump(description, description_file)
+    return total_size
@@ -12,7 +12,8 @@ class CloudFormationTemplate(
 ):
 
     def __init__(self, domain_name, template, homepage,
-                 _404_page, _500_page, hosted_zone, certificate_arn):
+                 _404_page, _500_page, hosted_zone, certificate_arn,
+                 precompressed_variants=None, compressible_extensions=()):
         self.domain_name = domain_name
         self.template = template
         self.homepage = homepage
@@ -22,6 +23,11 @@ class CloudFormationTemplate(
         self.hosted_zone = hosted_zone
         # The ARN of the SSL certificate.
         self.certificate_arn = certificate_arn
+        # (Content-Encoding, key suffix) pairs describing the
+        # pre-compressed variants uploaded alongside each file with one
+        # of the compressible extensions, in order of preference.
+        self.precompressed_variants = precompressed_variants or []
+        self.compressible_extensions = compressible_extensions
         # Names that are referenced by multiple template resources.
         self.names = {
             'cloudfront_distribution': 'StaticSiteCloudFrontDistribution',
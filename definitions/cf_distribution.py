@@ -2,23 +2,108 @@
 Defines a CloudFront distribution to serve the website's static files.
 """
 
-import random
+import hashlib
+import re
 
-from troposphere import cloudfront, GetAtt, Ref, s3, Sub
+from troposphere import cloudfront, GetAtt, Output, Ref, s3, Sub
+
+
+# CloudFront Function that rewrites each request for a compressible
+# file to the best pre-compressed variant the viewer accepts. The
+# placeholders are filled in by define_encoding_selector().
+ENCODING_SELECTOR_CODE = """\
+var HOMEPAGE = '/%(homepage)s';
+var COMPRESSIBLE = /\\.(%(extensions)s)$/i;
+var VARIANTS = %(variants)s;
+
+function accepts(header, encoding) {
+    var items = header.toLowerCase().split(',');
+    for (var i = 0; i < items.length; i++) {
+        var parts = items[i].split(';');
+        if (parts[0].trim() === encoding) {
+            var quality = parts.length > 1 ? parts[1].split('=')[1] : '1';
+            return parseFloat(quality) > 0;
+        }
+    }
+    return false;
+}
+
+function handler(event) {
+    var request = event.request;
+    var header = request.headers['accept-encoding'];
+    var uri = request.uri === '/' ? HOMEPAGE : request.uri;
+    if (!header || !COMPRESSIBLE.test(uri)) {
+        return request;
+    }
+    for (var i = 0; i < VARIANTS.length; i++) {
+        if (accepts(header.value, VARIANTS[i][0])) {
+            request.uri = uri + VARIANTS[i][1];
+            break;
+        }
+    }
+    return request;
+}
+"""
+
+# The longest name a CloudFront Function may have.
+MAX_FUNCTION_NAME_LENGTH = 64
 
 
 class CloudFrontDistribution:
 
     @property
-    def random_string(self):
+    def origin_access_control_name(self):
         """
-        Generates a random string to use when naming the origin access
-        control policy.
+        Returns the name of the origin access control policy.
+
+        Names must be unique within an account, so the name includes a
+        hash of the domain name; it is the same every time the template
+        is synthesized for the same domain.
         """
-        random_string = ''
-        while len(random_string) < 20:
-            random_string += str(random.randint(0, 10))
-        return random_string
+        domain_hash = hashlib.sha256(self.domain_name.encode()).hexdigest()
+        return f'secure-static-site-{domain_hash[:20]}'
+
+    @property
+    def encoding_selector_name(self):
+        """
+        Returns the name of the CloudFront Function that selects
+        pre-compressed variants.
+
+        Names must be unique within an account and no longer than 64
+        characters, so the name is the start of the domain name
+        followed by a hash of all of it.
+        """
+        domain_hash = hashlib.sha256(self.domain_name.encode()).hexdigest()
+        suffix = f'-{domain_hash[:12]}-encoding-selector'
+        readable = re.sub(r'[^a-zA-Z0-9-]', '-', self.domain_name)
+        return readable[:MAX_FUNCTION_NAME_LENGTH - len(suffix)] + suffix
+
+    def define_encoding_selector(self, homepage):
+        """
+        Defines the CloudFront Function that selects pre-compressed
+        variants based on the viewer's Accept-Encoding header.
+        """
+        extensions = '|'.join(
+            extension.lstrip('.') for extension in self.compressible_extensions
+        )
+        variants = ', '.join(
+            f"['{encoding}', '{suffix}']"
+            for encoding, suffix in self.precompressed_variants
+        )
+        return self.template.add_resource(cloudfront.Function(
+            'CloudFrontEncodingSelectorFunction',
+            AutoPublish=True,
+            FunctionCode=ENCODING_SELECTOR_CODE % {
+                'homepage': homepage,
+                'extensions': extensions,
+                'variants': f'[{variants}]',
+            },
+            FunctionConfig=cloudfront.FunctionConfig(
+                Comment='Serves pre-compressed variants of static files',
+                Runtime='cloudfront-js-2.0'
+            ),
+            Name=self.encoding_selector_name
+        ))
 
     def define_cloudfront_distribution(self, homepage, _404_page, _500_page):
         self.template.add_resource(s3.BucketPolicy(
@@ -86,6 +171,7 @@ class CloudFrontDistribution:
                         CookiesConfig=cloudfront.CacheCookiesConfig(
                             CookieBehavior='none'
                         ),
+                        EnableAcceptEncodingBrotli=True,
                         EnableAcceptEncodingGzip=True,
                         HeadersConfig=cloudfront.CacheHeadersConfig(
                             HeaderBehavior='none'
@@ -99,66 +185,97 @@ class CloudFrontDistribution:
                 )
             )
         ))
-        response_headers_policy = self.template.add_resource(
-            cloudfront.ResponseHeadersPolicy(
-                'CloudFrontResponseHeadersPolicy',
-                ResponseHeadersPolicyConfig=(
-                    cloudfront.ResponseHeadersPolicyConfig(
-                        Name=Sub(
-                            '${AWS::StackName}-static-site-security-headers'
+        headers_policy_config = cloudfront.ResponseHeadersPolicyConfig(
+            Name=Sub(
+                '${AWS::StackName}-static-site-security-headers'
+            ),
+            SecurityHeadersConfig=cloudfront.SecurityHeadersConfig(
+                ContentSecurityPolicy=(
+                    cloudfront.ContentSecurityPolicy(
+                        ContentSecurityPolicy=(
+                            "default-src 'none'; img-src 'self';"
+                            "script-src 'self'; style-src 'self';"
+                            "object-src 'none'"
                         ),
-                        SecurityHeadersConfig=cloudfront.SecurityHeadersConfig(
-                            ContentSecurityPolicy=(
-                                cloudfront.ContentSecurityPolicy(
-                                    ContentSecurityPolicy=(
-                                        "default-src 'none'; img-src 'self';"
-                                        "script-src 'self'; style-src 'self';"
-                                        "object-src 'none'"
-                                    ),
-                                    Override=True
-                                )
-                            ),
-                            ContentTypeOptions=cloudfront.ContentTypeOptions(
-                                Override=True
-                            ),
-                            FrameOptions=cloudfront.FrameOptions(
-                                FrameOption='DENY',
-                                Override=True
-                            ),
-                            ReferrerPolicy=cloudfront.ReferrerPolicy(
-                                ReferrerPolicy='same-origin',
-                                Override=True
-                            ),
-                            StrictTransportSecurity=(
-                                cloudfront.StrictTransportSecurity(
-                                    AccessControlMaxAgeSec=63072000,
-                                    IncludeSubdomains=True,
-                                    Override=True,
-                                    Preload=True
-                                )
-                            ),
-                            XSSProtection=cloudfront.XSSProtection(
-                                ModeBlock=True,
-                                Override=True,
-                                Protection=True
-                            )
-                        )
+                        Override=True
                     )
+                ),
+                ContentTypeOptions=cloudfront.ContentTypeOptions(
+                    Override=True
+                ),
+                FrameOptions=cloudfront.FrameOptions(
+                    FrameOption='DENY',
+                    Override=True
+                ),
+                ReferrerPolicy=cloudfront.ReferrerPolicy(
+                    ReferrerPolicy='same-origin',
+                    Override=True
+                ),
+                StrictTransportSecurity=(
+                    cloudfront.StrictTransportSecurity(
+                        AccessControlMaxAgeSec=63072000,
+                        IncludeSubdomains=True,
+                        Override=True,
+                        Preload=True
+                    )
+                ),
+                XSSProtection=cloudfront.XSSProtection(
+                    ModeBlock=True,
+                    Override=True,
+                    Protection=True
                 )
             )
         )
+        if self.precompressed_variants:
+            # Pre-compressed variants are served from the same URL, so
+            # shared caches must key responses on Accept-Encoding.
+            headers_policy_config.CustomHeadersConfig = (
+                cloudfront.CustomHeadersConfig(
+                    Items=[
+                        cloudfront.CustomHeader(
+                            Header='Vary',
+                            Override=True,
+                            Value='Accept-Encoding'
+                        )
+                    ]
+                )
+            )
+        response_headers_policy = self.template.add_resource(
+            cloudfront.ResponseHeadersPolicy(
+                'CloudFrontResponseHeadersPolicy',
+                ResponseHeadersPolicyConfig=headers_policy_config
+            )
+        )
         origin_access_control_policy = self.template.add_resource(
             cloudfront.OriginAccessControl(
                 'CloudFrontOriginAccessControlPolicy',
                 OriginAccessControlConfig=cloudfront.OriginAccessControlConfig(
-                    Name=f'secure-static-site-{self.random_string}',
+                    Name=self.origin_access_control_name,
                     OriginAccessControlOriginType='s3',
                     SigningBehavior='always',
                     SigningProtocol='sigv4'
                 )
             )
         )
-        self.template.add_resource(cloudfront.Distribution(
+        default_cache_behavior = cloudfront.DefaultCacheBehavior(
+            CachePolicyId=Ref(cache_policy),
+            Compress=True,
+            TargetOriginId=Sub('S3-${AWS::StackName}-root'),
+            ViewerProtocolPolicy='redirect-to-https',
+            ResponseHeadersPolicyId=Ref(response_headers_policy)
+        )
+        if self.precompressed_variants:
+            encoding_selector = self.define_encoding_selector(homepage)
+            default_cache_behavior.FunctionAssociations = [
+                cloudfront.FunctionAssociation(
+                    EventType='viewer-request',
+                    FunctionARN=GetAtt(
+                        encoding_selector,
+                        'FunctionMetadata.FunctionARN'
+                    )
+                )
+            ]
+        distribution = self.template.add_resource(cloudfront.Distribution(
             self.names['cloudfront_distribution'],
             DistributionConfig=cloudfront.DistributionConfig(
                 Aliases=[
@@ -177,13 +294,7 @@ class CloudFrontDistribution:
                         ResponsePagePath=f'/{_500_page}'
                     ),
                 ],
-                DefaultCacheBehavior=cloudfront.DefaultCacheBehavior(
-                    CachePolicyId=Ref(cache_policy),
-                    Compress=True,
-                    TargetOriginId=Sub('S3-${AWS::StackName}-root'),
-                    ViewerProtocolPolicy='redirect-to-https',
-                    ResponseHeadersPolicyId=Ref(response_headers_policy)
-                ),
+                DefaultCacheBehavior=default_cache_behavior,
                 DefaultRootObject=homepage,
                 Enabled=True,
                 HttpVersion='http2',
@@ -208,3 +319,10 @@ class CloudFrontDistribution:
                 )
             )
         ))
+        # The distribution ID is needed to invalidate cached files after
+        # later deployments.
+        self.template.add_output(Output(
+            'CloudFrontDistributionId',
+            Value=Ref(distribution),
+            Description='ID of the CloudFront distribution serving the site'
+        ))
@@ -23,3 +23,80 @@ _500_FILE = '500.html'
 # If REGISTER_DOMAIN is set to True, the IAM user will have the
 # permissions needed to purchase and register a new domain name.
 REGISTER_DOMAIN = False
+
+# The number of files that are uploaded to the S3 bucket at the same
+# time; defaults to 10.
+UPLOAD_CONCURRENCY = 10
+# If ADAPTIVE_CONCURRENCY is set to True, UPLOAD_CONCURRENCY is only
+# where the upload starts: the number of files uploaded at once is
+# raised while it makes the upload faster and lowered when S3 throttles
+# requests, within the range below.
+ADAPTIVE_CONCURRENCY = True
+MIN_UPLOAD_CONCURRENCY = 2
+MAX_UPLOAD_CONCURRENCY = 64
+
+# If SYNC_FILES is set to True, only files that are new or have changed
+# since the last deployment are uploaded to the S3 bucket.
+SYNC_FILES = False
+# If DELETE_REMOVED_FILES is also set to True, files that have been
+# removed from SOURCE_FILES_DIRECTORY are deleted from the S3 bucket.
+DELETE_REMOVED_FILES = False
+
+# The directory in which state is kept between deployments, such as
+# the cached hashes of local files used by SYNC_FILES.
+STATE_DIRECTORY = '.static-site-deploy'
+
+# If PRECOMPRESS_FILES is set to True, Brotli and gzip versions of HTML,
+# CSS, JavaScript, SVG and JSON files are uploaded, and CloudFront
+# serves the best version each browser supports. If the brotli package
+# is not installed, only gzip versions are created.
+PRECOMPRESS_FILES = False
+
+# CACHE_CONTROL_RULES sets the Cache-Control, Expires and other headers
+# of uploaded files. Each rule pairs a glob pattern with the metadata
+# of matching files; the first matching rule is used. `**` matches any
+# number of directories, and patterns without a `/` match file names in
+# every directory. An integer Expires value is a number of seconds from
+# the time of upload.
+CACHE_CONTROL_RULES = [
+    ('assets/**', {'CacheControl': 'public, max-age=31536000, immutable'}),
+    ('*.html', {'CacheControl': 'no-cache'}),
+]
+
+# If FINGERPRINT_ASSETS is set to True, a copy of each stylesheet,
+# image, font and media file is uploaded with a hash of its content in
+# its file name (for example logo.3f9a1c2b.png), and the references in
+# HTML and CSS files are updated to point to it, so those copies can be
+# cached indefinitely. The original files are uploaded too, for
+# references that are not rewritten, such as imports between scripts.
+# Scripts are fingerprinted if an HTML file loads them with a <script
+# src> tag; add module scripts to FINGERPRINT_EXCLUDE to leave them
+# alone. Files matching FINGERPRINT_EXCLUDE are not fingerprinted. The
+# mapping of old to new names is written to asset-manifest.json in
+# STATE_DIRECTORY.
+FINGERPRINT_ASSETS = False
+FINGERPRINT_EXCLUDE = ['favicon.ico']
+
+# If INVALIDATE_CHANGED_FILES is set to True, files that were uploaded
+# or deleted are removed from CloudFront's caches after each
+# deployment. Directories with more than INVALIDATION_WILDCARD_THRESHOLD
+# changed files are invalidated with a single wildcard path. It defaults
+# to the value of SYNC_FILES, since without it every file is uploaded
+# and the whole site would be invalidated.
+# INVALIDATE_CHANGED_FILES = True
+INVALIDATION_WILDCARD_THRESHOLD = 20
+# Whether to wait for the invalidation to complete.
+WAIT_FOR_INVALIDATION = True
+
+# The name of the CloudFormation stack that hosts the site. Defaults to
+# 'static-website', or to a name derived from DOMAIN_NAME when the site
+# is deployed with the batch command.
+# STACK_NAME = 'static-website'
+
+# Glob patterns of files and directories that are not uploaded, in
+# addition to .git, .hg, .svn, .DS_Store and Thumbs.db. A pattern
+# without a `/` matches in every directory.
+IGNORE_PATTERNS = []
+# Whether to upload the contents of symbolically linked directories.
+# Symbolic links to files are always followed.
+FOLLOW_SYMLINKS = False
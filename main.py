@@ -12,15 +12,51 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'action',
-        choices=['iam', 'deploy'],
+        choices=['iam', 'deploy', 'batch'],
         help=(
-            'Indicate which action to perform; choices are `iam` and `deploy`'
+            'Indicate which action to perform; choices are `iam`, `deploy` '
+            'and `batch`'
         )
     )
+    parser.add_argument(
+        'settings_files',
+        nargs='*',
+        help='The settings files of the sites to deploy with `batch`'
+    )
     parser.add_argument(
         '--config',
         default='settings.py',
         help='The location of the file containing required settings'
     )
+    parser.add_argument(
+        '--rebuild-manifest',
+        action='store_true',
+        help='Discard the cached hashes of local files and compute them again'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignore cached results of AWS lookups and look them up again'
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help=(
+            'Write the time taken by each step of the deployment to FILE, '
+            'as a Chrome trace'
+        )
+    )
+    parser.add_argument(
+        '--max-concurrent-sites',
+        type=int,
+        default=4,
+        help='The number of sites `batch` deploys at the same time'
+    )
     args = parser.parse_args()
+    if args.action == 'batch' and not args.settings_files:
+        parser.error('the batch action requires at least one settings file')
+    if args.action != 'batch' and args.settings_files:
+        parser.error('only the batch action accepts settings files')
+    if args.max_concurrent_sites < 1:
+        parser.error('--max-concurrent-sites must be at least 1')
     main(args)
@@ -1,25 +1,67 @@
 """
 Defines a function that is called by the main.py file.
+
+The modules each command needs are imported only when that command
+runs, so that the `iam` command does not pay for importing boto3 and
+the `deploy` command does not pay for the IAM template generator.
 """
 
-from src import validators, create, iam
+from src import tracing, validators
 
 
 def main(argparse_arguments):
     """
     Can create a CF template defining a new IAM user or deploy a static site.
     """
+    if argparse_arguments.action == 'iam':
+        run(argparse_arguments)
+        return
+
+    # Record how long each step of the deployment takes. Spans for
+    # individual files are only kept if they are written to a file.
+    tracer = tracing.start(detailed=argparse_arguments.trace is not None)
+    try:
+        run(argparse_arguments)
+    finally:
+        tracing.stop()
+        if argparse_arguments.action == 'deploy':
+            for line in tracer.phase_summary():
+                print(line)
+        if argparse_arguments.trace is not None:
+            tracer.write_chrome_trace(argparse_arguments.trace)
+            print(f'Trace written to {argparse_arguments.trace}')
+
+
+def run(argparse_arguments):
+    """
+    Runs the action selected on the command line.
+    """
+    if argparse_arguments.action == 'batch':
+        # Deploy several static sites at the same time.
+        from src import batch
+        batch.BatchDeployer(
+            argparse_arguments.settings_files,
+            max_concurrent_sites=argparse_arguments.max_concurrent_sites,
+            rebuild_manifest=argparse_arguments.rebuild_manifest,
+            no_cache=argparse_arguments.no_cache
+        ).deploy()
+        return
+
     arguments = validators.Arguments(
         argparse_arguments.action,
-        argparse_arguments.config
+        argparse_arguments.config,
+        rebuild_manifest=argparse_arguments.rebuild_manifest,
+        no_cache=argparse_arguments.no_cache
     )
 
     if arguments.action == 'iam':
         # Create a CloudFormation template that defines an IAM user
         # with the permissions needed to deploy a static website to AWS.
+        from src import iam
         iam.create_iam_template(arguments)
     else:
         # Provision the resources needed to deploy a static website to
         # AWS and then upload the static files to an S3 bucket.
+        from src import create
         create_object = create.create_static_website(arguments)
         create_object.deploy_static_site()
@@ -0,0 +1,220 @@
+"""
+Defines a class that deploys several static sites at once.
+
+The BatchDeployer class loads the settings of every site, gives each
+one its own stack, and deploys up to a configurable number of sites at
+the same time in a pool of threads. The sites share AWS clients and a
+single index of hosted zones. Everything a site prints is prefixed with
+its domain name, and a summary of which sites succeeded and which
+failed is printed at the end.
+"""
+
+from collections import namedtuple
+from concurrent import futures
+import contextvars
+import re
+import sys
+import threading
+import time
+
+from src import clients, create, hosted_zones, validators
+
+
+# The longest a stack name may be.
+MAX_STACK_NAME_LENGTH = 128
+
+# The outcome of deploying a single site.
+SiteResult = namedtuple(
+    'SiteResult',
+    ['domain_name', 'stack_name', 'error', 'duration']
+)
+
+# The domain name of the site that the current thread is deploying.
+current_site = contextvars.ContextVar('current_site', default=None)
+
+
+def stack_name_for(domain_name):
+    """
+    Returns the name of the stack that hosts the site with the given
+    domain name.
+    """
+    name = re.sub('[^a-z0-9]+', '-', domain_name.lower()).strip('-')
+    return f'static-site-{name}'[:MAX_STACK_NAME_LENGTH]
+
+
+def describe_error(error):
+    """
+    Returns a short description of why a site could not be deployed.
+    """
+    if isinstance(error, SystemExit):
+        if isinstance(error.code, str):
+            return error.code
+        return f'exited with status {error.code}'
+    return f'{type(error).__name__}: {error}'
+
+
+class SiteOutput:
+    """
+    File-like object that prefixes each line with the domain name of the
+    site whose deployment printed it.
+
+    The site is read from current_site, so worker threads must run in a
+    copy of the context of the site's deployment.
+
+    Lines are written whole, so the output of sites that are deployed at
+    the same time is never mixed within a line.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._partial_lines = {}
+
+    def write(self, text):
+        site = current_site.get()
+        with self._lock:
+            buffered = self._partial_lines.pop(site, '') + text
+            *lines, partial_line = buffered.split('\n')
+            for line in lines:
+                if site is not None:
+                    line = f'[{site}] {line}'
+                self.stream.write(line + '\n')
+            if partial_line:
+                self._partial_lines[site] = partial_line
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        # Spinners would overwrite each other.
+        return False
+
+
+class BatchDeployer:
+
+    def __init__(self, settings_files, max_concurrent_sites=4,
+                 rebuild_manifest=False, no_cache=False):
+        self.settings_files = settings_files
+        self.max_concurrent_sites = max_concurrent_sites
+        self.rebuild_manifest = rebuild_manifest
+        self.no_cache = no_cache
+
+    def deploy(self):
+        """
+        Deploys every site and prints a summary of the results.
+
+        The settings of every site are validated before any site is
+        deployed. Returns a list of SiteResult objects and exits with an
+        error if any site failed.
+        """
+        sites = self._create_sites()
+        print(''.join([
+            f'Deploying {len(sites)} site(s), ',
+            f'{self.max_concurrent_sites} at a time...',
+        ]))
+        stdout = sys.stdout
+        sys.stdout = SiteOutput(stdout)
+        try:
+            with futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrent_sites
+            ) as pool:
+                # Each site runs in a context of its own, so that its
+                # output can be told apart from the others'.
+                results = list(pool.map(
+                    lambda site: contextvars.Context().run(
+                        self._deploy_site,
+                        site
+                    ),
+                    sites
+                ))
+        finally:
+            sys.stdout = stdout
+        self._print_summary(results)
+        failures = [result for result in results if result.error]
+        if failures:
+            raise SystemExit(f'{len(failures)} site(s) failed to deploy')
+        return results
+
+    def _create_sites(self):
+        """
+        Loads the settings of every site and returns the objects that
+        deploy them.
+        """
+        sites = []
+        errors = []
+        for settings_file in self.settings_files:
+            try:
+                arguments = validators.Arguments(
+                    'deploy',
+                    settings_file,
+                    rebuild_manifest=self.rebuild_manifest,
+                    no_cache=self.no_cache
+                )
+            except Exception as err:
+                # Any error means the settings cannot be used.
+                errors.append(f'{settings_file}: {err}')
+                continue
+            site = create.create_static_website(arguments)
+            if arguments.STACK_NAME is None:
+                site.stack_name = stack_name_for(site.domain_name)
+            sites.append(site)
+        for attribute in ('domain_name', 'stack_name'):
+            values = [getattr(site, attribute) for site in sites]
+            description = attribute.replace('_', ' ')
+            for value in sorted(set(values)):
+                if values.count(value) > 1:
+                    errors.append(
+                        f"More than one site uses the {description} '{value}'"
+                    )
+        if errors:
+            for error in errors:
+                print(error)
+            raise SystemExit('Invalid settings; no sites were deployed')
+
+        # Hosted zones are listed once for all of the sites.
+        resolver = hosted_zones.HostedZoneResolver(
+            clients.get_client('route53')
+        )
+        if len(sites) > 1:
+            resolver.load_all()
+        for site in sites:
+            site.hosted_zone_resolver = resolver
+        return sites
+
+    def _deploy_site(self, site):
+        """
+        Deploys a single site and returns a SiteResult.
+        """
+        current_site.set(site.domain_name)
+        start = time.monotonic()
+        error = None
+        try:
+            site.deploy_static_site()
+        except (Exception, SystemExit) as err:
+            error = describe_error(err)
+            print(f'Deployment failed: {error}')
+        return SiteResult(
+            site.domain_name,
+            site.stack_name,
+            error,
+            time.monotonic() - start
+        )
+
+    def _print_summary(self, results):
+        """
+        Prints whether each site was deployed and how long it took.
+        """
+        succeeded = [result for result in results if result.error is None]
+        print(f'Deployed {len(succeeded)} of {len(results)} site(s):')
+        width = max(len(result.domain_name) for result in results)
+        for result in results:
+            status = 'failed' if result.error else 'succeeded'
+            line = ''.join([
+                f'  {result.domain_name.ljust(width)}  ',
+                f'{status.ljust(9)}  {result.duration:7.1f}s  ',
+                result.stack_name,
+            ])
+            if result.error:
+                line += f': {result.error}'
+            print(line)
@@ -0,0 +1,124 @@
+"""
+Defines a local cache of the results of read-only AWS lookups.
+
+The LookupCache class stores values such as hosted zone IDs and stack
+outputs in a JSON file in the state directory, each with its own
+expiry time, so that repeated deployments do not make the same API
+calls again. Entries are invalidated explicitly when the resource they
+describe is known to have changed.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+# Several caches may share a file, for example when several sites are
+# deployed at once, so writes to any file are serialized.
+_write_lock = threading.Lock()
+
+
+class LookupCache:
+
+    def __init__(self, filepath, enabled=True):
+        """
+        If enabled is False, the values stored by earlier runs are
+        ignored, though new values are still stored for later runs.
+        """
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._entries = self._read_entries() if enabled else {}
+
+    def get(self, key):
+        """
+        Returns the value stored under the key, or None if there is no
+        such value or it has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry['expires'] <= time.time():
+            return None
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        """
+        Stores a value that expires after ttl seconds.
+
+        The value must be serializable as JSON.
+        """
+        entry = {'value': value, 'expires': time.time() + ttl}
+        with self._lock:
+            self._entries[key] = entry
+        self._write({key: entry}, ())
+
+    def invalidate(self, *keys):
+        """
+        Removes the values stored under the keys.
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        self._write({}, keys)
+
+    def lookup(self, key, ttl, function):
+        """
+        Returns the value stored under the key, calling function to
+        find it if necessary.
+
+        A result of None is not stored, so that resources that do not
+        exist yet are looked up again next time.
+        """
+        value = self.get(key)
+        if value is None:
+            value = function()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def _read_entries(self):
+        """
+        Reads the entries that have not expired from the file.
+        """
+        try:
+            with open(self.filepath) as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        now = time.time()
+        return {
+            key: entry for key, entry in entries.items()
+            if isinstance(entry, dict)
+            and isinstance(entry.get('expires'), (int, float))
+            and entry['expires'] > now
+            and 'value' in entry
+        }
+
+    def _write(self, updated, removed_keys):
+        """
+        Applies changes to the file without discarding those made by
+        other caches that share it.
+        """
+        with _write_lock:
+            entries = self._read_entries()
+            entries.update(updated)
+            for key in removed_keys:
+                entries.pop(key, None)
+            directory = os.path.dirname(self.filepath) or '.'
+            os.makedirs(directory, exist_ok=True)
+            # Replacing the file in one step means that it is never left
+            # half written.
+            file_descriptor, temporary_path = tempfile.mkstemp(
+                dir=directory,
+                suffix='.tmp'
+            )
+            try:
+                with os.fdopen(file_descriptor, 'w') as cache_file:
+                    json.dump(entries, cache_file, indent=2, sort_keys=True)
+                os.replace(temporary_path, self.filepath)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
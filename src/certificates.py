@@ -0,0 +1,95 @@
+"""
+Defines tools for finding SSL certificates that can be reused.
+
+The find_issued_certificate() function pages through the certificates
+in AWS Certificate Manager and returns one that is already issued,
+covers every domain name the site is served from and will not expire
+soon, so that a deployment does not have to request a new certificate
+and wait for it to be validated.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+
+# CloudFront only accepts certificates from this region.
+CERTIFICATE_REGION = 'us-east-1'
+
+# Certificates that expire sooner than this are not reused.
+MINIMUM_VALIDITY = timedelta(days=30)
+
+# The key types of the certificates that are considered. ACM only lists
+# RSA_2048 certificates unless others are asked for.
+KEY_TYPES = [
+    'RSA_2048',
+    'RSA_3072',
+    'RSA_4096',
+    'EC_prime256v1',
+    'EC_secp384r1',
+]
+
+
+def name_matches(pattern, domain_name):
+    """
+    Returns True if a name in a certificate covers the domain name.
+
+    A wildcard name covers exactly one extra label, so *.example.com
+    covers www.example.com but not example.com or a.b.example.com.
+    """
+    pattern = pattern.lower().rstrip('.')
+    domain_name = domain_name.lower().rstrip('.')
+    if pattern.startswith('*.'):
+        label, _, parent = domain_name.partition('.')
+        return bool(label) and parent == pattern[2:]
+    return pattern == domain_name
+
+
+def covers_domain_names(certificate_names, domain_names):
+    """
+    Returns True if every domain name is covered by one of the names in
+    a certificate.
+    """
+    return all(
+        any(name_matches(pattern, domain_name)
+            for pattern in certificate_names)
+        for domain_name in domain_names
+    )
+
+
+def find_issued_certificate(client, domain_names,
+                            minimum_validity=MINIMUM_VALIDITY):
+    """
+    Returns the ARN of an issued certificate that covers every domain
+    name, or None if there is no such certificate.
+
+    The client must be an ACM client in CERTIFICATE_REGION. Among the
+    certificates that qualify, the one that expires last is returned.
+    """
+    earliest_expiry = datetime.now(timezone.utc) + minimum_validity
+    best_arn = None
+    best_expiry = None
+    paginator = client.get_paginator('list_certificates')
+    for page in paginator.paginate(
+        CertificateStatuses=['ISSUED'],
+        Includes={'keyTypes': KEY_TYPES}
+    ):
+        for summary in page['CertificateSummaryList']:
+            names = [summary['DomainName']]
+            names.extend(summary.get('SubjectAlternativeNameSummaries', []))
+            expiry = summary.get('NotAfter')
+            if (summary.get('HasAdditionalSubjectAlternativeNames')
+                    or expiry is None):
+                # The summary leaves out some of the details.
+                certificate = client.describe_certificate(
+                    CertificateArn=summary['CertificateArn']
+                )['Certificate']
+                names = [certificate['DomainName']]
+                names.extend(certificate.get('SubjectAlternativeNames', []))
+                expiry = certificate.get('NotAfter')
+            if expiry is None or expiry < earliest_expiry:
+                continue
+            if not covers_domain_names(names, domain_names):
+                continue
+            if best_expiry is None or expiry > best_expiry:
+                best_arn = summary['CertificateArn']
+                best_expiry = expiry
+    return best_arn
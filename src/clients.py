@@ -0,0 +1,104 @@
+"""
+Defines a shared, lazily populated pool of boto3 clients.
+
+Creating a client loads the service's model from disk, which takes tens
+of milliseconds, so the ClientPool class creates each client the first
+time it is needed and hands the same client to every caller after
+that. Clients are safe to share between threads once they exist, but a
+boto3 session is not, so clients are created one at a time. Every
+client is configured here, in one place. The pool also knows which AWS
+account its credentials belong to.
+"""
+
+import threading
+
+import boto3
+from botocore.config import Config
+
+
+# The retry behaviour of every client. The "standard" mode retries
+# throttling and transient errors with exponential backoff.
+RETRY_MODE = 'standard'
+MAX_ATTEMPTS = 5
+
+# The number of connections each client keeps open, unless a caller
+# needs more.
+MAX_POOL_CONNECTIONS = 10
+
+
+class ClientPool:
+
+    def __init__(self, region_name=None, max_attempts=MAX_ATTEMPTS,
+                 max_pool_connections=MAX_POOL_CONNECTIONS):
+        self.region_name = region_name
+        self.max_attempts = max_attempts
+        self.max_pool_connections = max_pool_connections
+        self._session = None
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._account_id = None
+
+    def client(self, service_name, region_name=None,
+               max_pool_connections=None):
+        """
+        Returns the client for the service, creating it if necessary.
+
+        Callers that ask for a different region or a larger connection
+        pool are given a separate client.
+        """
+        key = (
+            service_name,
+            region_name or self.region_name,
+            max(max_pool_connections or 0, self.max_pool_connections)
+        )
+        with self._lock:
+            if key not in self._clients:
+                if self._session is None:
+                    self._session = boto3.session.Session()
+                self._clients[key] = self._session.client(
+                    service_name,
+                    region_name=key[1],
+                    config=Config(
+                        retries={
+                            'max_attempts': self.max_attempts,
+                            'mode': RETRY_MODE,
+                        },
+                        max_pool_connections=key[2]
+                    )
+                )
+            return self._clients[key]
+
+    def account_id(self):
+        """
+        Returns the ID of the AWS account that the credentials belong
+        to.
+
+        The ID is only looked up the first time it is needed.
+        """
+        if self._account_id is None:
+            identity = self.client('sts').get_caller_identity()
+            self._account_id = identity['Account']
+        return self._account_id
+
+
+# The pool used by the rest of the tool.
+default_pool = ClientPool()
+
+
+def get_client(service_name, region_name=None, max_pool_connections=None):
+    """
+    Returns a client for the service from the default pool.
+    """
+    return default_pool.client(
+        service_name,
+        region_name=region_name,
+        max_pool_connections=max_pool_connections
+    )
+
+
+def get_account_id():
+    """
+    Returns the ID of the AWS account of the default pool's
+    credentials.
+    """
+    return default_pool.account_id()
@@ -0,0 +1,141 @@
+"""
+Defines tools for creating pre-compressed variants of static files.
+
+Text files such as HTML, CSS and JavaScript are compressed with Brotli
+and gzip before they are uploaded. Each variant is stored next to the
+original object with an extra extension (for example `app.js.br`) and
+a matching Content-Encoding, and a CloudFront Function rewrites each
+request to the best variant the viewer accepts.
+
+Brotli compression requires the optional `brotli` package. If it is
+not installed, only gzip variants are created.
+"""
+
+from concurrent import futures
+import gzip
+import os
+
+from src import upload
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Only files with these extensions are compressed.
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json')
+
+# The extension added to the key of each variant, keyed by the value
+# of its Content-Encoding header. Encodings are listed in order of
+# preference.
+VARIANT_EXTENSIONS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+def available_encodings():
+    """
+    Returns the encodings that can be produced, in order of preference.
+    """
+    if brotli is None:
+        return ['gzip']
+    return ['br', 'gzip']
+
+
+def is_compressible(key):
+    """
+    Returns True if variants should be created for the given key.
+    """
+    return key.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def compress_file(local_filepath, output_filepath, encodings):
+    """
+    Writes a compressed copy of the file for each of the encodings.
+
+    Each variant is given the modification time of the original file;
+    variants that already have that modification time are left alone
+    rather than compressed again. Returns a dictionary mapping each
+    encoding to the path of its variant.
+    """
+    mtime_ns = os.stat(local_filepath).st_mtime_ns
+    variants = {}
+    content = None
+    for encoding in encodings:
+        variant_filepath = output_filepath + VARIANT_EXTENSIONS[encoding]
+        variants[encoding] = variant_filepath
+        try:
+            if os.stat(variant_filepath).st_mtime_ns == mtime_ns:
+                continue
+        except FileNotFoundError:
+            pass
+        if content is None:
+            with open(local_filepath, 'rb') as file:
+                content = file.read()
+        if encoding == 'br':
+            compressed = brotli.compress(content, quality=11)
+        else:
+            # A fixed timestamp keeps the output, and so its ETag, the
+            # same for identical input.
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        os.makedirs(os.path.dirname(variant_filepath), exist_ok=True)
+        with open(variant_filepath, 'wb') as file:
+            file.write(compressed)
+        os.utime(variant_filepath, ns=(mtime_ns, mtime_ns))
+    return variants
+
+
+class CompressedVariantBuilder:
+
+    def __init__(self, output_directory, max_workers=None):
+        self.output_directory = output_directory
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.encodings = available_encodings()
+
+    def add_variants(self, jobs):
+        """
+        Yields each UploadJob in jobs along with jobs for its variants.
+
+        Files are compressed in a pool of worker processes, one per
+        core by default, while the original files continue to be
+        yielded to the uploader.
+        """
+        max_pending = self.max_workers * 2
+        with futures.ProcessPoolExecutor(
+            max_workers=self.max_workers
+        ) as pool:
+            pending = {}
+            for job in jobs:
+                yield job
+                if not is_compressible(job.key):
+                    continue
+                if len(pending) >= max_pending:
+                    done, _ = futures.wait(
+                        pending,
+                        return_when=futures.FIRST_COMPLETED
+                    )
+                    yield from self._variant_jobs(done, pending)
+                future = pool.submit(
+                    compress_file,
+                    job.local_filepath,
+                    os.path.join(self.output_directory, job.key),
+                    self.encodings
+                )
+                pending[future] = job
+            done, _ = futures.wait(pending)
+            yield from self._variant_jobs(done, pending)
+
+    def _variant_jobs(self, done, pending):
+        """
+        Yields an UploadJob for each variant of the finished files.
+        """
+        for future in done:
+            job = pending.pop(future)
+            for encoding, variant_filepath in future.result().items():
+                yield upload.UploadJob(
+                    variant_filepath,
+                    job.key + VARIANT_EXTENSIONS[encoding],
+                    dict(job.extra_args, ContentEncoding=encoding)
+                )
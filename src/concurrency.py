@@ -0,0 +1,175 @@
+"""
+Defines a controller that adjusts how many requests run at the same time.
+
+The AdaptiveConcurrencyLimiter class lets a limited number of requests
+run at once and adjusts the limit as it measures them, by additive
+increase and multiplicative decrease (AIMD). After each window of as
+many requests as the limit, the limit is raised by one, unless the
+latency of the window rose well above the lowest latency seen without
+a matching gain in throughput, which means that requests are only
+queuing, in which case it is lowered by one. When S3 throttles a
+request, the limit is halved, and it is not halved again for requests
+that were already running by then. The limit never leaves the
+configured floor and ceiling, and every change is recorded.
+"""
+
+from collections import namedtuple
+import threading
+import time
+
+from src import tracing
+
+
+# The factor the limit is multiplied by when requests are throttled.
+DECREASE_FACTOR = 0.5
+
+# How much higher than the lowest latency seen the average latency of
+# a window may be before the limit is lowered.
+LATENCY_TOLERANCE = 2.0
+
+# The gain in throughput, as a fraction, that makes higher latency
+# worthwhile.
+MIN_THROUGHPUT_GAIN = 0.05
+
+# Each request counts as this many bytes of work when throughput is
+# measured, so that the throughput of small files reflects the number
+# of requests.
+REQUEST_COST = 16 * 1024
+
+# Describes a change of the limit: the seconds since the limiter was
+# created, the new limit and why it changed.
+ConcurrencyChange = namedtuple(
+    'ConcurrencyChange',
+    ['elapsed', 'limit', 'reason']
+)
+
+# Reasons for a change of the limit.
+INITIAL = 'initial'
+INCREASED = 'increased'
+QUEUING = 'latency rose without more throughput'
+THROTTLED = 'throttled'
+
+
+class AdaptiveConcurrencyLimiter:
+
+    def __init__(self, initial, floor=1, ceiling=64):
+        if floor < 1 or floor > ceiling:
+            raise ValueError(
+                f'Invalid concurrency range {floor}-{ceiling}'
+            )
+        self.floor = floor
+        self.ceiling = ceiling
+        self.limit = min(max(initial, floor), ceiling)
+        self.start = time.monotonic()
+        self.history = [ConcurrencyChange(0.0, self.limit, INITIAL)]
+        self._in_flight = 0
+        self._completed = 0
+        # Throttled requests are ignored until this many requests have
+        # completed.
+        self._recovery_end = 0
+        self._condition = threading.Condition()
+        self._min_latency = None
+        self._previous_throughput = None
+        self._start_window(self.start)
+        tracing.counter('upload_concurrency', limit=self.limit)
+
+    def acquire(self):
+        """
+        Waits until fewer requests than the limit are running.
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency=None, size=0):
+        """
+        Records that a request has finished.
+
+        Requests that failed are released without a latency, so that
+        they are not measured.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._completed += 1
+            if latency is not None:
+                self._record(latency, size)
+            self._condition.notify_all()
+
+    def throttled(self):
+        """
+        Records that a request was throttled, which halves the limit.
+        """
+        with self._condition:
+            if self._completed < self._recovery_end:
+                # The requests that were already running when the limit
+                # was lowered may be throttled too.
+                return
+            self._recovery_end = self._completed + self._in_flight
+            self._set_limit(int(self.limit * DECREASE_FACTOR), THROTTLED)
+            # Throughput at the new limit is not compared with the
+            # throughput of throttled requests.
+            self._previous_throughput = None
+            self._start_window(time.monotonic())
+
+    def summary(self):
+        """
+        Returns a line describing how the limit changed.
+        """
+        limits = [change.limit for change in self.history]
+        throttled = sum(
+            1 for change in self.history if change.reason == THROTTLED
+        )
+        return ''.join([
+            f'Upload concurrency started at {limits[0]}, ',
+            f'ranged from {min(limits)} to {max(limits)} and ended at ',
+            f'{limits[-1]}; lowered {throttled} time(s) after throttling',
+        ])
+
+    def _start_window(self, now):
+        self._window_start = now
+        self._window_requests = 0
+        self._window_work = 0
+        self._window_latency = 0.0
+
+    def _record(self, latency, size):
+        """
+        Measures a finished request and, at the end of each window,
+        adjusts the limit.
+
+        Must be called with the lock held.
+        """
+        self._window_requests += 1
+        self._window_work += size + REQUEST_COST
+        self._window_latency += latency
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        if self._window_requests < self.limit:
+            return
+        now = time.monotonic()
+        throughput = self._window_work / max(now - self._window_start, 1e-9)
+        average_latency = self._window_latency / self._window_requests
+        if self._completed < self._recovery_end:
+            # The limit has only just been lowered.
+            pass
+        elif (self._previous_throughput is not None
+                and average_latency > self._min_latency * LATENCY_TOLERANCE
+                and throughput < self._previous_throughput * (
+                    1 + MIN_THROUGHPUT_GAIN)):
+            self._set_limit(self.limit - 1, QUEUING)
+        else:
+            self._set_limit(self.limit + 1, INCREASED)
+        self._previous_throughput = throughput
+        self._start_window(now)
+
+    def _set_limit(self, limit, reason):
+        limit = min(max(limit, self.floor), self.ceiling)
+        if limit == self.limit:
+            return
+        self.limit = limit
+        self.history.append(ConcurrencyChange(
+            time.monotonic() - self.start,
+            limit,
+            reason
+        ))
+        tracing.counter('upload_concurrency', limit=limit)
@@ -9,25 +9,54 @@ and upload static files to an S3 bucket so that the site will be served
 by a CloudFront distribution.
 """
 
-import mimetypes
+import hashlib
 import os
 from pathlib import Path
 import sys
-import time
 
-import boto3
 from botocore.exceptions import ClientError
 
 from troposphere import Template
 
 import definitions
-from src import utils
+from src import (
+    cache,
+    certificates,
+    clients,
+    compress,
+    concurrency,
+    fingerprint,
+    hosted_zones,
+    invalidation,
+    manifest,
+    metadata,
+    multipart,
+    polling,
+    progress,
+    sync,
+    tasks,
+    tracing,
+    upload,
+    utils,
+    walker,
+)
 
 
 # Used to determine the locations of files relative to the project
 # root directory.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The longest times to wait for ACM, in seconds.
+VALIDATION_RECORDS_TIMEOUT = 5 * 60
+CERTIFICATE_VALIDATION_TIMEOUT = 2 * 60 * 60
+
+# The name of the stack, unless the STACK_NAME setting gives another.
+DEFAULT_STACK_NAME = 'static-website'
+
+# How long the results of lookups are cached, in seconds.
+HOSTED_ZONE_TTL = 7 * 24 * 60 * 60
+CERTIFICATE_TTL = 24 * 60 * 60
+
 
 class CloudFrontDistributionStackCreator(utils.CloudFormationStackCreator):
 
@@ -37,45 +66,170 @@ class CloudFrontDistributionStackCreator(utils.CloudFormationStackCreator):
         self._404_file = arguments._404_FILE
         self._500_file = arguments._500_FILE
         self.source_directory = arguments.SOURCE_FILES_DIRECTORY
+        self.upload_concurrency = arguments.UPLOAD_CONCURRENCY
+        self.adaptive_concurrency = arguments.ADAPTIVE_CONCURRENCY
+        self.min_upload_concurrency = arguments.MIN_UPLOAD_CONCURRENCY
+        self.max_upload_concurrency = arguments.MAX_UPLOAD_CONCURRENCY
+        self.sync_files = arguments.SYNC_FILES
+        self.delete_removed_files = arguments.DELETE_REMOVED_FILES
+        self.state_directory = arguments.STATE_DIRECTORY
+        self.precompress_files = arguments.PRECOMPRESS_FILES
+        self.fingerprint_assets = arguments.FINGERPRINT_ASSETS
+        self.fingerprint_exclude = arguments.FINGERPRINT_EXCLUDE
+        self.ignore_patterns = arguments.IGNORE_PATTERNS
+        self.follow_symlinks = arguments.FOLLOW_SYMLINKS
+        self.invalidate_changed_files = arguments.INVALIDATE_CHANGED_FILES
+        self.invalidation_wildcard_threshold = (
+            arguments.INVALIDATION_WILDCARD_THRESHOLD
+        )
+        self.wait_for_invalidation = arguments.WAIT_FOR_INVALIDATION
+        self.metadata_rules = metadata.MetadataRules(
+            arguments.CACHE_CONTROL_RULES
+        )
+        self.rebuild_manifest = arguments.rebuild_manifest
+        self.stack_name = arguments.STACK_NAME or DEFAULT_STACK_NAME
+        self.lookup_cache = cache.LookupCache(
+            os.path.join(self.state_directory, 'lookups.json'),
+            enabled=not arguments.no_cache
+        )
         self.template = Template()
-        self.hosted_zone = self.get_hosted_zone_id()
+        self.hosted_zone = None
+        # May be shared by several sites so that hosted zones are only
+        # listed once.
+        self.hosted_zone_resolver = None
+        # Set once the static files have been prepared for upload.
+        self.upload_directory = None
+        self.file_manifest = None
+        # True if an existing certificate is used, so it does not need
+        # to be validated.
+        self.certificate_issued = False
+        # Set once the stack has been deployed.
+        self.stack_status = None
 
     def deploy_static_site(self):
         """
         Runs all the commands needed to create the site.
+
+        The commands are run as a graph of tasks, so that those that do
+        not depend on each other run at the same time. For example, the
+        template is synthesized and the static files are prepared while
+        the certificate is being validated.
+        """
+        graph = tasks.TaskGraph()
+        graph.add('certificate_arn', self._create_certificate)
+        graph.add('hosted_zone', self._lookup_hosted_zone)
+        graph.add('prepared_files', self._prepare_files)
+        graph.add(
+            'validation_records',
+            self._retrieve_validation_records,
+            ['certificate_arn']
+        )
+        graph.add(
+            'validation_cnames',
+            self._create_CNAME_records,
+            ['validation_records'],
+            after=['hosted_zone']
+        )
+        graph.add(
+            'certificate_issued',
+            self._check_certificate_status,
+            ['certificate_arn'],
+            after=['validation_cnames']
+        )
+        graph.add(
+            'template',
+            self._synthesize_template,
+            ['certificate_arn', 'hosted_zone']
+        )
+        graph.add(
+            'stack',
+            self._create_site_stack,
+            ['template'],
+            after=['certificate_issued']
+        )
+        graph.add('s3_bucket_name', self.get_s3_bucket_name, after=['stack'])
+        graph.add(
+            'changed_keys',
+            self._upload_files,
+            ['s3_bucket_name'],
+            after=['prepared_files']
+        )
+        if self._should_invalidate():
+            graph.add(
+                'invalidation',
+                self._invalidate_cache,
+                ['changed_keys']
+            )
+        with tracing.span('deploy_static_site', domain=self.domain_name):
+            graph.run()
+
+    def _lookup_hosted_zone(self):
+        """
+        Looks up the ID of the hosted zone for the site's domain name.
+        """
+        self.hosted_zone = self.get_hosted_zone_id()
+        return self.hosted_zone
+
+    def _synthesize_template(self, certificate_arn, hosted_zone):
+        """
+        Adds the resources that host the site to the CF template.
         """
-        certificate_arn = self._create_certificate()
-        validation_records = self._retrieve_validation_records(certificate_arn)
-        self._create_CNAME_records(validation_records)
-        self._check_certificate_status(certificate_arn)
         definitions.CloudFormationTemplate(
             domain_name=self.domain_name,
             template=self.template,
             homepage=self.homepage,
             _404_page=(self._404_file or '404.html'),
             _500_page=(self._500_file or '500.html'),
-            hosted_zone=self.hosted_zone,
-            certificate_arn=certificate_arn
+            hosted_zone=hosted_zone,
+            certificate_arn=certificate_arn,
+            precompressed_variants=self._precompressed_variants(),
+            compressible_extensions=compress.COMPRESSIBLE_EXTENSIONS
         )
-        self.create_stack(
-            template=self.template,
-            stack_name='static-website'
+        return self.template
+
+    def _create_site_stack(self, template):
+        """
+        Creates or updates the CloudFormation stack that hosts the site.
+        """
+        self.stack_status = self.deploy_stack(
+            template=template,
+            stack_name=self.stack_name
         )
-        s3_bucket_name = self.get_s3_bucket_name()
-        self._upload_files(s3_bucket_name=s3_bucket_name)
+        return self.stack_status
 
     def _create_certificate(self):
         """
-        Creates an SSL certificate using AWS Certificate Manager.
+        Returns the ARN of the site's SSL certificate.
+
+        An issued certificate that already covers the site's domain
+        names is reused; otherwise a new one is requested from AWS
+        Certificate Manager.
         """
+        client = clients.get_client(
+            'acm',
+            region_name=certificates.CERTIFICATE_REGION
+        )
+        with tracing.span('find_issued_certificate'):
+            certificate_arn = self.lookup_cache.lookup(
+                self._lookup_key('certificate', self.domain_name),
+                CERTIFICATE_TTL,
+                lambda: certificates.find_issued_certificate(
+                    client,
+                    [self.domain_name, f'www.{self.domain_name}']
+                )
+            )
+        if certificate_arn is not None:
+            print(f'Using existing SSL certificate {certificate_arn}')
+            self.certificate_issued = True
+            return certificate_arn
         print('Creating SSL certificate...')
-        client = boto3.client('acm')
         try:
-            response = client.request_certificate(
-                DomainName=self.domain_name,
-                SubjectAlternativeNames=[f'www.{self.domain_name}'],
-                ValidationMethod='DNS'
-            )
+            with tracing.span('request_certificate'):
+                response = client.request_certificate(
+                    DomainName=self.domain_name,
+                    SubjectAlternativeNames=[f'www.{self.domain_name}'],
+                    ValidationMethod='DNS'
+                )
             certificate_arn = response['CertificateArn']
         except ClientError as err:
             print(f'Error requesting certificate: {err}')
@@ -86,43 +240,54 @@ class CloudFrontDistributionStackCreator(utils.CloudFormationStackCreator):
     def _retrieve_validation_records(self, certificate_arn):
         """
         Retrieves the certificate's validation records.
+
+        Returns an empty list if the certificate is already issued.
         """
-        client = boto3.client('acm')
-        validation_records = None
-        max_retries = 10
-        retries = 0
-        while retries < max_retries:
+        if self.certificate_issued:
+            return []
+        client = clients.get_client(
+            'acm',
+            region_name=certificates.CERTIFICATE_REGION
+        )
+        poller = polling.Poller(
+            initial_delay=1,
+            max_delay=10,
+            timeout=VALIDATION_RECORDS_TIMEOUT
+        )
+
+        def check():
             try:
                 response = client.describe_certificate(
                     CertificateArn=certificate_arn
                 )
-                validation_options = (
-                    response['Certificate']['DomainValidationOptions']
-                )
-                if (validation_options and
-                        ('ResourceRecord' in validation_options[0])):
-                    validation_records = [dvo['ResourceRecord'] for
-                                          dvo in validation_options]
-                    break
-            except ClientError:
-                pass
-            print(''.join([
-                'Validation records not available yet. Waiting 10 seconds. ',
-                f'Retry {retries + 1}/{max_retries}'
-            ]))
-            time.sleep(10)
-            retries += 1
-        if not validation_records:
+            except ClientError as err:
+                # The new certificate may not be visible yet.
+                if polling.is_throttling_error(err):
+                    raise
+                return None
+            validation_options = (
+                response['Certificate']['DomainValidationOptions']
+            )
+            if (validation_options and
+                    all('ResourceRecord' in dvo
+                        for dvo in validation_options)):
+                return [dvo['ResourceRecord'] for dvo in validation_options]
+            return None
+
+        print('Waiting for certificate validation records...')
+        try:
+            return poller.poll(check, 'validation records')
+        except polling.PollingTimeout:
             print('Timed out waiting for validation records.')
             sys.exit(1)
-        else:
-            return validation_records
 
     def _create_CNAME_records(self, validation_records):
         """
         Creates CNAME records to validate SSL certificate.
         """
-        client = boto3.client('route53')
+        if not validation_records:
+            return
+        client = clients.get_client('route53')
         try:
             route53_changes = []
             for record in validation_records:
@@ -147,97 +312,326 @@ class CloudFrontDistributionStackCreator(utils.CloudFormationStackCreator):
                 },
             )
         except ClientError as err:
+            # The cached zone may have been deleted.
+            self.lookup_cache.invalidate(
+                self._lookup_key('hosted-zone', self.domain_name)
+            )
             print(f'Error creating Route53 record set: {err}')
             sys.exit(1)
 
     def _check_certificate_status(self, certificate_arn):
-        client = boto3.client('acm')
-        print('Certificate is pending validation...')
-        while True:
+        if self.certificate_issued:
+            return
+        client = clients.get_client(
+            'acm',
+            region_name=certificates.CERTIFICATE_REGION
+        )
+        poller = polling.Poller(
+            initial_delay=5,
+            max_delay=30,
+            timeout=CERTIFICATE_VALIDATION_TIMEOUT
+        )
+
+        def check():
             response = client.describe_certificate(
                 CertificateArn=certificate_arn
             )
-            status = response['Certificate']['Status']
-
-            if status == 'ISSUED':
-                print(''.join([
-                    f'Certificate {certificate_arn} has been successfully ',
-                    'validated and issued!'
-                ]))
-                return
-            if status == 'FAILED':
-                print(''.join([
-                    'Certificate validation failed. Reason: ',
-                    f"{response['Certificate']['FailureReason']}"
-                ]))
-                sys.exit(1)
-            time.sleep(30)
+            if response['Certificate']['Status'] == 'PENDING_VALIDATION':
+                return None
+            return response['Certificate']
+
+        print('Certificate is pending validation...')
+        try:
+            certificate = poller.poll(check, 'certificate validation')
+        except polling.PollingTimeout:
+            print('Timed out waiting for certificate validation.')
+            sys.exit(1)
+        if certificate['Status'] == 'ISSUED':
+            print(''.join([
+                f'Certificate {certificate_arn} has been successfully ',
+                'validated and issued!'
+            ]))
+            return
+        print(''.join([
+            'Certificate validation failed. Reason: ',
+            f"{certificate.get('FailureReason', certificate['Status'])}"
+        ]))
+        sys.exit(1)
 
     def _upload_files(self, s3_bucket_name):
         """
         Uploads the static site files to the S3 bucket.
+
+        When SYNC_FILES is enabled, only files that are new or have
+        changed are uploaded and, if DELETE_REMOVED_FILES is also
+        enabled, objects that no longer exist locally are deleted.
+        Returns the keys of the objects that were uploaded or deleted.
         """
+        if self.upload_directory is None:
+            self._prepare_files()
         print('Uploading static files to S3 bucket...')
-        client = boto3.client('s3')
-        for root, directory, files in os.walk(self.source_directory):
-            for file in files:
-                # Determine the location of the file on the local disk.
-                local_filepath = os.path.join(root, file)
-
-                # Determine the URL the file should have.
-                parent_dir = root.split(self.source_directory)[-1:][0]
-                if parent_dir:
-                    file_url = (
-                        '/'.join(parent_dir.split(os.sep)).lstrip('/')
-                        + '/'
-                        + file
+        upload_progress = progress.UploadProgress()
+        limiter = None
+        if self.adaptive_concurrency:
+            limiter = concurrency.AdaptiveConcurrencyLimiter(
+                self.upload_concurrency,
+                floor=self.min_upload_concurrency,
+                ceiling=self.max_upload_concurrency
+            )
+        uploader = upload.S3Uploader(
+            s3_bucket_name,
+            max_workers=self.upload_concurrency,
+            progress=upload_progress,
+            concurrency=limiter,
+            journal=multipart.UploadJournal(
+                self._state_path('uploads.sqlite3')
+            )
+        )
+        jobs = self._list_upload_jobs(self.upload_directory)
+        if self.precompress_files:
+            variant_builder = compress.CompressedVariantBuilder(
+                self._state_path('compressed')
+            )
+            jobs = variant_builder.add_variants(jobs)
+        if self.sync_files:
+            file_manifest = self.file_manifest
+            synchronizer = sync.BucketSynchronizer(
+                uploader.client,
+                s3_bucket_name,
+                manifest=file_manifest,
+                max_workers=self.upload_concurrency
+            )
+            with tracing.span('list_remote_objects'):
+                synchronizer.list_remote_objects()
+            try:
+                with tracing.span('upload_files'):
+                    result = uploader.upload(
+                        synchronizer.track_local_files(jobs),
+                        should_upload=synchronizer.has_changed
                     )
-                else:
-                    file_url = file
-
-                # Determine the MIME type of each file.
-                mime_type, _ = mimetypes.guess_type(file)
-
-                # Upload the file to the S3 bucket.
-                client.upload_file(
-                    local_filepath,
-                    s3_bucket_name,
-                    file_url,
-                    {'ContentType': mime_type}
+            finally:
+                # ETags are worth keeping even if some uploads failed,
+                # but entries are only pruned once every local file has
+                # been seen, so that those of the rest are not lost.
+                keep_keys = None
+                if synchronizer.tracked_all_local_files:
+                    keep_keys = synchronizer.local_keys
+                with tracing.span('save_manifest'):
+                    file_manifest.save(keep_keys=keep_keys)
+        else:
+            with tracing.span('upload_files'):
+                result = uploader.upload(jobs)
+        upload_progress.finish()
+        if limiter is not None:
+            print(limiter.summary())
+        if result.failures:
+            print(f'{len(result.failures)} file(s) could not be uploaded:')
+            for failure in result.failures:
+                print(f'  {failure.key}: {failure.error}')
+            raise SystemExit('Upload failed')
+        print(''.join([
+            f'Uploaded {len(result.uploaded)} file(s); ',
+            f'{len(result.skipped)} unchanged file(s) skipped',
+        ]))
+        aborted = uploader.abort_orphaned_uploads()
+        if aborted:
+            print(f'Aborted {aborted} incomplete multipart upload(s)')
+        changed_keys = list(result.uploaded)
+        if self.sync_files and self.delete_removed_files:
+            with tracing.span('delete_removed_objects'):
+                deleted, errors = synchronizer.delete_removed_objects()
+            print(f'Deleted {len(deleted)} file(s) from S3 bucket')
+            if errors:
+                for error in errors:
+                    print(f"  {error['Key']}: {error['Message']}")
+                raise SystemExit(
+                    f'{len(errors)} file(s) could not be deleted'
+                )
+            changed_keys.extend(deleted)
+        print('Finished')
+        return changed_keys
+
+    def _prepare_files(self):
+        """
+        Prepares the static files before they are uploaded.
+
+        Builds the fingerprinted copy of the site if FINGERPRINT_ASSETS
+        is enabled and, in sync mode, hashes the files that are not
+        already in the manifest, so that this work does not delay the
+        upload.
+        """
+        self.upload_directory = self.source_directory
+        if self.fingerprint_assets:
+            with tracing.span('fingerprint_assets'):
+                self.upload_directory = self._fingerprint_assets()
+        if self.sync_files:
+            self.file_manifest = self._open_manifest()
+            with tracing.span('hash_files'):
+                self.file_manifest.hash_files(
+                    self._list_upload_jobs(self.upload_directory),
+                    max_workers=self.upload_concurrency
                 )
 
+    def _should_invalidate(self):
+        """
+        Returns True if changed files should be invalidated after the
+        upload.
+
+        Unless INVALIDATE_CHANGED_FILES is set, files are only
+        invalidated in sync mode, since otherwise every file counts as
+        changed.
+        """
+        if self.invalidate_changed_files is not None:
+            return self.invalidate_changed_files
+        if not self.sync_files:
+            print(
+                'SYNC_FILES is off, so every file counts as changed; '
+                'skipping CloudFront invalidation'
+            )
+        return self.sync_files
+
+    def _invalidate_cache(self, changed_keys):
+        """
+        Removes the objects that changed from CloudFront's edge caches.
+
+        Nothing is invalidated if the distribution was only just
+        created, since its caches are still empty.
+        """
+        if self.stack_status == utils.STACK_CREATED:
+            print('New distribution; skipping CloudFront invalidation')
+            return
+        paths = invalidation.plan_invalidation_paths(
+            changed_keys,
+            homepage=self.homepage,
+            wildcard_threshold=self.invalidation_wildcard_threshold
+        )
+        if not paths:
+            print('No files changed; skipping CloudFront invalidation')
+            return
+        distribution_id = self._get_stack_output(
+            self.stack_name,
+            'CloudFrontDistributionId'
+        )
+        invalidator = invalidation.CloudFrontInvalidator(
+            clients.get_client('cloudfront'),
+            distribution_id
+        )
+        with tracing.span('invalidate', paths=len(paths)):
+            invalidator.invalidate(paths, wait=self.wait_for_invalidation)
+
+    def _precompressed_variants(self):
+        """
+        Returns (Content-Encoding, key suffix) pairs for the variants
+        that are uploaded alongside each compressible file.
+        """
+        if not self.precompress_files:
+            return None
+        return [
+            (encoding, compress.VARIANT_EXTENSIONS[encoding])
+            for encoding in compress.available_encodings()
+        ]
+
+    def _state_path(self, name):
+        """
+        Returns the path of a file or directory in the state directory.
+
+        Each source directory has its own state so that sites deployed
+        from the same project do not share cached data.
+        """
+        source_path = os.path.abspath(self.source_directory)
+        source_hash = hashlib.sha1(source_path.encode()).hexdigest()[:12]
+        return os.path.join(self.state_directory, source_hash, name)
+
+    def _open_manifest(self):
+        """
+        Opens the manifest of cached ETags for the source directory.
+        """
+        return manifest.FileManifest(
+            self._state_path('manifest.sqlite3'),
+            rebuild=self.rebuild_manifest
+        )
+
+    def _fingerprint_assets(self):
+        """
+        Builds a copy of the site with fingerprinted asset names.
+
+        Returns the build directory, which is uploaded in place of the
+        source directory.
+        """
+        print('Fingerprinting static assets...')
+        build_directory = self._state_path('build')
+        fingerprinter = fingerprint.AssetFingerprinter(
+            self.source_directory,
+            build_directory,
+            exclude_patterns=self.fingerprint_exclude,
+            ignore_patterns=self.ignore_patterns,
+            follow_symlinks=self.follow_symlinks,
+            cache_filepath=self._state_path('asset-digests.json'),
+            rebuild=self.rebuild_manifest
+        )
+        mapping = fingerprinter.build(self._state_path('asset-manifest.json'))
+        print(f'Fingerprinted {len(mapping)} asset(s)')
+        return build_directory
+
+    def _list_upload_jobs(self, upload_directory):
+        """
+        Yields an UploadJob for each file that should be uploaded.
+        """
+        source_walker = walker.SourceTreeWalker(
+            upload_directory,
+            ignore_patterns=self.ignore_patterns,
+            follow_symlinks=self.follow_symlinks
+        )
+        for record in source_walker.walk():
+            yield upload.UploadJob(
+                record.path,
+                record.key,
+                self._extra_args(record.key, record.mime_type)
+            )
+
         # If no 404 file is specified, use the default.
         if self._404_file is None:
-            client.upload_file(
+            yield upload.UploadJob(
                 os.path.join(BASE_DIR, 'html', '404.html'),
-                s3_bucket_name,
                 '404.html',
-                {'ContentType': 'text/html'}
+                self._extra_args('404.html', 'text/html')
             )
 
         # If no 500 file is specified, use the default.
         if self._500_file is None:
-            client.upload_file(
+            yield upload.UploadJob(
                 os.path.join(BASE_DIR, 'html', '500.html'),
-                s3_bucket_name,
                 '500.html',
-                {'ContentType': 'text/html'}
+                self._extra_args('500.html', 'text/html')
             )
-        print('Finished')
+
+    def _extra_args(self, key, mime_type):
+        """
+        Returns the metadata the object with the given key is uploaded
+        with, according to the CACHE_CONTROL_RULES setting.
+        """
+        extra_args = {'ContentType': mime_type}
+        extra_args.update(self.metadata_rules.metadata_for(key))
+        return extra_args
 
     def get_hosted_zone_id(self):
         """
-        Retrieves the hosted zone ID for the site's domain name.
+        Retrieves the ID of the public hosted zone for the site's domain
+        name, or of its nearest parent domain that has one.
 
         Note: Assumes a hosted zone already exists for the specified
         domain.
         """
-        client = boto3.client('route53')
-        hosted_zones = client.list_hosted_zones()
-        hosted_zone_id = None
-        for item in hosted_zones['HostedZones']:
-            if item['Name'] in [self.domain_name, f'{self.domain_name}.']:
-                hosted_zone_id = item['Id'].split('/')[2]
+        if self.hosted_zone_resolver is None:
+            self.hosted_zone_resolver = hosted_zones.HostedZoneResolver(
+                clients.get_client('route53')
+            )
+        with tracing.span('resolve_hosted_zone'):
+            hosted_zone_id = self.lookup_cache.lookup(
+                self._lookup_key('hosted-zone', self.domain_name),
+                HOSTED_ZONE_TTL,
+                lambda: self.hosted_zone_resolver.resolve(self.domain_name)
+            )
         if hosted_zone_id:
             return hosted_zone_id
         else:
@@ -251,7 +645,7 @@ class CloudFrontDistributionStackCreator(utils.CloudFormationStackCreator):
         """
         Retrieves the name of the S3 bucket.
         """
-        return self._get_stack_output('static-website', 'S3BucketName')
+        return self._get_stack_output(self.stack_name, 'S3BucketName')
 
 
 create_static_website = CloudFrontDistributionStackCreator
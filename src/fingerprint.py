@@ -0,0 +1,532 @@
+"""
+Defines a build stage that fingerprints static assets.
+
+The AssetFingerprinter class copies the source directory into a build
+directory, adding a copy of each static asset whose name contains a
+hash of its content (for example `logo.png` is also written as
+`logo.3f9a1c2b.png`), and rewrites the references to those assets in
+HTML and CSS files. Since the URL of an asset changes whenever its
+content does, the fingerprinted copies can be cached indefinitely.
+Scripts are only fingerprinted if an HTML file loads them with a
+`<script src>` tag. Each asset is also kept under its original name, so
+references that are not rewritten, such as imports between scripts,
+manifests or meta tags, keep working.
+
+The mapping of original to fingerprinted paths is written to a JSON
+manifest. The digests of assets can be cached in another JSON file, by
+size and modification time, so that unchanged assets are not read
+again on the next build.
+"""
+
+from concurrent import futures
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import threading
+import time
+from urllib.parse import quote, unquote
+
+from src import manifest, metadata, sync, walker
+
+
+# Files with these extensions are fingerprinted. HTML files are never
+# fingerprinted, since their URLs are the ones visitors type or
+# bookmark.
+FINGERPRINTED_EXTENSIONS = (
+    '.css',
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif', '.ico',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot',
+    '.mp4', '.webm', '.mp3', '.ogg',
+)
+
+# Files with these extensions are fingerprinted if an HTML file loads
+# them with a <script src> tag. Source maps are not fingerprinted, so
+# the sourceMappingURL comments of scripts keep working.
+SCRIPT_EXTENSIONS = ('.js', '.mjs')
+
+# Files with these extensions have their references rewritten.
+HTML_EXTENSIONS = ('.html', '.htm')
+CSS_EXTENSIONS = ('.css',)
+
+# The number of hexadecimal digits of the hash included in file names.
+HASH_LENGTH = 8
+
+# Matches URLs in HTML attributes that reference other files.
+HTML_ATTRIBUTE_PATTERN = re.compile(
+    r'''(\b(?:src|href|poster|data-src)\s*=\s*)(["'])(.*?)\2''',
+    re.IGNORECASE | re.DOTALL
+)
+# Matches the src attributes of script tags.
+HTML_SCRIPT_PATTERN = re.compile(
+    r'''<script\b[^>]*?\bsrc\s*=\s*(["'])(.*?)\1''',
+    re.IGNORECASE | re.DOTALL
+)
+# Matches the candidate lists of srcset attributes.
+HTML_SRCSET_PATTERN = re.compile(
+    r'''(\bsrcset\s*=\s*)(["'])(.*?)\2''',
+    re.IGNORECASE | re.DOTALL
+)
+# Matches url() references in CSS, including inline styles in HTML.
+CSS_URL_PATTERN = re.compile(
+    r'''(url\(\s*)(["']?)([^"')]*?)\2(\s*\))''',
+    re.IGNORECASE
+)
+# Matches @import rules in CSS that do not use url().
+CSS_IMPORT_PATTERN = re.compile(r'''(@import\s+)(["'])(.*?)\2''')
+
+# Matches URLs that point to other sites or are not file paths.
+EXTERNAL_URL_PATTERN = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|//|#)')
+
+# The asset mapping used by worker processes that rewrite HTML files.
+_html_mapping = {}
+
+
+def fingerprinted_path(relative_path, content):
+    """
+    Returns the path with a hash of the content added to the file name.
+    """
+    return digest_path(relative_path, hashlib.sha256(content).hexdigest())
+
+
+def digest_path(relative_path, digest):
+    """
+    Returns the path with the start of a hexadecimal digest added to
+    the file name.
+    """
+    root, extension = posixpath.splitext(relative_path)
+    return f'{root}.{digest[:HASH_LENGTH]}{extension}'
+
+
+def file_digest(filepath):
+    """
+    Returns the SHA-256 digest of a file, reading it a block at a time.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(sync.READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def resolve_reference(url, referrer):
+    """
+    Returns the relative path of the file a URL points to, or None.
+
+    The second item of the returned tuple is the URL with its query
+    string and fragment removed.
+    """
+    if not url or EXTERNAL_URL_PATTERN.match(url):
+        return (None, url)
+    path = re.split(r'[?#]', url, maxsplit=1)[0]
+    if not path:
+        return (None, url)
+    if path.startswith('/'):
+        relative_path = unquote(path).lstrip('/')
+    else:
+        relative_path = posixpath.normpath(
+            posixpath.join(posixpath.dirname(referrer), unquote(path))
+        )
+    return (relative_path, path)
+
+
+def rewrite_url(url, referrer, mapping):
+    """
+    Returns the URL pointing to the fingerprinted copy of its file.
+
+    Only the file name is replaced, so relative and absolute URLs keep
+    their form, along with any query string or fragment.
+    """
+    relative_path, path = resolve_reference(url, referrer)
+    if relative_path not in mapping:
+        return url
+    new_name = quote(posixpath.basename(mapping[relative_path]))
+    return path[:path.rfind('/') + 1] + new_name + url[len(path):]
+
+
+def rewrite_css(content, referrer, mapping):
+    """
+    Rewrites the url() and @import references in a stylesheet.
+    """
+    content = CSS_URL_PATTERN.sub(
+        lambda match: ''.join([
+            match.group(1),
+            match.group(2),
+            rewrite_url(match.group(3), referrer, mapping),
+            match.group(2),
+            match.group(4),
+        ]),
+        content
+    )
+    return CSS_IMPORT_PATTERN.sub(
+        lambda match: ''.join([
+            match.group(1),
+            match.group(2),
+            rewrite_url(match.group(3), referrer, mapping),
+            match.group(2),
+        ]),
+        content
+    )
+
+
+def rewrite_html(content, referrer, mapping):
+    """
+    Rewrites the references to other files in an HTML document.
+    """
+    def rewrite_srcset(match):
+        candidates = []
+        for candidate in match.group(3).split(','):
+            parts = candidate.strip().split(None, 1)
+            if parts:
+                parts[0] = rewrite_url(parts[0], referrer, mapping)
+            candidates.append(' '.join(parts))
+        return ''.join([
+            match.group(1),
+            match.group(2),
+            ', '.join(candidates),
+            match.group(2),
+        ])
+
+    content = HTML_ATTRIBUTE_PATTERN.sub(
+        lambda match: ''.join([
+            match.group(1),
+            match.group(2),
+            rewrite_url(match.group(3), referrer, mapping),
+            match.group(2),
+        ]),
+        content
+    )
+    content = HTML_SRCSET_PATTERN.sub(rewrite_srcset, content)
+    return rewrite_css(content, referrer, mapping)
+
+
+def css_dependencies(content, referrer):
+    """
+    Returns the relative paths of the files a stylesheet references.
+    """
+    dependencies = set()
+    for pattern in (CSS_URL_PATTERN, CSS_IMPORT_PATTERN):
+        for match in pattern.finditer(content):
+            relative_path, _ = resolve_reference(match.group(3), referrer)
+            if relative_path is not None:
+                dependencies.add(relative_path)
+    return dependencies
+
+
+def script_sources(content, referrer):
+    """
+    Returns the relative paths of the scripts an HTML document loads.
+    """
+    sources = set()
+    for match in HTML_SCRIPT_PATTERN.finditer(content):
+        relative_path, _ = resolve_reference(match.group(2), referrer)
+        if relative_path is not None:
+            sources.add(relative_path)
+    return sources
+
+
+def write_if_changed(filepath, content):
+    """
+    Writes the content to the file unless it already contains it.
+
+    Leaving unchanged files alone preserves their modification times,
+    so later stages can tell that they have not changed.
+    """
+    try:
+        with open(filepath, 'rb') as file:
+            if file.read() == content:
+                return
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'wb') as file:
+        file.write(content)
+
+
+def copy_if_changed(source_filepath, filepath):
+    """
+    Copies the file unless an identical copy already exists.
+    """
+    source_stat = os.stat(source_filepath)
+    try:
+        stat = os.stat(filepath)
+        if (stat.st_size == source_stat.st_size
+                and stat.st_mtime_ns == source_stat.st_mtime_ns):
+            return
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    shutil.copy2(source_filepath, filepath)
+
+
+def _process_html_file(source_filepath, filepath, referrer):
+    """
+    Rewrites an HTML file using the mapping in _html_mapping.
+
+    Runs in a worker process; _html_mapping is set by _set_html_mapping
+    when the process starts.
+    """
+    with open(source_filepath, 'rb') as file:
+        content = file.read().decode('utf-8', errors='surrogateescape')
+    content = rewrite_html(content, referrer, _html_mapping)
+    write_if_changed(filepath, content.encode('utf-8', 'surrogateescape'))
+
+
+def _set_html_mapping(mapping):
+    global _html_mapping
+    _html_mapping = mapping
+
+
+class AssetFingerprinter:
+
+    def __init__(self, source_directory, build_directory,
+                 exclude_patterns=(), max_workers=None, ignore_patterns=(),
+                 follow_symlinks=False, cache_filepath=None, rebuild=False):
+        """
+        If cache_filepath is given, the digests of assets are cached in
+        that file between builds. If rebuild is True, the digests that
+        were cached earlier are not used.
+        """
+        self.source_directory = source_directory
+        self.build_directory = build_directory
+        self.ignore_patterns = ignore_patterns
+        self.follow_symlinks = follow_symlinks
+        self.exclude_patterns = [
+            metadata.compile_pattern(pattern) for pattern in exclude_patterns
+        ]
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_filepath = cache_filepath
+        self.rebuild = rebuild
+        # Maps the relative path of each asset to its new path.
+        self.mapping = {}
+        # Maps the relative path of each asset to its size, modification
+        # time and digest.
+        self._digests = {}
+        self._digests_lock = threading.Lock()
+
+    def build(self, manifest_filepath):
+        """
+        Writes the fingerprinted copy of the site to the build directory
+        and returns the mapping of original to fingerprinted paths.
+        """
+        (html_files, css_files, assets, scripts,
+         other_files) = self._classify_files()
+        self._load_digests()
+        with futures.ThreadPoolExecutor(self.max_workers) as pool:
+            loaded_scripts = set()
+            if scripts:
+                loaded_scripts = self._loaded_scripts(html_files, pool)
+            for relative_path in scripts:
+                if relative_path in loaded_scripts:
+                    assets.append(relative_path)
+                else:
+                    other_files.append(relative_path)
+            self.mapping.update(pool.map(self._fingerprint_asset, assets))
+            self._fingerprint_stylesheets(css_files, pool)
+            self._save_digests(assets)
+            list(pool.map(
+                lambda path: copy_if_changed(
+                    self._source_path(path),
+                    self._build_path(path)
+                ),
+                other_files
+            ))
+        with futures.ProcessPoolExecutor(
+            self.max_workers,
+            initializer=_set_html_mapping,
+            initargs=(self.mapping,)
+        ) as pool:
+            list(pool.map(
+                _process_html_file,
+                [self._source_path(path) for path in html_files],
+                [self._build_path(path) for path in html_files],
+                html_files,
+                chunksize=64
+            ))
+        self._remove_stale_files(
+            set(html_files)
+            | set(other_files)
+            | set(self.mapping)
+            | set(self.mapping.values())
+        )
+        os.makedirs(os.path.dirname(manifest_filepath) or '.', exist_ok=True)
+        with open(manifest_filepath, 'w') as manifest_file:
+            json.dump(self.mapping, manifest_file, indent=2, sort_keys=True)
+        return self.mapping
+
+    def _classify_files(self):
+        """
+        Sorts the files in the source directory by how they are built.
+        """
+        html_files, css_files, assets, scripts, other_files = (
+            [], [], [], [], []
+        )
+        source_walker = walker.SourceTreeWalker(
+            self.source_directory,
+            ignore_patterns=self.ignore_patterns,
+            follow_symlinks=self.follow_symlinks
+        )
+        for record in source_walker.walk():
+            relative_path = record.key
+            extension = posixpath.splitext(relative_path)[1].lower()
+            excluded = any(
+                regex.match(relative_path)
+                for regex in self.exclude_patterns
+            )
+            if extension in HTML_EXTENSIONS:
+                html_files.append(relative_path)
+            elif extension in SCRIPT_EXTENSIONS and not excluded:
+                scripts.append(relative_path)
+            elif excluded or extension not in FINGERPRINTED_EXTENSIONS:
+                other_files.append(relative_path)
+            elif extension in CSS_EXTENSIONS:
+                css_files.append(relative_path)
+            else:
+                assets.append(relative_path)
+        return (html_files, css_files, assets, scripts, other_files)
+
+    def _loaded_scripts(self, html_files, pool):
+        """
+        Returns the relative paths of the scripts that HTML files load
+        with <script src> tags.
+        """
+        def read_sources(relative_path):
+            with open(self._source_path(relative_path), 'rb') as file:
+                content = file.read().decode('utf-8', 'surrogateescape')
+            return script_sources(content, relative_path)
+
+        loaded_scripts = set()
+        for sources in pool.map(read_sources, html_files):
+            loaded_scripts.update(sources)
+        return loaded_scripts
+
+    def _fingerprint_asset(self, relative_path):
+        """
+        Copies an asset to its original and fingerprinted paths in the
+        build directory.
+        """
+        digest = self._asset_digest(relative_path)
+        new_path = digest_path(relative_path, digest)
+        for path in (relative_path, new_path):
+            copy_if_changed(
+                self._source_path(relative_path),
+                self._build_path(path)
+            )
+        return (relative_path, new_path)
+
+    def _asset_digest(self, relative_path):
+        """
+        Returns the digest of an asset, hashing it only if its size or
+        modification time has changed since it was cached.
+        """
+        filepath = self._source_path(relative_path)
+        stat = os.stat(filepath)
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+        with self._digests_lock:
+            entry = self._digests.get(relative_path)
+        if entry is not None and entry[:2] == fingerprint:
+            return entry[2]
+        digest = file_digest(filepath)
+        # A second change within the resolution of the file system's
+        # timestamps would go unnoticed.
+        if time.time_ns() - stat.st_mtime_ns >= manifest.MINIMUM_FILE_AGE_NS:
+            with self._digests_lock:
+                self._digests[relative_path] = fingerprint + [digest]
+        return digest
+
+    def _load_digests(self):
+        if self.cache_filepath is None or self.rebuild:
+            return
+        try:
+            with open(self.cache_filepath) as cache_file:
+                self._digests = json.load(cache_file)
+        except FileNotFoundError:
+            pass
+        except ValueError as err:
+            print(f'Discarding unreadable digest cache: {err}')
+
+    def _save_digests(self, assets):
+        """
+        Writes the cached digests of the current assets to the cache.
+        """
+        if self.cache_filepath is None:
+            return
+        digests = {
+            path: self._digests[path]
+            for path in assets
+            if path in self._digests
+        }
+        directory = os.path.dirname(self.cache_filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.cache_filepath, 'w') as cache_file:
+            json.dump(digests, cache_file)
+
+    def _fingerprint_stylesheets(self, css_files, pool):
+        """
+        Rewrites and fingerprints each stylesheet.
+
+        A stylesheet's hash depends on the names of the files it
+        references, so stylesheets that import other stylesheets are
+        processed after them. Stylesheets that import each other in a
+        cycle are processed last, without those references rewritten.
+        """
+        contents = {}
+        dependencies = {}
+        for relative_path in css_files:
+            with open(self._source_path(relative_path), 'rb') as file:
+                contents[relative_path] = file.read().decode(
+                    'utf-8',
+                    errors='surrogateescape'
+                )
+            dependencies[relative_path] = css_dependencies(
+                contents[relative_path],
+                relative_path
+            ) & set(css_files)
+        remaining = set(css_files)
+        while remaining:
+            ready = [
+                path for path in remaining
+                if not (dependencies[path] & remaining)
+            ] or list(remaining)
+            # Stylesheets in the same round must not see each other's
+            # new names, so the mapping is only updated once all of
+            # them are finished.
+            self.mapping.update(list(pool.map(
+                lambda path: self._fingerprint_stylesheet(
+                    path,
+                    contents[path]
+                ),
+                sorted(ready)
+            )))
+            remaining.difference_update(ready)
+
+    def _fingerprint_stylesheet(self, relative_path, content):
+        """
+        Writes the rewritten stylesheet to its fingerprinted path, and
+        the original one to its original path, in the build directory.
+        """
+        copy_if_changed(
+            self._source_path(relative_path),
+            self._build_path(relative_path)
+        )
+        content = rewrite_css(content, relative_path, self.mapping)
+        content = content.encode('utf-8', 'surrogateescape')
+        new_path = fingerprinted_path(relative_path, content)
+        write_if_changed(self._build_path(new_path), content)
+        return (relative_path, new_path)
+
+    def _remove_stale_files(self, current_paths):
+        """
+        Deletes files left in the build directory by earlier builds.
+        """
+        build_walker = walker.SourceTreeWalker(self.build_directory)
+        for record in build_walker.walk():
+            if record.key not in current_paths:
+                os.remove(record.path)
+
+    def _source_path(self, relative_path):
+        return os.path.join(self.source_directory, *relative_path.split('/'))
+
+    def _build_path(self, relative_path):
+        return os.path.join(self.build_directory, *relative_path.split('/'))
@@ -0,0 +1,133 @@
+"""
+Defines a class that finds the Route 53 hosted zone for a domain name.
+
+Route 53 lists hosted zones in order of their names with the labels
+reversed, so a listing that starts at a domain name returns that
+domain's zones first. The HostedZoneResolver class uses this to find a
+zone with a single request however many zones the account has, falling
+back to the zones of parent domains for subdomain sites. When several
+domain names are resolved in one run, every zone is listed once and
+looked up in an index instead.
+"""
+
+import threading
+
+
+# The number of zones requested at once. Only a public and a private
+# zone can share a name, but a few more cost nothing.
+PAGE_SIZE = 10
+
+
+def normalize_name(domain_name):
+    """
+    Returns a domain name in the form Route 53 uses for zone names.
+    """
+    return domain_name.lower().rstrip('.') + '.'
+
+
+def candidate_names(domain_name):
+    """
+    Returns the names of the zones that could contain the domain name,
+    most specific first.
+
+    Top-level domains are not included.
+    """
+    labels = normalize_name(domain_name).rstrip('.').split('.')
+    return [
+        '.'.join(labels[index:]) + '.'
+        for index in range(len(labels) - 1)
+    ]
+
+
+class HostedZoneResolver:
+
+    def __init__(self, client):
+        self.client = client
+        # Maps zone names to the IDs of their public zones. None marks a
+        # name that is known to have no public zone.
+        self._zones = {}
+        self._complete = False
+        self._lock = threading.Lock()
+
+    def resolve(self, domain_name):
+        """
+        Returns the ID of the public hosted zone that contains the
+        domain name, or None if the account has no such zone.
+
+        A zone for the domain name itself is preferred over zones for
+        its parent domains. Private zones are ignored, since they cannot
+        serve the site or validate its certificate.
+        """
+        for name in candidate_names(domain_name):
+            with self._lock:
+                known = name in self._zones or self._complete
+                zone_id = self._zones.get(name)
+            if not known:
+                zone_id = self._look_up(name)
+            if zone_id is not None:
+                return zone_id
+        return None
+
+    def load_all(self):
+        """
+        Lists every hosted zone in the account into the index, so that
+        any number of domain names can then be resolved without further
+        requests.
+        """
+        zones = {}
+        kwargs = {}
+        while True:
+            response = self.client.list_hosted_zones_by_name(**kwargs)
+            for zone in response['HostedZones']:
+                self._add_zone(zones, zone)
+            if not response.get('IsTruncated'):
+                break
+            kwargs = {
+                'DNSName': response['NextDNSName'],
+                'HostedZoneId': response['NextHostedZoneId'],
+            }
+        with self._lock:
+            self._zones = zones
+            self._complete = True
+
+    def _look_up(self, name):
+        """
+        Lists the zones starting at the name and records whether it has
+        a public zone.
+        """
+        zones = {}
+        kwargs = {'DNSName': name, 'MaxItems': str(PAGE_SIZE)}
+        while True:
+            response = self.client.list_hosted_zones_by_name(**kwargs)
+            for zone in response['HostedZones']:
+                self._add_zone(zones, zone)
+            last_zone = response['HostedZones'][-1:]
+            # Stop once the listing has moved past zones with the name.
+            if (not response.get('IsTruncated') or not last_zone
+                    or normalize_name(last_zone[0]['Name']) != name):
+                break
+            kwargs = {
+                'DNSName': response['NextDNSName'],
+                'HostedZoneId': response['NextHostedZoneId'],
+                'MaxItems': str(PAGE_SIZE),
+            }
+        zones.setdefault(name, None)
+        # Other names may have a public zone beyond the end of the
+        # listing, so only their public zones are certain.
+        zones = {
+            zone_name: zone_id for zone_name, zone_id in zones.items()
+            if zone_name == name or zone_id is not None
+        }
+        with self._lock:
+            self._zones.update(zones)
+        return zones[name]
+
+    def _add_zone(self, zones, zone):
+        """
+        Records a zone from a listing in a dictionary of zones.
+        """
+        name = normalize_name(zone['Name'])
+        if zone.get('Config', {}).get('PrivateZone'):
+            zones.setdefault(name, None)
+        else:
+            zones[name] = zone['Id'].split('/')[-1]
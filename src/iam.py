@@ -115,12 +115,16 @@ class IAMTemplateGenerator:
             'Sid': 'AllowS3BucketCreationPermissions',
             'Effect': 'Allow',
             'Action': [
+                's3:AbortMultipartUpload',
                 's3:CreateBucket',
+                's3:DeleteObject',
                 's3:GetBucketPolicy',
                 's3:GetBucketLocation',
                 's3:GetObject',
                 's3:ListAllMyBuckets',
                 's3:ListBucket',
+                's3:ListBucketMultipartUploads',
+                's3:ListMultipartUploadParts',
                 's3:PutBucketPolicy',
                 's3:PutEncryptionConfiguration',
                 's3:PutObject',
@@ -149,6 +153,7 @@ class IAMTemplateGenerator:
                 'route53:GetChange',
                 'route53:GetHostedZone',
                 'route53:ListHostedZones',
+                'route53:ListHostedZonesByName',
                 'route53:ListResourceRecordSets',
             ],
             'Resource': '*'
@@ -158,27 +163,45 @@ class IAMTemplateGenerator:
             'Action': [
                 'cloudfront:CreateCachePolicy',
                 'cloudfront:CreateDistribution',
+                'cloudfront:CreateFunction',
+                'cloudfront:CreateInvalidation',
                 'cloudfront:CreateOriginAccessControl',
                 'cloudfront:CreateResponseHeadersPolicy',
+                'cloudfront:DeleteCachePolicy',
+                'cloudfront:DeleteFunction',
+                'cloudfront:DeleteOriginAccessControl',
+                'cloudfront:DeleteResponseHeadersPolicy',
+                'cloudfront:DescribeFunction',
                 'cloudfront:GetCachePolicy',
                 'cloudfront:GetDistribution',
                 'cloudfront:GetDistributionConfig',
+                'cloudfront:GetFunction',
+                'cloudfront:GetInvalidation',
                 'cloudfront:GetOriginAccessControl',
                 'cloudfront:GetResponseHeadersPolicyConfig',
                 'cloudfront:GetResponseHeadersPolicy',
                 'cloudfront:ListCachePolicies',
                 'cloudfront:ListDistributions',
+                'cloudfront:PublishFunction',
                 'cloudfront:TagResource',
+                'cloudfront:UpdateCachePolicy',
                 'cloudfront:UpdateDistribution',
+                'cloudfront:UpdateFunction',
                 'cloudfront:UpdateOriginAccessControl',
+                'cloudfront:UpdateResponseHeadersPolicy',
             ],
             'Resource': '*'
         }, {
             'Sid': 'AllowCloudFormationStackCreationPermissions',
             'Effect': 'Allow',
             'Action': [
+                'cloudformation:CreateChangeSet',
                 'cloudformation:CreateStack',
+                'cloudformation:DeleteChangeSet',
+                'cloudformation:DescribeChangeSet',
+                'cloudformation:DescribeStackEvents',
                 'cloudformation:DescribeStacks',
+                'cloudformation:ExecuteChangeSet',
             ],
             'Resource': '*'
         }]
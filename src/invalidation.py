@@ -0,0 +1,144 @@
+"""
+Defines tools for invalidating the files that changed in a deployment.
+
+The plan_invalidation_paths() function collapses the keys of changed
+objects into the smallest practical set of CloudFront invalidation
+paths, and the CloudFrontInvalidator class submits them and waits for
+the invalidation to complete.
+"""
+
+from collections import Counter
+import posixpath
+import sys
+import time
+from urllib.parse import quote
+
+from src import polling
+
+
+# CloudFront allows at most 3000 file paths and 15 wildcard paths to be
+# in progress at once.
+MAX_PATHS = 3000
+MAX_WILDCARD_PATHS = 15
+
+# Characters that may appear unescaped in an invalidation path.
+SAFE_PATH_CHARACTERS = "/~!$&'()+,;=:@"
+
+
+def _parent_wildcard(path):
+    """
+    Returns the wildcard path covering the directory that contains path.
+    """
+    directory = posixpath.dirname(path.rstrip('*').rstrip('/'))
+    return directory.rstrip('/') + '/*'
+
+
+def plan_invalidation_paths(changed_keys, homepage=None,
+                            wildcard_threshold=20):
+    """
+    Returns the invalidation paths that cover every changed key.
+
+    Once more than wildcard_threshold keys change in the same directory
+    they are replaced by a single wildcard path for that directory.
+    Directories are then collapsed into their parents, starting with the
+    one that saves the most paths, until the plan fits within
+    CloudFront's limits. If homepage is among the changed keys, the root
+    path `/` is invalidated as well.
+    """
+    paths = set()
+    for key in changed_keys:
+        path = '/' + quote(key, safe=SAFE_PATH_CHARACTERS)
+        paths.add(path)
+        if key == homepage:
+            paths.add('/')
+    if not paths:
+        return []
+
+    # Collapse the directories that have too many changed files.
+    counts = Counter(_parent_wildcard(path) for path in paths if path != '/')
+    crowded = {
+        wildcard for wildcard, count in counts.items()
+        if count > wildcard_threshold
+    }
+    paths = {
+        _parent_wildcard(path)
+        if path != '/' and _parent_wildcard(path) in crowded else path
+        for path in paths
+    }
+    paths = _remove_covered_paths(paths)
+
+    # Collapse further until the plan is within CloudFront's limits.
+    while (len(paths) > MAX_PATHS
+           or sum(path.endswith('*') for path in paths) > MAX_WILDCARD_PATHS):
+        counts = Counter(
+            _parent_wildcard(path) for path in paths if path != '/*'
+        )
+        # Prefer the deepest directory among those that save the most
+        # paths, so that as little of the cache as possible is evicted.
+        wildcard, _ = max(
+            counts.items(),
+            key=lambda item: (item[1], item[0].count('/'))
+        )
+        paths = _remove_covered_paths(paths | {wildcard})
+    return sorted(paths)
+
+
+def _remove_covered_paths(paths):
+    """
+    Removes paths that are already covered by a wildcard path.
+    """
+    prefixes = [path[:-1] for path in paths if path.endswith('*')]
+    return {
+        path for path in paths
+        if not any(
+            path != prefix + '*' and path.startswith(prefix)
+            for prefix in prefixes
+        )
+    }
+
+
+class CloudFrontInvalidator:
+
+    def __init__(self, client, distribution_id):
+        self.client = client
+        self.distribution_id = distribution_id
+
+    def invalidate(self, paths, wait=True, timeout=1800):
+        """
+        Creates an invalidation for the paths and, if wait is True,
+        waits until CloudFront reports that it has completed.
+        """
+        response = self.client.create_invalidation(
+            DistributionId=self.distribution_id,
+            InvalidationBatch={
+                'Paths': {'Quantity': len(paths), 'Items': list(paths)},
+                'CallerReference': f'static-site-{time.time_ns()}',
+            }
+        )
+        invalidation_id = response['Invalidation']['Id']
+        print(f'Invalidating {len(paths)} path(s) in CloudFront...')
+        if wait:
+            self._wait_for_completion(invalidation_id, timeout)
+        return invalidation_id
+
+    def _wait_for_completion(self, invalidation_id, timeout):
+        """
+        Polls the invalidation until CloudFront reports it is complete.
+        """
+        poller = polling.Poller(initial_delay=2, max_delay=30, timeout=timeout)
+
+        def check():
+            response = self.client.get_invalidation(
+                DistributionId=self.distribution_id,
+                Id=invalidation_id
+            )
+            if response['Invalidation']['Status'] == 'Completed':
+                return True
+            return None
+
+        try:
+            poller.poll(check, f'invalidation {invalidation_id}')
+        except polling.PollingTimeout as err:
+            print(err)
+            sys.exit(1)
+        print('Invalidation completed')
@@ -0,0 +1,207 @@
+"""
+Defines tools for listing every object in an S3 bucket quickly.
+
+A single ListObjectsV2 pagination returns 1000 keys per request, one
+request after another, so listing a bucket with millions of objects
+takes minutes. The BucketLister class first splits the bucket into
+shards at the `/` delimiter, one level of "directories" at a time,
+until there are enough shards to keep its workers busy, and then pages
+through every shard at the same time.
+
+The results are merged into an ObjectIndex, which keeps the size,
+ETag and modification time of each object in flat arrays rather than
+in an object per key, so that millions of entries fit in a modest
+amount of memory.
+"""
+
+from array import array
+from collections import namedtuple
+from concurrent import futures
+from datetime import datetime, timezone
+import math
+import threading
+
+
+# The size, ETag and modification time of an object in the S3 bucket.
+RemoteObject = namedtuple(
+    'RemoteObject',
+    ['size', 'etag', 'last_modified'],
+    defaults=[None]
+)
+
+# The number of shards that are listed at the same time.
+MAX_WORKERS = 8
+
+# How many levels of prefixes are split into shards at most.
+MAX_DISCOVERY_DEPTH = 3
+
+# ETags are stored as their 16-byte MD5 digest and a part count.
+DIGEST_SIZE = 16
+# The part count of an ETag that is kept as a string instead.
+IRREGULAR_ETAG = -1
+
+
+class ObjectIndex:
+    """
+    Compact, dictionary-like index of the objects in a bucket.
+
+    Looking up a key returns a RemoteObject. Entries are added from a
+    single thread at a time.
+    """
+
+    def __init__(self):
+        # The position of each key's entry in the arrays below.
+        self._positions = {}
+        self._sizes = array('q')
+        # Seconds since the epoch, or NaN if the time is unknown.
+        self._modified = array('d')
+        self._digests = bytearray()
+        # 0 for the ETag of a single-part upload, the number of parts
+        # for a multipart upload or IRREGULAR_ETAG.
+        self._part_counts = array('l')
+        self._irregular_etags = {}
+
+    def add(self, key, size, etag, last_modified=None):
+        """
+        Adds an object to the index, replacing any entry for the key.
+        """
+        etag = etag.strip('"')
+        digest, _, parts = etag.partition('-')
+        part_count = IRREGULAR_ETAG
+        if len(digest) == DIGEST_SIZE * 2 and (not parts or parts.isdigit()):
+            try:
+                digest = bytes.fromhex(digest)
+                part_count = int(parts or 0)
+            except ValueError:
+                pass
+        if part_count == IRREGULAR_ETAG:
+            digest = bytes(DIGEST_SIZE)
+        modified = math.nan
+        if last_modified is not None:
+            modified = last_modified.timestamp()
+
+        position = self._positions.get(key)
+        if position is None:
+            self._positions[key] = len(self._sizes)
+            self._sizes.append(size)
+            self._modified.append(modified)
+            self._digests += digest
+            self._part_counts.append(part_count)
+        else:
+            self._sizes[position] = size
+            self._modified[position] = modified
+            start = position * DIGEST_SIZE
+            self._digests[start:start + DIGEST_SIZE] = digest
+            self._part_counts[position] = part_count
+            self._irregular_etags.pop(key, None)
+        if part_count == IRREGULAR_ETAG:
+            self._irregular_etags[key] = etag
+
+    def get(self, key, default=None):
+        position = self._positions.get(key)
+        if position is None:
+            return default
+        part_count = self._part_counts[position]
+        if part_count == IRREGULAR_ETAG:
+            etag = self._irregular_etags[key]
+        else:
+            start = position * DIGEST_SIZE
+            etag = self._digests[start:start + DIGEST_SIZE].hex()
+            if part_count:
+                etag = f'{etag}-{part_count}'
+        modified = self._modified[position]
+        last_modified = None
+        if not math.isnan(modified):
+            last_modified = datetime.fromtimestamp(modified, timezone.utc)
+        return RemoteObject(self._sizes[position], etag, last_modified)
+
+    def __getitem__(self, key):
+        remote_object = self.get(key)
+        if remote_object is None:
+            raise KeyError(key)
+        return remote_object
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+
+class BucketLister:
+
+    def __init__(self, client, bucket_name, max_workers=MAX_WORKERS,
+                 delimiter='/'):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.max_workers = max_workers
+        self.delimiter = delimiter
+        self._lock = threading.Lock()
+
+    def list(self):
+        """
+        Returns an ObjectIndex of every object in the bucket.
+
+        Objects whose keys do not contain the delimiter below the
+        deepest prefix that was split are listed by the request that
+        splits it, so a bucket whose keys are all at the top level is
+        listed one page at a time.
+        """
+        index = ObjectIndex()
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            shards = ['']
+            depth = 0
+            while (shards and len(shards) < self.max_workers
+                    and depth < MAX_DISCOVERY_DEPTH):
+                shards = [
+                    prefix
+                    for prefixes in pool.map(
+                        lambda prefix: self._split_shard(index, prefix),
+                        shards
+                    )
+                    for prefix in prefixes
+                ]
+                depth += 1
+            for _ in pool.map(
+                lambda prefix: self._list_shard(index, prefix),
+                shards
+            ):
+                pass
+        return index
+
+    def _split_shard(self, index, prefix):
+        """
+        Adds the objects directly under the prefix to the index and
+        returns the prefixes one level below it.
+        """
+        prefixes = []
+        for page in self._paginate(Prefix=prefix, Delimiter=self.delimiter):
+            self._add_page(index, page)
+            prefixes.extend(
+                item['Prefix'] for item in page.get('CommonPrefixes', [])
+            )
+        return prefixes
+
+    def _list_shard(self, index, prefix):
+        """
+        Adds every object whose key starts with the prefix to the index.
+        """
+        for page in self._paginate(Prefix=prefix):
+            self._add_page(index, page)
+
+    def _paginate(self, **kwargs):
+        paginator = self.client.get_paginator('list_objects_v2')
+        return paginator.paginate(Bucket=self.bucket_name, **kwargs)
+
+    def _add_page(self, index, page):
+        with self._lock:
+            for item in page.get('Contents', []):
+                index.add(
+                    item['Key'],
+                    item['Size'],
+                    item['ETag'],
+                    item.get('LastModified')
+                )
@@ -0,0 +1,184 @@
+"""
+Defines a persistent cache of the ETags of local files.
+
+The FileManifest class stores the modification time, size, inode and
+ETag of each file in an SQLite database, keyed by the file's path
+relative to the source directory. A file whose stat data has not
+changed since the last deployment reuses its cached ETag instead of
+being read and hashed again.
+"""
+
+from concurrent import futures
+import os
+import sqlite3
+import threading
+import time
+
+from src import sync, upload
+
+
+# Incremented whenever the layout of the database changes.
+SCHEMA_VERSION = 1
+
+# Files modified this recently are not cached, since a second change
+# within the resolution of the file system's timestamps would go
+# unnoticed.
+MINIMUM_FILE_AGE_NS = 2 * 1000 * 1000 * 1000
+
+
+class FileManifest:
+
+    def __init__(self, filepath, rebuild=False):
+        self.filepath = filepath
+        self._entries = {}
+        self._changed_keys = set()
+        self._lock = threading.Lock()
+        if rebuild:
+            self._delete_database()
+        self._load()
+
+    def get_etag(self, key, local_filepath, stat):
+        """
+        Returns the ETag of the file, hashing it only if it has changed.
+
+        The stat argument is the result of os.stat() for the file.
+        """
+        fingerprint = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[:3] == fingerprint:
+            return entry[3]
+        etag = sync.compute_etag(local_filepath, stat.st_size)
+        if time.time_ns() - stat.st_mtime_ns >= MINIMUM_FILE_AGE_NS:
+            with self._lock:
+                self._entries[key] = fingerprint + (etag,)
+                self._changed_keys.add(key)
+        return etag
+
+    def hash_files(self, jobs, max_workers=None):
+        """
+        Computes the ETag of each UploadJob's file in a pool of threads,
+        so that later lookups are answered from the cache.
+        """
+        def hash_file(job):
+            stat = os.stat(job.local_filepath)
+            self.get_etag(job.key, job.local_filepath, stat)
+
+        # The same default as ThreadPoolExecutor's.
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # Only a few jobs are queued at a time, so jobs may be a
+            # generator over a very large tree.
+            max_pending = max_workers * 2
+            pending = set()
+            for job in jobs:
+                if len(pending) >= max_pending:
+                    done, pending = futures.wait(
+                        pending,
+                        return_when=futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(hash_file, job))
+            for future in futures.as_completed(pending):
+                future.result()
+
+    def save(self, keep_keys=None):
+        """
+        Writes new and changed entries to the database.
+
+        If keep_keys is given, entries for every other key are removed.
+        """
+        with self._lock:
+            entries = self._entries
+            changed_keys = self._changed_keys
+            removed_keys = set()
+            if keep_keys is not None:
+                removed_keys = set(entries) - set(keep_keys)
+            self._changed_keys = set()
+        if not (changed_keys or removed_keys):
+            return
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                    ((key,) + entries[key] for key in changed_keys)
+                )
+                connection.executemany(
+                    'DELETE FROM files WHERE key = ?',
+                    ((key,) for key in removed_keys)
+                )
+        finally:
+            connection.close()
+        with self._lock:
+            for key in removed_keys:
+                self._entries.pop(key, None)
+
+    def _load(self):
+        """
+        Reads every entry from the database into memory.
+
+        A database that is corrupt, or was written with a different
+        schema or part size, is discarded and rebuilt from scratch.
+        """
+        try:
+            self._entries = self._read_entries()
+        except sqlite3.DatabaseError as err:
+            print(f'Discarding unreadable manifest {self.filepath}: {err}')
+            self._delete_database()
+            self._entries = self._read_entries()
+
+    def _read_entries(self):
+        connection = self._connect()
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            chunksize = connection.execute(
+                "SELECT value FROM settings WHERE name = 'chunksize'"
+            ).fetchone()
+            if (version != SCHEMA_VERSION or chunksize is None
+                    or int(chunksize[0]) != upload.MULTIPART_CHUNKSIZE):
+                # The cached ETags were computed differently, so none of
+                # them can be trusted.
+                with connection:
+                    connection.execute('DELETE FROM files')
+                    connection.execute(
+                        'INSERT OR REPLACE INTO settings VALUES (?, ?)',
+                        ('chunksize', str(upload.MULTIPART_CHUNKSIZE))
+                    )
+                    connection.execute(
+                        f'PRAGMA user_version = {SCHEMA_VERSION}'
+                    )
+                return {}
+            rows = connection.execute(
+                'SELECT key, mtime_ns, size, inode, etag FROM files'
+            )
+            return {row[0]: tuple(row[1:]) for row in rows}
+        finally:
+            connection.close()
+
+    def _connect(self):
+        """
+        Opens the database, creating its tables if they do not exist.
+        """
+        directory = os.path.dirname(self.filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.filepath)
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                'key TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, '
+                'inode INTEGER, etag TEXT)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS settings ('
+                'name TEXT PRIMARY KEY, value TEXT)'
+            )
+        return connection
+
+    def _delete_database(self):
+        try:
+            os.remove(self.filepath)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,71 @@
+"""
+Defines a class that chooses the metadata of each uploaded object.
+
+The MetadataRules class matches the key of each file against a table
+of glob patterns taken from the CACHE_CONTROL_RULES setting, so that
+different classes of file can be given their own Cache-Control,
+Expires and other headers when they are uploaded.
+"""
+
+from datetime import datetime, timedelta, timezone
+import re
+
+
+def compile_pattern(pattern):
+    """
+    Returns a compiled regular expression equivalent to a glob pattern.
+
+    `**` matches any number of directories, `*` matches any characters
+    other than `/` and `?` matches a single character other than `/`.
+    A pattern that contains no `/` is matched against the file name
+    alone, so `*.html` matches HTML files in every directory.
+    """
+    if '/' not in pattern:
+        pattern = '**/' + pattern
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith('**/', index):
+            regex += '(?:.*/)?'
+            index += 3
+        elif pattern.startswith('**', index):
+            regex += '.*'
+            index += 2
+        elif pattern[index] == '*':
+            regex += '[^/]*'
+            index += 1
+        elif pattern[index] == '?':
+            regex += '[^/]'
+            index += 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return re.compile(regex + r'\Z')
+
+
+class MetadataRules:
+
+    def __init__(self, rules):
+        self.rules = [
+            (compile_pattern(pattern), metadata)
+            for pattern, metadata in (rules or [])
+        ]
+
+    def metadata_for(self, key):
+        """
+        Returns the extra upload arguments for the object with the key.
+
+        Rules are checked in order and only the first rule that matches
+        is applied. An integer Expires value is a number of seconds
+        from now.
+        """
+        for regex, metadata in self.rules:
+            if regex.match(key):
+                extra_args = dict(metadata)
+                if isinstance(extra_args.get('Expires'), int):
+                    extra_args['Expires'] = (
+                        datetime.now(timezone.utc)
+                        + timedelta(seconds=extra_args['Expires'])
+                    )
+                return extra_args
+        return {}
@@ -0,0 +1,396 @@
+"""
+Defines tools for uploading large files in parts that survive a restart.
+
+The MultipartUploader class uploads a large file as an S3 multipart
+upload, sending several parts at the same time. The ID of each upload
+and the ETag of each part that has been sent are recorded in an
+UploadJournal, an SQLite database in the state directory, as soon as S3
+accepts them. If a deployment is interrupted, the next one finds the
+upload in the journal, asks S3 which parts it still holds and only
+sends the rest, as long as the file has not changed in the meantime.
+Uploads that can no longer be resumed are aborted, so that S3 does not
+keep their parts.
+"""
+
+import base64
+from collections import namedtuple
+from concurrent import futures
+import contextvars
+from datetime import datetime, timedelta, timezone
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+
+from botocore.exceptions import ClientError
+
+from src import tracing
+
+
+# Incremented whenever the layout of the database changes.
+SCHEMA_VERSION = 1
+
+# The number of parts that are sent at the same time, across all files.
+MAX_WORKERS = 4
+
+# Multipart uploads that are not in the journal are only aborted once
+# they are this old, since another deployment may still be running.
+ORPHAN_AGE = timedelta(days=1)
+
+# Describes an upload recorded in the journal: its ID, the size and
+# modification time of the file and the part size it was started with,
+# and the ETags of the parts that have been sent, by part number.
+JournalEntry = namedtuple(
+    'JournalEntry',
+    ['upload_id', 'size', 'mtime_ns', 'part_size', 'parts']
+)
+
+
+def is_missing_upload_error(error):
+    """
+    Returns True if the exception means the multipart upload no longer
+    exists.
+    """
+    return error.response.get('Error', {}).get('Code') == 'NoSuchUpload'
+
+
+class UploadJournal:
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+
+    def get(self, bucket_name, key):
+        """
+        Returns the JournalEntry of the upload of the object with the
+        given key, or None if there is none.
+        """
+        with self._lock:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    'SELECT upload_id, size, mtime_ns, part_size '
+                    'FROM uploads WHERE bucket = ? AND key = ?',
+                    (bucket_name, key)
+                ).fetchone()
+                if row is None:
+                    return None
+                parts = dict(connection.execute(
+                    'SELECT part_number, etag FROM parts '
+                    'WHERE upload_id = ?',
+                    (row[0],)
+                ))
+            finally:
+                connection.close()
+        return JournalEntry(*row, parts)
+
+    def uploads(self, bucket_name):
+        """
+        Returns the keys and IDs of every upload to the bucket.
+        """
+        with self._lock:
+            connection = self._connect()
+            try:
+                return dict(connection.execute(
+                    'SELECT key, upload_id FROM uploads WHERE bucket = ?',
+                    (bucket_name,)
+                ))
+            finally:
+                connection.close()
+
+    def start(self, bucket_name, key, upload_id, size, mtime_ns, part_size):
+        """
+        Records a new upload, replacing any earlier upload of the key.
+        """
+        self._write(
+            'INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)',
+            (bucket_name, key, upload_id, size, mtime_ns, part_size)
+        )
+
+    def record_part(self, upload_id, part_number, etag):
+        self._write(
+            'INSERT OR REPLACE INTO parts VALUES (?, ?, ?)',
+            (upload_id, part_number, etag)
+        )
+
+    def remove(self, bucket_name, key):
+        """
+        Forgets the upload of the key and its parts.
+        """
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(
+                        'DELETE FROM parts WHERE upload_id IN ('
+                        'SELECT upload_id FROM uploads '
+                        'WHERE bucket = ? AND key = ?)',
+                        (bucket_name, key)
+                    )
+                    connection.execute(
+                        'DELETE FROM uploads WHERE bucket = ? AND key = ?',
+                        (bucket_name, key)
+                    )
+            finally:
+                connection.close()
+
+    def _write(self, statement, parameters):
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(statement, parameters)
+            finally:
+                connection.close()
+
+    def _connect(self):
+        """
+        Opens the database, creating its tables if they do not exist.
+
+        A database written with a different schema is emptied, which
+        only means that its uploads start again.
+        """
+        directory = os.path.dirname(self.filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.filepath)
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+        except sqlite3.DatabaseError as err:
+            connection.close()
+            print(''.join([
+                f'Discarding unreadable upload journal {self.filepath}: ',
+                str(err),
+            ]))
+            os.remove(self.filepath)
+            connection = sqlite3.connect(self.filepath)
+            version = 0
+        if version != SCHEMA_VERSION:
+            with connection:
+                connection.execute('DROP TABLE IF EXISTS uploads')
+                connection.execute('DROP TABLE IF EXISTS parts')
+                connection.execute(
+                    'CREATE TABLE uploads ('
+                    'bucket TEXT, key TEXT, upload_id TEXT, size INTEGER, '
+                    'mtime_ns INTEGER, part_size INTEGER, '
+                    'PRIMARY KEY (bucket, key))'
+                )
+                connection.execute(
+                    'CREATE TABLE parts ('
+                    'upload_id TEXT, part_number INTEGER, etag TEXT, '
+                    'PRIMARY KEY (upload_id, part_number))'
+                )
+                connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        return connection
+
+
+class MultipartUploader:
+
+    def __init__(self, client, bucket_name, journal, part_size,
+                 max_workers=MAX_WORKERS):
+        """
+        The part size must match the one that ETags of local files are
+        computed with, so that multipart objects can be compared with
+        them.
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.journal = journal
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def upload(self, job, size, callback=None):
+        """
+        Uploads the file of an UploadJob, resuming an earlier upload of
+        it if possible.
+
+        Callback is called with the number of bytes in each part that
+        is sent.
+        """
+        mtime_ns = os.stat(job.local_filepath).st_mtime_ns
+        upload_id, parts = self._resume(job.key, size, mtime_ns)
+        if upload_id is None:
+            response = self.client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=job.key,
+                **job.extra_args
+            )
+            upload_id = response['UploadId']
+            self.journal.start(
+                self.bucket_name,
+                job.key,
+                upload_id,
+                size,
+                mtime_ns,
+                self.part_size
+            )
+            parts = {}
+        pool = self._get_pool()
+        # Parts are sent in copies of the context of the file's upload,
+        # so that the retries and throttling of their requests are
+        # counted.
+        pending = {
+            pool.submit(
+                contextvars.copy_context().run,
+                self._upload_part,
+                job,
+                upload_id,
+                part_number,
+                callback
+            ): part_number
+            for part_number in range(1, math.ceil(size / self.part_size) + 1)
+            if part_number not in parts
+        }
+        try:
+            for future in futures.as_completed(pending):
+                parts[pending[future]] = future.result()
+        finally:
+            # The parts that were sent are in the journal, so the
+            # upload can be resumed from here.
+            for future in pending:
+                future.cancel()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=job.key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': part_number, 'ETag': parts[part_number]}
+                for part_number in sorted(parts)
+            ]}
+        )
+        self.journal.remove(self.bucket_name, job.key)
+
+    def abort_orphaned_uploads(self, max_age=ORPHAN_AGE):
+        """
+        Aborts the uploads to the bucket that will not be resumed.
+
+        These are the uploads left in the journal, which should only be
+        called once every file has been uploaded, and uploads that are
+        not in the journal and were started more than max_age ago.
+        Returns the number of uploads that were aborted.
+        """
+        journal_uploads = self.journal.uploads(self.bucket_name)
+        aborted = 0
+        for key, upload_id in journal_uploads.items():
+            self._abort(key, upload_id)
+            self.journal.remove(self.bucket_name, key)
+            aborted += 1
+        started_before = datetime.now(timezone.utc) - max_age
+        known_ids = set(journal_uploads.values())
+        paginator = self.client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            for item in page.get('Uploads', []):
+                if (item['UploadId'] not in known_ids
+                        and item['Initiated'] < started_before):
+                    self._abort(item['Key'], item['UploadId'])
+                    aborted += 1
+        return aborted
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _resume(self, key, size, mtime_ns):
+        """
+        Returns the ID and sent parts of an earlier upload of the file,
+        or (None, None) if it cannot be resumed.
+
+        An upload of a file that has changed since is aborted.
+        """
+        entry = self.journal.get(self.bucket_name, key)
+        if entry is None:
+            return (None, None)
+        if (entry.size, entry.mtime_ns, entry.part_size) != (
+                size, mtime_ns, self.part_size):
+            self._abort(key, entry.upload_id)
+            self.journal.remove(self.bucket_name, key)
+            return (None, None)
+        try:
+            stored_parts = self._list_parts(key, entry.upload_id)
+        except ClientError as err:
+            if not is_missing_upload_error(err):
+                raise
+            # The upload was aborted or completed elsewhere.
+            self.journal.remove(self.bucket_name, key)
+            return (None, None)
+        # Only parts that S3 still holds, with the content the journal
+        # recorded, are kept.
+        parts = {
+            part_number: etag
+            for part_number, etag in entry.parts.items()
+            if stored_parts.get(part_number) == etag.strip('"')
+        }
+        print(''.join([
+            f'Resuming upload of {key}: {len(parts)} of ',
+            f'{math.ceil(size / self.part_size)} part(s) already sent',
+        ]))
+        return (entry.upload_id, parts)
+
+    def _list_parts(self, key, upload_id):
+        """
+        Returns the ETag of each part S3 holds for the upload, by part
+        number.
+        """
+        paginator = self.client.get_paginator('list_parts')
+        parts = {}
+        for page in paginator.paginate(
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id
+        ):
+            for item in page.get('Parts', []):
+                parts[item['PartNumber']] = item['ETag'].strip('"')
+        return parts
+
+    def _upload_part(self, job, upload_id, part_number, callback):
+        """
+        Sends a single part of the file and records it in the journal.
+
+        Returns the part's ETag.
+        """
+        with tracing.span(
+            'upload_part',
+            tracing.FILE,
+            key=job.key,
+            part=part_number
+        ):
+            with open(job.local_filepath, 'rb') as file:
+                file.seek((part_number - 1) * self.part_size)
+                data = file.read(self.part_size)
+            digest = hashlib.md5(data).digest()
+            response = self.client.upload_part(
+                Bucket=self.bucket_name,
+                Key=job.key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data,
+                ContentMD5=base64.b64encode(digest).decode()
+            )
+        self.journal.record_part(upload_id, part_number, response['ETag'])
+        if callback is not None:
+            callback(len(data))
+        return response['ETag']
+
+    def _abort(self, key, upload_id):
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id
+            )
+        except ClientError as err:
+            if not is_missing_upload_error(err):
+                raise
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers
+                )
+            return self._pool
@@ -0,0 +1,165 @@
+"""
+Defines tools for waiting on AWS resources.
+
+The Poller class repeatedly calls a function until it reports that the
+resource is ready, waiting longer between each call with jittered
+exponential backoff and giving up once a deadline has passed. Requests
+that are throttled by AWS are retried after a longer wait instead of
+failing. A poller also stops waiting as soon as the stop event of its
+context is set, for example when another task of the deployment fails
+or the user presses Ctrl-C. The Spinner class draws a loading spinner
+from its own thread, so that it redraws smoothly however rarely the API
+is called.
+"""
+
+import contextvars
+import itertools
+import random
+import sys
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+# Error codes AWS services use when requests are being throttled.
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'TooManyRequestsException',
+    'SlowDown',
+    'PriorRequestNotComplete',
+}
+
+
+# An optional threading.Event that stops every poller in the current
+# context when it is set.
+stop_event = contextvars.ContextVar('stop_event', default=None)
+
+
+def is_throttling_error(error):
+    """
+    Returns True if the exception is a throttling error from AWS.
+    """
+    return (
+        isinstance(error, ClientError)
+        and error.response.get('Error', {}).get('Code')
+        in THROTTLING_ERROR_CODES
+    )
+
+
+class PollingTimeout(Exception):
+    """
+    Raised when a resource is not ready before the poller's deadline.
+    """
+
+
+class PollingCancelled(Exception):
+    """
+    Raised when a poller is stopped before the resource is ready.
+    """
+
+
+class Poller:
+
+    def __init__(self, initial_delay=1, max_delay=30, timeout=None,
+                 multiplier=2):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.multiplier = multiplier
+
+    def poll(self, check, description='resource'):
+        """
+        Calls check until it returns something other than None and
+        returns that value.
+
+        Raises PollingTimeout if the deadline passes first, and
+        PollingCancelled if the stop event of the current context is
+        set first.
+        """
+        stop = stop_event.get()
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        delay = self.initial_delay
+        while True:
+            if stop is not None and stop.is_set():
+                raise PollingCancelled(f'Stopped waiting for {description}')
+            try:
+                result = check()
+            except ClientError as err:
+                if not is_throttling_error(err):
+                    raise
+                # Back off further so that other callers can proceed.
+                delay = min(delay * self.multiplier, self.max_delay)
+                result = None
+            if result is not None:
+                return result
+            # "Full jitter" spreads out the calls of concurrent pollers.
+            sleep_time = random.uniform(delay / 2, delay)
+            if deadline is not None and (
+                    time.monotonic() + sleep_time > deadline):
+                raise PollingTimeout(f'Timed out waiting for {description}')
+            if stop is None:
+                time.sleep(sleep_time)
+            elif stop.wait(sleep_time):
+                raise PollingCancelled(f'Stopped waiting for {description}')
+            delay = min(delay * self.multiplier, self.max_delay)
+
+
+class Spinner:
+    """
+    Context manager that draws a loading spinner until it exits.
+
+    Nothing is drawn unless standard output is a terminal. Lines printed
+    with write_line() while the spinner is running appear above it.
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._drawn = False
+        self._thread = None
+
+    def __enter__(self):
+        if sys.stdout.isatty():
+            self._thread = threading.Thread(target=self._spin, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_line(self, line):
+        """
+        Prints a line of text without disturbing the spinner.
+        """
+        with self._lock:
+            self._erase()
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def _spin(self):
+        cursors = itertools.cycle('|/-\\')
+        while not self._stopped.is_set():
+            with self._lock:
+                self._erase()
+                sys.stdout.write(next(cursors))
+                sys.stdout.flush()
+                self._drawn = True
+            self._stopped.wait(self.interval)
+        with self._lock:
+            self._erase()
+            sys.stdout.flush()
+
+    def _erase(self):
+        if self._drawn:
+            sys.stdout.write('\b \b')
+            self._drawn = False
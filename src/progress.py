@@ -0,0 +1,269 @@
+"""
+Defines a class that reports the progress of an upload as it happens.
+
+The UploadProgress class is told about each file as it is queued, sent
+and finished, and about each block of bytes the transfer library
+reads, from whichever worker thread is uploading it. It keeps running
+totals and redraws a single status line with the number of files and
+bytes uploaded, the throughput, the estimated time remaining and the
+number of retried requests. Redraws are throttled, so the cost of
+reporting does not grow with the number of files. At the end it prints
+a histogram of how long each file took and the slowest files.
+"""
+
+import heapq
+import sys
+import threading
+import time
+
+
+# The upper bounds of the buckets of the latency histogram, in seconds.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# How often the status line is redrawn on a terminal, and how often a
+# new status line is printed otherwise, in seconds.
+TERMINAL_INTERVAL = 0.2
+LOG_INTERVAL = 10
+
+# The number of files listed as the slowest at the end.
+SLOWEST_FILE_COUNT = 5
+
+# The width of the longest bar of the latency histogram.
+HISTOGRAM_WIDTH = 40
+
+
+def format_bytes(count):
+    """
+    Returns a number of bytes in the largest unit that keeps it above 1.
+    """
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(count) < 1024:
+            break
+        count /= 1024
+    else:
+        unit = 'TB'
+    if unit == 'B':
+        return f'{count} B'
+    return f'{count:.1f} {unit}'
+
+
+def format_duration(seconds):
+    """
+    Returns a duration such as 850 ms, 4.2s or 3m05s.
+    """
+    if seconds < 1:
+        return f'{seconds * 1000:.0f} ms'
+    if seconds < 60:
+        return f'{seconds:.1f}s'
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f'{minutes}m{seconds:02d}s'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02d}m'
+
+
+class FileTransfer:
+    """
+    Byte callback for the upload of a single file.
+
+    Counts the bytes sent for the file and adds them to the totals.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.transferred = 0
+        self.start = time.monotonic()
+
+    def __call__(self, bytes_amount):
+        # The amount is negative when a retried request rewinds the file.
+        self.transferred += bytes_amount
+        self.progress.add_bytes(bytes_amount)
+
+
+class UploadProgress:
+
+    def __init__(self, stream=None, interval=None,
+                 slowest_file_count=SLOWEST_FILE_COUNT):
+        """
+        Progress is written to stream, which defaults to standard output.
+        The status line is redrawn in place on a terminal and printed
+        as a new line every interval seconds otherwise.
+        """
+        self.stream = stream or sys.stdout
+        self.is_terminal = self.stream.isatty()
+        if interval is None:
+            interval = TERMINAL_INTERVAL if self.is_terminal else LOG_INTERVAL
+        self.interval = interval
+        self.slowest_file_count = slowest_file_count
+        self.start = time.monotonic()
+        self.files_found = 0
+        self.finished_finding = False
+        self.files_uploaded = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.bytes_uploaded = 0
+        self.retries = 0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        # A heap of (duration, key, size) of the slowest files.
+        self._slowest_files = []
+        self._lock = threading.Lock()
+        self._next_draw = self.start + self.interval
+        self._drawn_width = 0
+
+    def file_found(self):
+        """
+        Records that a file has been queued for upload.
+        """
+        with self._lock:
+            self.files_found += 1
+
+    def all_files_found(self):
+        """
+        Records that every file has been queued, so that the time
+        remaining can be estimated.
+        """
+        with self._lock:
+            self.finished_finding = True
+
+    def start_file(self):
+        """
+        Returns the byte callback for a file that is about to be sent.
+        """
+        return FileTransfer(self)
+
+    def add_bytes(self, bytes_amount):
+        with self._lock:
+            self.bytes_uploaded += bytes_amount
+            self._maybe_draw()
+
+    def add_retries(self, count):
+        with self._lock:
+            self.retries += count
+
+    def file_uploaded(self, key, size, transfer):
+        """
+        Records that a file has been uploaded.
+
+        Bytes that were not reported through the file's callback are
+        added to the totals, so that they are exact once every file has
+        finished.
+        """
+        duration = time.monotonic() - transfer.start
+        with self._lock:
+            self.files_uploaded += 1
+            self.bytes_uploaded += size - transfer.transferred
+            bucket = 0
+            while (bucket < len(LATENCY_BUCKETS)
+                    and duration >= LATENCY_BUCKETS[bucket]):
+                bucket += 1
+            self.latency_counts[bucket] += 1
+            entry = (duration, key, size)
+            if len(self._slowest_files) < self.slowest_file_count:
+                heapq.heappush(self._slowest_files, entry)
+            elif entry > self._slowest_files[0]:
+                heapq.heapreplace(self._slowest_files, entry)
+            self._maybe_draw()
+
+    def file_skipped(self):
+        with self._lock:
+            self.files_skipped += 1
+            self._maybe_draw()
+
+    def file_failed(self, transfer=None):
+        with self._lock:
+            self.files_failed += 1
+            if transfer is not None:
+                # The bytes of a failed file were not uploaded.
+                self.bytes_uploaded -= transfer.transferred
+
+    def status_line(self):
+        """
+        Returns a line describing the progress of the upload so far.
+        """
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        files_done = (
+            self.files_uploaded + self.files_skipped + self.files_failed
+        )
+        total = f'{self.files_found:,}'
+        if not self.finished_finding:
+            total += '+'
+        parts = [
+            f'{files_done:,}/{total} files',
+            format_bytes(self.bytes_uploaded),
+            f'{format_bytes(self.bytes_uploaded / elapsed)}/s',
+        ]
+        if self.finished_finding and 0 < files_done < self.files_found:
+            remaining = (self.files_found - files_done) * elapsed / files_done
+            parts.append(f'ETA {format_duration(remaining)}')
+        if self.retries:
+            parts.append(f'{self.retries:,} retries')
+        return ', '.join(parts)
+
+    def finish(self):
+        """
+        Draws the final status line and prints a summary of the upload.
+        """
+        with self._lock:
+            self._draw()
+            if self.is_terminal:
+                self.stream.write('\n')
+            for line in self.summary():
+                self.stream.write(line + '\n')
+            self.stream.flush()
+
+    def summary(self):
+        """
+        Returns the lines of a report of the throughput of the upload,
+        how long files took to upload and which files were slowest.
+        """
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        lines = [''.join([
+            f'Uploaded {format_bytes(self.bytes_uploaded)} in ',
+            f'{format_duration(elapsed)} ',
+            f'({format_bytes(self.bytes_uploaded / elapsed)}/s, ',
+            f'{self.files_uploaded / elapsed:.1f} files/s); ',
+            f'{self.retries:,} request(s) retried',
+        ])]
+        if not self.files_uploaded:
+            return lines
+        lines.append('Upload time per file:')
+        labels = [f'< {format_duration(bound)}' for bound in LATENCY_BUCKETS]
+        labels.append(f'>= {format_duration(LATENCY_BUCKETS[-1])}')
+        width = max(len(label) for label in labels)
+        largest = max(self.latency_counts)
+        for label, count in zip(labels, self.latency_counts):
+            if not count:
+                continue
+            bar = '#' * max(1, round(count / largest * HISTOGRAM_WIDTH))
+            lines.append(f'  {label.rjust(width)}  {count:8,}  {bar}')
+        lines.append('Slowest files:')
+        for duration, key, size in sorted(self._slowest_files, reverse=True):
+            lines.append(''.join([
+                f'  {format_duration(duration):>8}  ',
+                f'{format_bytes(size):>10}  {key}',
+            ]))
+        return lines
+
+    def _maybe_draw(self):
+        """
+        Draws the status line if it has not been drawn for a while.
+
+        Must be called with the lock held.
+        """
+        now = time.monotonic()
+        if now < self._next_draw:
+            return
+        self._next_draw = now + self.interval
+        self._draw()
+
+    def _draw(self):
+        line = self.status_line()
+        if self.is_terminal:
+            # Overwrite the previous status line, including any of it
+            # that is longer than the new one.
+            padding = ' ' * max(0, self._drawn_width - len(line))
+            self.stream.write(f'\r{line}{padding}')
+            self._drawn_width = len(line)
+        else:
+            self.stream.write(f'Upload progress: {line}\n')
+        self.stream.flush()
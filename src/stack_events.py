@@ -0,0 +1,127 @@
+"""
+Defines a class that follows the events of a CloudFormation stack.
+
+The StackEventTailer class fetches only the stack events that are newer
+than the last one it has seen, reports each change in a resource's
+status as it happens, and records when each resource started and
+finished so that a timeline of the operation can be printed at the
+end.
+"""
+
+from collections import namedtuple
+
+
+# The start and end of the provisioning of a single resource.
+ResourceTiming = namedtuple(
+    'ResourceTiming',
+    ['logical_id', 'resource_type', 'start', 'end', 'status']
+)
+
+
+class StackEventTailer:
+
+    def __init__(self, client, stack_name):
+        """
+        The stack may be given by its name or its ID. Only the ID finds
+        the events of a stack that has been deleted.
+        """
+        self.client = client
+        self.stack_name = stack_name
+        self._last_event_id = None
+        self._starts = {}
+        self._timings = {}
+
+    def skip_existing_events(self):
+        """
+        Marks the events of earlier operations on the stack as seen.
+        """
+        response = self.client.describe_stack_events(
+            StackName=self.stack_name
+        )
+        if response['StackEvents']:
+            self._last_event_id = response['StackEvents'][0]['EventId']
+
+    def fetch_new_events(self):
+        """
+        Returns the events since the previous call, oldest first.
+
+        Events are returned newest first, so pages are only requested
+        until the last event that has already been seen.
+        """
+        new_events = []
+        kwargs = {'StackName': self.stack_name}
+        while True:
+            response = self.client.describe_stack_events(**kwargs)
+            for event in response['StackEvents']:
+                if event['EventId'] == self._last_event_id:
+                    break
+                new_events.append(event)
+            else:
+                if 'NextToken' in response:
+                    kwargs['NextToken'] = response['NextToken']
+                    continue
+            break
+        if new_events:
+            self._last_event_id = new_events[0]['EventId']
+        new_events.reverse()
+        for event in new_events:
+            self._record_timing(event)
+        return new_events
+
+    def _record_timing(self, event):
+        """
+        Records when a resource started and finished changing.
+        """
+        logical_id = event['LogicalResourceId']
+        status = event['ResourceStatus']
+        if status.endswith('_IN_PROGRESS'):
+            self._starts.setdefault(logical_id, event['Timestamp'])
+        elif logical_id in self._starts:
+            self._timings[logical_id] = ResourceTiming(
+                logical_id,
+                event['ResourceType'],
+                self._starts.pop(logical_id),
+                event['Timestamp'],
+                status
+            )
+
+    def timeline(self):
+        """
+        Returns the timings of the resources that finished, in the
+        order they started.
+        """
+        return sorted(self._timings.values(), key=lambda item: item.start)
+
+
+def format_event(event):
+    """
+    Returns a line describing a change in a resource's status.
+    """
+    line = ' '.join([
+        event['Timestamp'].strftime('%H:%M:%S'),
+        event['ResourceStatus'].ljust(20),
+        event['LogicalResourceId'],
+        f"({event['ResourceType']})",
+    ])
+    if event.get('ResourceStatusReason'):
+        line += f": {event['ResourceStatusReason']}"
+    return line
+
+
+def format_timeline(timeline):
+    """
+    Returns the lines of a report of how long each resource took.
+    """
+    if not timeline:
+        return []
+    width = max(len(timing.logical_id) for timing in timeline)
+    lines = ['Resource timeline:']
+    for timing in timeline:
+        duration = (timing.end - timing.start).total_seconds()
+        lines.append(''.join([
+            f'  {timing.logical_id.ljust(width)}  ',
+            f"{timing.start.strftime('%H:%M:%S')} -> ",
+            f"{timing.end.strftime('%H:%M:%S')}  ",
+            f'{duration:7.1f}s  {timing.status}',
+        ]))
+    return lines
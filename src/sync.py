@@ -0,0 +1,130 @@
+"""
+Defines a class that keeps the S3 bucket in sync with the local files.
+
+The BucketSynchronizer class lists the bucket once, in parallel shards,
+and compares the size and ETag of each remote object with the file on
+the local disk, so that only new or changed files are uploaded.
+Objects that no longer exist locally can then be deleted from the
+bucket in batches.
+"""
+
+import hashlib
+import os
+
+from src import listing, upload
+
+
+# The size, ETag and modification time of an object in the S3 bucket.
+RemoteObject = listing.RemoteObject
+
+# The DeleteObjects API accepts at most 1000 keys per request.
+DELETE_BATCH_SIZE = 1000
+
+# Files are read in blocks of this size when they are hashed.
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def compute_etag(filepath, size):
+    """
+    Returns the ETag S3 assigns to the file once it has been uploaded.
+
+    Files uploaded in a single request have the MD5 digest of their
+    content as their ETag. Multipart uploads have the MD5 digest of the
+    concatenated part digests followed by the number of parts.
+    """
+    with open(filepath, 'rb') as file:
+        if size <= upload.MULTIPART_THRESHOLD:
+            digest = hashlib.md5()
+            for block in iter(lambda: file.read(READ_BLOCK_SIZE), b''):
+                digest.update(block)
+            return digest.hexdigest()
+        part_digests = []
+        for part in iter(lambda: file.read(upload.MULTIPART_CHUNKSIZE), b''):
+            part_digests.append(hashlib.md5(part).digest())
+    digest = hashlib.md5(b''.join(part_digests))
+    return f'{digest.hexdigest()}-{len(part_digests)}'
+
+
+class BucketSynchronizer:
+
+    def __init__(self, client, bucket_name, manifest=None,
+                 max_workers=listing.MAX_WORKERS):
+        self.client = client
+        self.bucket_name = bucket_name
+        # An optional FileManifest used to avoid rehashing files.
+        self.manifest = manifest
+        # The number of shards of the bucket listed at the same time.
+        self.max_workers = max_workers
+        self.remote_objects = {}
+        self.local_keys = set()
+        # Whether every local file has been recorded in local_keys.
+        self.tracked_all_local_files = False
+
+    def list_remote_objects(self):
+        """
+        Retrieves the size and ETag of every object in the bucket.
+
+        Returns a listing.ObjectIndex, which maps each key to a
+        RemoteObject.
+        """
+        lister = listing.BucketLister(
+            self.client,
+            self.bucket_name,
+            max_workers=self.max_workers
+        )
+        self.remote_objects = lister.list()
+        return self.remote_objects
+
+    def track_local_files(self, jobs):
+        """
+        Yields each UploadJob in jobs, recording its key.
+
+        The recorded keys are used to decide which remote objects no
+        longer exist locally.
+        """
+        for job in jobs:
+            self.local_keys.add(job.key)
+            yield job
+        self.tracked_all_local_files = True
+
+    def has_changed(self, job):
+        """
+        Returns True if the file differs from the object in the bucket.
+        """
+        remote_object = self.remote_objects.get(job.key)
+        if remote_object is None:
+            return True
+        stat = os.stat(job.local_filepath)
+        if stat.st_size != remote_object.size:
+            return True
+        if self.manifest is not None:
+            etag = self.manifest.get_etag(job.key, job.local_filepath, stat)
+        else:
+            etag = compute_etag(job.local_filepath, stat.st_size)
+        return etag != remote_object.etag
+
+    def delete_removed_objects(self):
+        """
+        Deletes remote objects that no longer exist locally.
+
+        Returns a tuple containing the deleted keys and a list of the
+        errors returned for keys that could not be deleted.
+        """
+        removed_keys = sorted(set(self.remote_objects) - self.local_keys)
+        deleted = []
+        errors = []
+        for index in range(0, len(removed_keys), DELETE_BATCH_SIZE):
+            batch = removed_keys[index:index + DELETE_BATCH_SIZE]
+            response = self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={
+                    'Objects': [{'Key': key} for key in batch],
+                    'Quiet': True,
+                }
+            )
+            failed_keys = set()
+            for error in response.get('Errors', []):
+                failed_keys.add(error['Key'])
+                errors.append(error)
+            deleted.extend(key for key in batch if key not in failed_keys)
+        return (deleted, errors)
@@ -0,0 +1,133 @@
+"""
+Defines a scheduler that runs a graph of dependent tasks concurrently.
+
+Each task in a TaskGraph names the tasks it depends on. A task starts
+as soon as all of its dependencies have finished and is called with
+their results as keyword arguments named after them, so independent
+tasks run at the same time in a pool of threads. If a task fails, no
+more tasks are started, every task that is still waiting is cancelled
+and the error is raised once the tasks that are already running have
+finished. Tasks that are waiting on AWS resources are stopped early:
+each task runs with a stop event as its polling.stop_event, which is
+set when a task fails or the graph is interrupted, for example by
+Ctrl-C.
+"""
+
+from collections import namedtuple
+from concurrent import futures
+import contextvars
+import threading
+
+from src import polling, tracing
+
+
+Task = namedtuple('Task', ['name', 'function', 'dependencies', 'after'])
+
+
+class TaskGraph:
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name, function, dependencies=(), after=()):
+        """
+        Adds a task that calls function with the results of the tasks
+        named in dependencies.
+
+        The task also waits for the tasks named in after, without
+        receiving their results.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task '{name}' has already been added")
+        for dependency in (*dependencies, *after):
+            if dependency not in self.tasks:
+                raise ValueError(
+                    f"Task '{name}' depends on unknown task '{dependency}'"
+                )
+        self.tasks[name] = Task(
+            name,
+            function,
+            tuple(dependencies),
+            tuple(after)
+        )
+
+    def run(self, max_workers=None):
+        """
+        Runs every task and returns a dictionary of their results.
+
+        Since dependencies must be added before the tasks that use
+        them, the graph cannot contain cycles.
+        """
+        results = {}
+        errors = {}
+        cancelled = set()
+        waiting = dict(self.tasks)
+        max_workers = max_workers or len(self.tasks) or 1
+        pool = futures.ThreadPoolExecutor(max_workers=max_workers)
+        running = {}
+        stop = threading.Event()
+        try:
+            while waiting or running:
+                for task in list(waiting.values()):
+                    if all(
+                        name in results
+                        for name in (*task.dependencies, *task.after)
+                    ):
+                        del waiting[task.name]
+                        arguments = {
+                            name: results[name] for name in task.dependencies
+                        }
+                        # Tasks see the context variables of the caller.
+                        context = contextvars.copy_context()
+                        future = pool.submit(
+                            context.run,
+                            self._run_task,
+                            task,
+                            arguments,
+                            stop
+                        )
+                        running[future] = task
+                if not running:
+                    break
+                done, _ = futures.wait(
+                    running,
+                    return_when=futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    task = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        results[task.name] = future.result()
+                    else:
+                        errors[task.name] = error
+                        # Running tasks stop polling.
+                        stop.set()
+                        # Later tasks, even independent ones, may take a
+                        # long time, so they are not started.
+                        cancelled.update(waiting)
+                        waiting.clear()
+        finally:
+            # Nothing is left running unless the loop was interrupted,
+            # in which case running tasks stop polling, so that their
+            # threads do not keep the process alive.
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+        if errors:
+            name, error = next(iter(errors.items()))
+            if cancelled:
+                print(''.join([
+                    f"Task '{name}' failed; cancelled ",
+                    ', '.join(f"'{task}'" for task in sorted(cancelled)),
+                ]))
+            raise error
+        return results
+
+    def _run_task(self, task, arguments, stop):
+        """
+        Calls the task's function, recording how long it takes.
+
+        Pollers in the task stop waiting once stop is set.
+        """
+        polling.stop_event.set(stop)
+        with tracing.span(task.name, tracing.PHASE):
+            return task.function(**arguments)
@@ -0,0 +1,208 @@
+"""
+Defines tools for recording how long each step of a deployment takes.
+
+Code marks each step with a span, a context manager that records when
+the step started and how long it took, on which thread. Spans are only
+recorded while a Tracer has been started, so they cost almost nothing
+otherwise. Values that change over time, such as the number of
+concurrent uploads, can be recorded as counters. The recorded spans and
+counters can be written as a Chrome trace-event
+file, which can be opened in chrome://tracing or https://ui.perfetto.dev,
+and summarized as the wall time of each phase.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+# Categories of spans.
+PHASE = 'phase'
+STEP = 'step'
+FILE = 'file'
+
+# The tracer that spans are currently recorded by, if any.
+_tracer = None
+
+
+class Span:
+    """
+    Context manager that records a span with the current tracer.
+    """
+
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.record(self, end)
+        return False
+
+
+class _NoSpan:
+    """
+    Context manager that does nothing, used when no span is recorded.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_no_span = _NoSpan()
+
+
+class Tracer:
+
+    def __init__(self, detailed=False):
+        """
+        Spans in the FILE category, one per file, are only recorded if
+        detailed is True.
+        """
+        self.detailed = detailed
+        self.start = time.perf_counter_ns()
+        self.spans = []
+        self.counters = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+
+    def record(self, span, end):
+        thread = threading.current_thread()
+        with self._lock:
+            self._thread_names.setdefault(thread.ident, thread.name)
+            self.spans.append((
+                span.name,
+                span.category,
+                span.start - self.start,
+                end - span.start,
+                thread.ident,
+                span.args,
+            ))
+
+    def record_counter(self, name, values):
+        with self._lock:
+            self.counters.append(
+                (name, time.perf_counter_ns() - self.start, values)
+            )
+
+    def chrome_trace(self):
+        """
+        Returns the spans in the Chrome trace-event format.
+        """
+        process_id = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            counters = list(self.counters)
+            thread_names = dict(self._thread_names)
+        events = [
+            {
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': process_id,
+                'tid': thread_id,
+                'args': {'name': thread_name},
+            }
+            for thread_id, thread_name in thread_names.items()
+        ]
+        for name, category, start, duration, thread_id, args in spans:
+            events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': start / 1000,
+                'dur': duration / 1000,
+                'pid': process_id,
+                'tid': thread_id,
+                'args': args,
+            })
+        for name, timestamp, values in counters:
+            events.append({
+                'name': name,
+                'ph': 'C',
+                'ts': timestamp / 1000,
+                'pid': process_id,
+                'args': values,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, filepath):
+        with open(filepath, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file, default=str)
+
+    def phase_summary(self):
+        """
+        Returns the lines of a report of when each phase started and
+        how long it took, in the order they started.
+        """
+        with self._lock:
+            phases = sorted(
+                (start, duration, name)
+                for name, category, start, duration, _, _ in self.spans
+                if category == PHASE
+            )
+        if not phases:
+            return []
+        width = max(len(name) for _, _, name in phases)
+        lines = ['Phase timings:']
+        for start, duration, name in phases:
+            lines.append(''.join([
+                f'  {name.ljust(width)}  ',
+                f'starts {start / 1e9:7.1f}s  ',
+                f'takes {duration / 1e9:7.1f}s',
+            ]))
+        total = max(start + duration for start, duration, _ in phases)
+        lines.append(f"  {'total'.ljust(width)}  {total / 1e9:21.1f}s")
+        return lines
+
+
+def span(name, category=STEP, **args):
+    """
+    Returns a context manager that records a span with the current
+    tracer, if there is one.
+    """
+    tracer = _tracer
+    if tracer is None or (category == FILE and not tracer.detailed):
+        return _no_span
+    return Span(tracer, name, category, args)
+
+
+def counter(name, **values):
+    """
+    Records the current values of a counter with the current tracer, if
+    there is one.
+    """
+    tracer = _tracer
+    if tracer is not None:
+        tracer.record_counter(name, values)
+
+
+def start(detailed=False):
+    """
+    Starts recording spans and returns the tracer that records them.
+    """
+    global _tracer
+    _tracer = Tracer(detailed=detailed)
+    return _tracer
+
+
+def stop():
+    """
+    Stops recording spans and returns the tracer that recorded them.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
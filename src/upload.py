@@ -0,0 +1,266 @@
+"""
+Defines a class that uploads files to an S3 bucket concurrently.
+
+The S3Uploader class shares a single S3 client between a bounded pool
+of worker threads. Failed uploads are collected and returned to the
+caller so that every error can be reported at once, rather than the
+whole upload stopping at the first file that could not be sent. An
+optional progress.UploadProgress object is kept informed of each file
+and of the bytes and retries of each request, and an optional
+concurrency.AdaptiveConcurrencyLimiter decides how many of the workers
+upload at the same time. Given a multipart.UploadJournal, large files
+are uploaded in parts that can be resumed if the upload is interrupted.
+"""
+
+from collections import namedtuple
+from concurrent import futures
+import contextvars
+import os
+import time
+
+from boto3.s3.transfer import TransferConfig
+
+from src import clients, multipart, polling, tracing
+
+
+# Describes a single file that should be uploaded to the S3 bucket.
+UploadJob = namedtuple('UploadJob', ['local_filepath', 'key', 'extra_args'])
+
+# Describes a file that could not be uploaded.
+UploadFailure = namedtuple('UploadFailure', ['key', 'error'])
+
+# Describes the outcome of an upload: the keys that were uploaded,
+# the keys that were skipped because they had not changed, and the
+# files that could not be uploaded.
+UploadResult = namedtuple('UploadResult', ['uploaded', 'skipped', 'failures'])
+
+# Files larger than MULTIPART_THRESHOLD are uploaded in parts of
+# MULTIPART_CHUNKSIZE bytes. The part size determines the ETag that S3
+# assigns to the object, so it must not be left to the transfer
+# library's defaults.
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+# The uploader that the current request is made for. The parts of a
+# multipart upload are sent in a copy of the context of the file's
+# upload, so that their requests are attributed to it too.
+_current_uploader = contextvars.ContextVar('uploader', default=None)
+
+
+def _count_retries(parsed=None, **kwargs):
+    """
+    Adds the retries of a completed S3 request to the progress of the
+    upload it was made for.
+    """
+    uploader = _current_uploader.get()
+    if uploader is None or uploader.progress is None or not parsed:
+        return
+    retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    if retries:
+        uploader.progress.add_retries(retries)
+
+
+def _detect_throttling(response=None, **kwargs):
+    """
+    Tells the concurrency limiter of the upload an S3 request was made
+    for that the request was throttled.
+
+    Called after every attempt, before botocore decides whether to
+    retry it. Returns None so that the decision is left to botocore.
+    """
+    uploader = _current_uploader.get()
+    if uploader is None or uploader.concurrency is None or response is None:
+        return None
+    http_response, parsed = response
+    error_code = parsed.get('Error', {}).get('Code')
+    if (http_response.status_code == 503
+            or error_code in polling.THROTTLING_ERROR_CODES):
+        uploader.concurrency.throttled()
+    return None
+
+
+class S3Uploader:
+
+    def __init__(self, bucket_name, max_workers=10, client=None,
+                 progress=None, concurrency=None, journal=None):
+        """
+        If a concurrency limiter is given, as many workers as its
+        ceiling are started and max_workers is ignored. If a journal is
+        given, files larger than MULTIPART_THRESHOLD are uploaded by a
+        multipart.MultipartUploader that records its progress in it.
+        """
+        if concurrency is not None:
+            max_workers = concurrency.ceiling
+        self.bucket_name = bucket_name
+        self.max_workers = max_workers
+        self.progress = progress
+        self.concurrency = concurrency
+        # The connection pool is sized to match the number of worker
+        # threads so that no thread has to wait for a connection.
+        max_pool_connections = max_workers
+        if journal is not None:
+            max_pool_connections += multipart.MAX_WORKERS
+        self.client = client or clients.get_client(
+            's3',
+            max_pool_connections=max_pool_connections
+        )
+        self.multipart = None
+        if journal is not None:
+            self.multipart = multipart.MultipartUploader(
+                self.client,
+                bucket_name,
+                journal,
+                part_size=MULTIPART_CHUNKSIZE
+            )
+        # Each worker uploads one file at a time; the worker pool is
+        # what provides the concurrency.
+        # The transfer library also uses a multipart upload for files of
+        # exactly the threshold size, which sync.compute_etag() does not.
+        self._transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD + 1,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            use_threads=False
+        )
+        # Registering a handler again under the same ID replaces it, so
+        # a shared client only counts each retry once.
+        if progress is not None:
+            self.client.meta.events.register(
+                'after-call.s3',
+                _count_retries,
+                unique_id='static-site-deployment-retries'
+            )
+        if concurrency is not None:
+            self.client.meta.events.register(
+                'needs-retry.s3',
+                _detect_throttling,
+                unique_id='static-site-deployment-throttling'
+            )
+
+    def upload(self, jobs, should_upload=None):
+        """
+        Uploads every UploadJob in jobs and returns an UploadResult.
+
+        At most twice as many uploads as there are workers are queued
+        at any one time, so jobs may be a generator that yields files
+        as they are found. If should_upload is given, it is called with
+        each job from a worker thread and the file is skipped unless it
+        returns True.
+        """
+        result = UploadResult([], [], [])
+        max_pending = self.max_workers * 2
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {}
+            for job in jobs:
+                if len(pending) >= max_pending:
+                    done, _ = futures.wait(
+                        pending,
+                        return_when=futures.FIRST_COMPLETED
+                    )
+                    self._collect_results(done, pending, result)
+                # Each file is uploaded in a copy of the caller's
+                # context, so that what it prints is attributed to the
+                # site being deployed.
+                future = pool.submit(
+                    contextvars.copy_context().run,
+                    self._upload_file,
+                    job,
+                    should_upload
+                )
+                pending[future] = job
+                if self.progress is not None:
+                    self.progress.file_found()
+            if self.progress is not None:
+                self.progress.all_files_found()
+            done, _ = futures.wait(pending)
+            self._collect_results(done, pending, result)
+        if self.multipart is not None:
+            self.multipart.close()
+        return result
+
+    def abort_orphaned_uploads(self):
+        """
+        Aborts multipart uploads to the bucket that will not be resumed,
+        and returns how many there were.
+
+        Should only be called once every file has been uploaded.
+        """
+        if self.multipart is None:
+            return 0
+        return self.multipart.abort_orphaned_uploads()
+
+    def _upload_file(self, job, should_upload):
+        """
+        Uploads a single file to the S3 bucket.
+
+        Returns True if the file was uploaded and False if it was
+        skipped.
+        """
+        if should_upload is not None:
+            with tracing.span('compare_file', tracing.FILE, key=job.key):
+                if not should_upload(job):
+                    if self.progress is not None:
+                        self.progress.file_skipped()
+                    return False
+        with tracing.span('upload_file', tracing.FILE, key=job.key):
+            if self.progress is None and self.concurrency is None:
+                self._send_file(job)
+            else:
+                self._send_measured_file(job)
+        return True
+
+    def _send_measured_file(self, job):
+        """
+        Uploads a file within the concurrency limit, reporting its
+        progress and latency.
+        """
+        _current_uploader.set(self)
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        transfer = None
+        if self.progress is not None:
+            transfer = self.progress.start_file()
+        size = 0
+        latency = None
+        start = time.monotonic()
+        try:
+            size = os.path.getsize(job.local_filepath)
+            self._send_file(job, callback=transfer)
+            latency = time.monotonic() - start
+        except Exception:
+            if self.progress is not None:
+                self.progress.file_failed(transfer)
+            raise
+        finally:
+            if self.concurrency is not None:
+                self.concurrency.release(latency, size)
+        if self.progress is not None:
+            self.progress.file_uploaded(job.key, size, transfer)
+
+    def _send_file(self, job, callback=None):
+        if self.multipart is not None:
+            size = os.path.getsize(job.local_filepath)
+            if size > MULTIPART_THRESHOLD:
+                self.multipart.upload(job, size, callback=callback)
+                return
+        self.client.upload_file(
+            job.local_filepath,
+            self.bucket_name,
+            job.key,
+            ExtraArgs=job.extra_args,
+            Config=self._transfer_config,
+            Callback=callback
+        )
+
+    def _collect_results(self, done, pending, result):
+        """
+        Removes finished uploads from pending and records the outcome.
+        """
+        for future in done:
+            job = pending.pop(future)
+            error = future.exception()
+            if error is not None:
+                result.failures.append(UploadFailure(job.key, error))
+            elif future.result():
+                result.uploaded.append(job.key)
+            else:
+                result.skipped.append(job.key)
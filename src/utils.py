@@ -1,93 +1,401 @@
 """
-Defines a utility class for creating CloudFormation stacks.
+Defines a utility class for creating and updating CloudFormation stacks.
+
+A stack that already exists is updated through a change set, so that
+the resources that would be replaced can be reported before anything
+is changed. Each stack has an output that records a fingerprint of the
+template and parameters it was deployed with, and a deployment whose
+fingerprint matches the output skips CloudFormation entirely. An output
+is used rather than a stack tag, since CloudFormation copies stack tags
+to every resource, which would be tagged again on every update.
 """
 
-import sys
+import hashlib
+import json
 import time
 
-import boto3
+from botocore.exceptions import ClientError
+from troposphere import Output
+
+from src import clients, polling, stack_events, tracing
+
+
+# The longest time to wait for a stack to be created or updated, in
+# seconds. CloudFront distributions alone can take more than half an
+# hour.
+STACK_OPERATION_TIMEOUT = 2 * 60 * 60
+
+# The longest time to wait for a change set to be created, in seconds.
+CHANGE_SET_TIMEOUT = 10 * 60
+
+# How long the outputs of a stack are cached, in seconds.
+STACK_OUTPUTS_TTL = 7 * 24 * 60 * 60
+
+# The output that records the fingerprint a stack was deployed with.
+FINGERPRINT_OUTPUT = 'DeploymentFingerprint'
+
+# The results of deploy_stack().
+STACK_CREATED = 'CREATED'
+STACK_UPDATED = 'UPDATED'
+STACK_UNCHANGED = 'UNCHANGED'
+
+# Parts of the reasons CloudFormation gives for a change set that
+# failed only because the stack is already up to date.
+NO_CHANGES_REASONS = (
+    "didn't contain changes",
+    'No updates are to be performed',
+)
+
+
+def template_fingerprint(template_body, parameters=None):
+    """
+    Returns a hash of a template's body and the parameters it is
+    deployed with.
+    """
+    digest = hashlib.sha256(template_body.encode())
+    digest.update(json.dumps(parameters or {}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def format_resource_change(change):
+    """
+    Returns a line describing a change that a change set will make.
+    """
+    resource_change = change['ResourceChange']
+    line = ' '.join([
+        resource_change['Action'].ljust(7),
+        resource_change['LogicalResourceId'],
+        f"({resource_change['ResourceType']})",
+    ])
+    replacement = resource_change.get('Replacement')
+    if replacement == 'True':
+        line += ' [REPLACEMENT]'
+    elif replacement == 'Conditional':
+        line += ' [MAY BE REPLACED]'
+    return line
 
 
 class CloudFormationStackCreator:
 
-    _client = boto3.client('cloudformation', region_name='us-east-1')
+    @property
+    def _client(self):
+        return clients.get_client('cloudformation', region_name='us-east-1')
 
-    def create_stack(self, template, stack_name):
+    # A cache.LookupCache for the results of read-only requests, if
+    # they should be cached.
+    lookup_cache = None
+
+    def deploy_stack(self, template, stack_name, parameters=None):
         """
-        Creates a new stack and waits for CREATE_COMPLETE status.
+        Creates the stack, or updates it if it already exists.
+
+        Returns STACK_CREATED, STACK_UPDATED or STACK_UNCHANGED. An
+        existing stack is left alone if it was deployed from the same
+        template and parameters.
         """
-        self._client.create_stack(
-            StackName=stack_name,
-            TemplateBody=template.to_yaml(),
-            Capabilities=['CAPABILITY_NAMED_IAM'],
-            OnFailure='DELETE'
+        template_body, fingerprint = self._render_template(
+            template,
+            parameters
         )
-        print(f"Creating CloudFormation stack '{stack_name}'... ", end='')
-        status = self._check_stack_creation_status(stack_name)
-        if status:
+        with tracing.span('describe_stack', stack_name=stack_name):
+            stack = self._describe_stack(stack_name)
+        if stack is None:
+            self._create_stack(stack_name, template_body, parameters)
+            return STACK_CREATED
+        status = stack['StackStatus']
+        if status.endswith('_IN_PROGRESS'):
+            raise SystemExit(
+                f"Stack '{stack_name}' cannot be updated while its status "
+                f'is {status}'
+            )
+        if status == 'ROLLBACK_COMPLETE':
+            raise SystemExit(
+                f"Stack '{stack_name}' failed to be created and must be "
+                'deleted before it can be deployed again'
+            )
+        outputs = {
+            output['OutputKey']: output['OutputValue']
+            for output in stack.get('Outputs', [])
+        }
+        if outputs.get(FINGERPRINT_OUTPUT) == fingerprint:
+            print(f"Stack '{stack_name}' is up to date")
+            return STACK_UNCHANGED
+        if self._update_stack(stack_name, template_body, parameters):
+            return STACK_UPDATED
+        return STACK_UNCHANGED
+
+    def create_stack(self, template, stack_name, parameters=None):
+        """
+        Creates a new stack and waits for CREATE_COMPLETE status.
+        """
+        template_body, _ = self._render_template(template, parameters)
+        self._create_stack(stack_name, template_body, parameters)
+
+    def _render_template(self, template, parameters):
+        """
+        Returns the body of the template, with an output that records
+        its fingerprint, and the fingerprint.
+
+        The fingerprint is computed before the output is added, so it
+        does not depend on itself.
+        """
+        with tracing.span('render_template'):
+            template.outputs.pop(FINGERPRINT_OUTPUT, None)
+            fingerprint = template_fingerprint(template.to_yaml(), parameters)
+            template.add_output(Output(
+                FINGERPRINT_OUTPUT,
+                Description='Fingerprint of the deployed template',
+                Value=fingerprint
+            ))
+            template_body = template.to_yaml()
+        return (template_body, fingerprint)
+
+    def _create_stack(self, stack_name, template_body, parameters):
+        """
+        Creates a new stack from a rendered template and waits for it.
+
+        The stack is followed by its ID, since a stack that fails to be
+        created is deleted and can then no longer be found by name.
+        """
+        with tracing.span('request_stack_creation', stack_name=stack_name):
+            response = self._client.create_stack(
+                StackName=stack_name,
+                TemplateBody=template_body,
+                Parameters=self._stack_parameters(parameters),
+                Capabilities=['CAPABILITY_NAMED_IAM'],
+                OnFailure='DELETE'
+            )
+        stack_id = response['StackId']
+        tailer = stack_events.StackEventTailer(self._client, stack_id)
+        print(f"Creating CloudFormation stack '{stack_name}'...")
+        self._invalidate_stack_outputs(stack_name)
+        status = self._wait_for_stack(stack_name, tailer, stack_id)
+        if status == 'CREATE_COMPLETE':
             print('Stack created successfully')
         else:
             raise SystemExit('Stack creation failed')
 
-    def _check_stack_creation_status(self, stack_name):
+    def _update_stack(self, stack_name, template_body, parameters):
         """
-        Displays loading spinner while stack is being created.
+        Updates an existing stack through a change set.
+
+        Returns False if CloudFormation finds nothing to change.
         """
-        spinner = self._spinning_cursor()
-        response = self._client.describe_stacks(
-            StackName=stack_name
-        )
-        stack, stack_index = self._find_stack_in_response(response, stack_name)
-        stack_status = stack['StackStatus']
-        while stack_status == 'CREATE_IN_PROGRESS':
-            sys.stdout.write(next(spinner))
-            sys.stdout.flush()
-            time.sleep(0.1)
-            sys.stdout.write('\b')
-            response = self._client.describe_stacks(
-                StackName=stack_name
+        change_set_name = f'static-site-{time.time_ns()}'
+        with tracing.span('create_change_set', stack_name=stack_name):
+            self._client.create_change_set(
+                StackName=stack_name,
+                ChangeSetName=change_set_name,
+                ChangeSetType='UPDATE',
+                TemplateBody=template_body,
+                Parameters=self._stack_parameters(parameters),
+                Capabilities=['CAPABILITY_NAMED_IAM']
             )
-            stack = response['Stacks'][stack_index]
-            stack_status = stack['StackStatus']
-        sys.stdout.write('\n')
-        if stack_status == 'CREATE_COMPLETE':
+            print(f"Creating change set for stack '{stack_name}'...")
+            change_set, changes = self._wait_for_change_set(
+                stack_name,
+                change_set_name
+            )
+        if change_set['Status'] == 'FAILED':
+            self._client.delete_change_set(
+                StackName=stack_name,
+                ChangeSetName=change_set_name
+            )
+            reason = change_set.get('StatusReason', '')
+            if any(text in reason for text in NO_CHANGES_REASONS):
+                print(f"Stack '{stack_name}' is up to date")
+                return False
+            raise SystemExit(f'Change set could not be created: {reason}')
+        print(f"Changes to stack '{stack_name}':")
+        for change in changes:
+            print(f'  {format_resource_change(change)}')
+        tailer = stack_events.StackEventTailer(self._client, stack_name)
+        tailer.skip_existing_events()
+        with tracing.span('execute_change_set', stack_name=stack_name):
+            self._client.execute_change_set(
+                StackName=stack_name,
+                ChangeSetName=change_set_name
+            )
+        print(f"Updating CloudFormation stack '{stack_name}'...")
+        self._invalidate_stack_outputs(stack_name)
+        status = self._wait_for_stack(stack_name, tailer)
+        if status == 'UPDATE_COMPLETE':
+            print('Stack updated successfully')
             return True
-        else:
-            return False
+        raise SystemExit('Stack update failed')
 
-    def _spinning_cursor(self):
+    def _wait_for_change_set(self, stack_name, change_set_name):
         """
-        Generator function used to display loading spinner.
+        Waits until the change set has been created or has failed.
+
+        Returns the change set's description and all of its changes.
+        """
+        poller = polling.Poller(
+            initial_delay=2,
+            max_delay=10,
+            timeout=CHANGE_SET_TIMEOUT
+        )
+
+        def check():
+            response = self._client.describe_change_set(
+                StackName=stack_name,
+                ChangeSetName=change_set_name
+            )
+            if response['Status'] in ('CREATE_PENDING', 'CREATE_IN_PROGRESS'):
+                return None
+            return response
+
+        try:
+            change_set = poller.poll(check, f"change set '{change_set_name}'")
+        except polling.PollingTimeout as err:
+            raise SystemExit(str(err))
+        changes = list(change_set.get('Changes', []))
+        response = change_set
+        while 'NextToken' in response:
+            response = self._client.describe_change_set(
+                StackName=stack_name,
+                ChangeSetName=change_set_name,
+                NextToken=response['NextToken']
+            )
+            changes.extend(response.get('Changes', []))
+        return change_set, changes
+
+    def _wait_for_stack(self, stack_name, tailer, stack_id=None):
         """
-        while True:
-            for cursor in '|/-\\':
-                yield cursor
+        Reports the stack's events as they happen until it stops
+        changing, and returns its final status.
+
+        The stack is described by its ID, if one is given. A stack that
+        can no longer be found is reported as DELETE_COMPLETE.
+
+        Only events newer than the last one seen by the tailer are
+        fetched. The stack's status is checked once its own events show
+        that it has stopped changing, and a timeline of how long each
+        resource took is printed at the end.
+        """
+        poller = polling.Poller(
+            initial_delay=2,
+            max_delay=20,
+            timeout=STACK_OPERATION_TIMEOUT
+        )
+
+        def check():
+            last_stack_status = None
+            for event in tailer.fetch_new_events():
+                spinner.write_line(stack_events.format_event(event))
+                if event['LogicalResourceId'] == stack_name:
+                    last_stack_status = event['ResourceStatus']
+            if (last_stack_status is None
+                    or last_stack_status.endswith('_IN_PROGRESS')):
+                return None
+            if last_stack_status == 'DELETE_COMPLETE':
+                # A stack that failed and was deleted can no longer be
+                # described.
+                return last_stack_status
+            stack = self._describe_stack(stack_id or stack_name)
+            if stack is None:
+                return 'DELETE_COMPLETE'
+            if stack['StackStatus'].endswith('_IN_PROGRESS'):
+                return None
+            return stack['StackStatus']
+
+        with tracing.span('wait_for_stack', stack_name=stack_name):
+            with polling.Spinner() as spinner:
+                try:
+                    stack_status = poller.poll(check, f"stack '{stack_name}'")
+                except polling.PollingTimeout as err:
+                    raise SystemExit(str(err))
+        for line in stack_events.format_timeline(tailer.timeline()):
+            print(line)
+        return stack_status
+
+    def _lookup_key(self, kind, name):
+        """
+        Returns the key under which a lookup is cached.
+
+        Keys include the AWS account, so that values cached with one
+        set of credentials are not reused with another.
+        """
+        return f'{clients.get_account_id()}:{kind}:{name}'
+
+    def _invalidate_stack_outputs(self, stack_name):
+        """
+        Removes the stack's outputs from the lookup cache.
+        """
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate(
+                self._lookup_key('stack-outputs', stack_name)
+            )
+
+    def _describe_stack(self, stack_name):
+        """
+        Returns the description of the stack, or None if it does not
+        exist.
+
+        The stack may be given by its name or its ID.
+        """
+        try:
+            response = self._client.describe_stacks(StackName=stack_name)
+        except ClientError as err:
+            if 'does not exist' in err.response['Error'].get('Message', ''):
+                return None
+            raise
+        return self._find_stack_in_response(response, stack_name)[0]
+
+    def _stack_parameters(self, parameters):
+        """
+        Converts a dictionary of parameters to the form the
+        CloudFormation API expects.
+        """
+        return [
+            {'ParameterKey': key, 'ParameterValue': str(value)}
+            for key, value in sorted((parameters or {}).items())
+        ]
 
     def _get_stack_output(self, stack_name, key_name):
         """
         Returns the output of the stack.
         """
-        response = self._client.describe_stacks(
-            StackName=stack_name
-        )
-        stack = self._find_stack_in_response(response, stack_name)[0]
-        output_index = 0
-        output = stack['Outputs'][output_index]
-        while output['OutputKey'] != key_name:
-            output_index += 1
-            try:
-                output = stack['Outputs'][output_index]
-            except IndexError:
-                raise SystemExit(f"Output '{key_name}' could not be found")
-        return output['OutputValue']
+        outputs = self._get_stack_outputs(stack_name)
+        if key_name not in outputs:
+            raise SystemExit(f"Output '{key_name}' could not be found")
+        return outputs[key_name]
+
+    def _get_stack_outputs(self, stack_name):
+        """
+        Returns a dictionary of all of the stack's outputs.
+
+        The outputs are read with a single request and kept in the
+        lookup cache, if there is one, until the stack is deployed
+        again.
+        """
+        cache_key = None
+        if self.lookup_cache is not None:
+            cache_key = self._lookup_key('stack-outputs', stack_name)
+            outputs = self.lookup_cache.get(cache_key)
+            if outputs is not None:
+                return outputs
+        stack = self._describe_stack(stack_name)
+        if stack is None:
+            raise SystemExit(f"Stack '{stack_name}' could not be found")
+        outputs = {
+            output['OutputKey']: output['OutputValue']
+            for output in stack.get('Outputs', [])
+        }
+        if (self.lookup_cache is not None
+                and not stack['StackStatus'].endswith('_IN_PROGRESS')):
+            self.lookup_cache.set(cache_key, outputs, STACK_OUTPUTS_TTL)
+        return outputs
 
     def _find_stack_in_response(self, response, stack_name):
         """
         Finds the desired stack info in the JSON response.
+
+        The stack may be given by its name or its ID.
         """
         stack_index = 0
         stack = response['Stacks'][stack_index]
-        while stack['StackName'] != stack_name:
+        while stack_name not in (stack['StackName'], stack.get('StackId')):
             stack_index += 1
             try:
                 stack = response['Stacks'][stack_index]
@@ -15,7 +15,7 @@ BASE_DIR = Path(__file__).resolve().parent
 class Validator(abc.ABC):
 
     def __init__(self, default_value=None):
-        self._value = default_value
+        self.default_value = default_value
 
     def __set_name__(self, owner, name):
         self.public_name = name
@@ -24,11 +24,13 @@ class Validator(abc.ABC):
     def __get__(self, obj, objtype=None):
         if obj is None:
             return self
-        return self._value
+        # Values are stored on each instance, so that the settings of
+        # several sites can be loaded at once.
+        return obj.__dict__.get(self.private_name, self.default_value)
 
     def __set__(self, obj, value):
         self.validate(value)
-        self._value = value
+        obj.__dict__[self.private_name] = value
 
     @abc.abstractmethod
     def validate(self, value):
@@ -66,6 +68,70 @@ class Boolean(Validator):
             raise TypeError(f'{self.public_name} must be either True or False')
 
 
+class Integer(Validator):
+
+    def __init__(self, minimum=None, default_value=None):
+        Validator.__init__(self, default_value)
+        self.minimum = minimum
+
+    def validate(self, value):
+        # Value must be an integer; booleans are not accepted.
+        if type(value) is not int:
+            raise TypeError(f'{self.public_name} must be a valid integer')
+
+        # If a minimum is given, the value cannot be smaller than it.
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(
+                f'{self.public_name} must be at least {self.minimum}'
+            )
+
+
+class StringList(Validator):
+
+    def validate(self, value):
+        # Value must be a list or tuple of strings.
+        if (type(value) not in (list, tuple)
+                or any(type(item) is not str for item in value)):
+            raise TypeError(f'{self.public_name} must be a list of strings')
+
+
+class MetadataRules(Validator):
+
+    # The upload arguments that a rule is allowed to set.
+    ALLOWED_KEYS = {
+        'CacheControl',
+        'ContentDisposition',
+        'ContentLanguage',
+        'ContentType',
+        'Expires',
+        'Metadata',
+    }
+
+    def validate(self, value):
+        # Value must be a list of (pattern, metadata) pairs.
+        if type(value) not in (list, tuple):
+            raise TypeError(
+                f'{self.public_name} must be a list of (pattern, metadata) '
+                'pairs'
+            )
+        for rule in value:
+            if (type(rule) not in (list, tuple) or len(rule) != 2
+                    or type(rule[0]) is not str
+                    or type(rule[1]) is not dict):
+                raise TypeError(
+                    f'{self.public_name} must be a list of (pattern, '
+                    f'metadata) pairs; got {rule!r}'
+                )
+
+            # Each rule may only set the allowed upload arguments.
+            unknown_keys = set(rule[1]) - self.ALLOWED_KEYS
+            if unknown_keys:
+                raise ValueError(
+                    f'{self.public_name} rule {rule[0]!r} sets unsupported '
+                    f'metadata {sorted(unknown_keys)!r}'
+                )
+
+
 class Arguments:
     """
     Validates settings and command-line arguments.
@@ -80,10 +146,31 @@ class Arguments:
     _500_FILE = String()
     REGISTER_DOMAIN = Boolean(default_value=True)
     HTML_EXTENSIONS = Boolean(default_value=True)
+    UPLOAD_CONCURRENCY = Integer(minimum=1, default_value=10)
+    ADAPTIVE_CONCURRENCY = Boolean(default_value=True)
+    MIN_UPLOAD_CONCURRENCY = Integer(minimum=1, default_value=2)
+    MAX_UPLOAD_CONCURRENCY = Integer(minimum=1, default_value=64)
+    SYNC_FILES = Boolean(default_value=False)
+    DELETE_REMOVED_FILES = Boolean(default_value=False)
+    STATE_DIRECTORY = String(default_value='.static-site-deploy')
+    PRECOMPRESS_FILES = Boolean(default_value=False)
+    CACHE_CONTROL_RULES = MetadataRules(default_value=[])
+    FINGERPRINT_ASSETS = Boolean(default_value=False)
+    FINGERPRINT_EXCLUDE = StringList(default_value=['favicon.ico'])
+    # Defaults to the value of SYNC_FILES.
+    INVALIDATE_CHANGED_FILES = Boolean()
+    INVALIDATION_WILDCARD_THRESHOLD = Integer(minimum=1, default_value=20)
+    WAIT_FOR_INVALIDATION = Boolean(default_value=True)
+    STACK_NAME = String()
+    IGNORE_PATTERNS = StringList(default_value=[])
+    FOLLOW_SYMLINKS = Boolean(default_value=False)
 
-    def __init__(self, action=None, settings_file=None):
+    def __init__(self, action=None, settings_file=None,
+                 rebuild_manifest=False, no_cache=False):
         self.action = action
         self.settings_file = settings_file
+        self.rebuild_manifest = rebuild_manifest
+        self.no_cache = no_cache
         self._validate_arguments()
 
     def _validate_arguments(self):
@@ -132,6 +219,13 @@ class Arguments:
                         ])
                     )
 
+            # Ensure the range of upload concurrency is not empty.
+            if self.MIN_UPLOAD_CONCURRENCY > self.MAX_UPLOAD_CONCURRENCY:
+                raise ValueError(
+                    'MIN_UPLOAD_CONCURRENCY must not be greater than '
+                    'MAX_UPLOAD_CONCURRENCY'
+                )
+
             # Ensure the source directory exists.
             if not os.path.isdir(self.SOURCE_FILES_DIRECTORY):
                 raise ValueError(
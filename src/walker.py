@@ -0,0 +1,122 @@
+"""
+Defines a generator that lists the files in a source directory.
+
+The SourceTreeWalker class reads one directory at a time with
+os.scandir() and yields a small record for each file as soon as it is
+found, so that files can be uploaded while the rest of the tree is
+still being read, and memory use does not grow with the size of the
+tree. Files and directories that match an ignore pattern are skipped
+without being read.
+"""
+
+from collections import namedtuple
+import mimetypes
+import os
+import re
+import stat
+
+from src import metadata
+
+
+# Describes a file in the source directory: its key, which is the path
+# relative to the source directory with `/` separators, its path on the
+# local disk, its size, modification time and MIME type.
+FileRecord = namedtuple(
+    'FileRecord',
+    ['key', 'path', 'size', 'mtime_ns', 'mime_type']
+)
+
+# Files and directories that are never uploaded.
+DEFAULT_IGNORE_PATTERNS = (
+    '.git',
+    '.hg',
+    '.svn',
+    '.DS_Store',
+    'Thumbs.db',
+)
+
+# The MIME type of files whose type cannot be guessed.
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+
+
+def guess_mime_type(name):
+    """
+    Returns the MIME type of a file with the given name.
+    """
+    mime_type, _ = mimetypes.guess_type(name)
+    return mime_type or DEFAULT_MIME_TYPE
+
+
+class SourceTreeWalker:
+
+    def __init__(self, root, ignore_patterns=(), follow_symlinks=False):
+        """
+        The ignore patterns are globs in the form used by
+        CACHE_CONTROL_RULES, checked in addition to the defaults.
+
+        Symbolic links to files are always included. Symbolic links to
+        directories are only followed if follow_symlinks is True, and
+        never into a directory that is already being read.
+        """
+        self.root = root
+        # A single expression is much faster to check than many.
+        self.ignore_regex = re.compile('|'.join(
+            f'(?:{metadata.compile_pattern(pattern).pattern})'
+            for pattern in (*DEFAULT_IGNORE_PATTERNS, *ignore_patterns)
+        ))
+        self.follow_symlinks = follow_symlinks
+
+    def walk(self):
+        """
+        Yields a FileRecord for each file in the tree.
+
+        Files are yielded in the order the file system lists them, as
+        each directory is read. Only the directories still to be read
+        are held in memory, so even a directory with millions of files
+        is never listed in full first.
+        """
+        root_stat = os.stat(self.root)
+        # Each item is a directory's path, its key prefix and the
+        # identities of the directories that contain it.
+        stack = [(self.root, '', {(root_stat.st_dev, root_stat.st_ino)})]
+        while stack:
+            path, prefix, ancestors = stack.pop()
+            subdirectories = []
+            for entry in self._scan(path):
+                key = prefix + entry.name
+                if self.ignore_regex.match(key):
+                    continue
+                try:
+                    entry_stat = entry.stat()
+                except OSError:
+                    # A broken symbolic link or a file that was removed.
+                    continue
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    identity = (entry_stat.st_dev, entry_stat.st_ino)
+                    if entry.is_symlink() and (
+                            not self.follow_symlinks
+                            or identity in ancestors):
+                        continue
+                    subdirectories.append(
+                        (entry.path, key + '/', ancestors | {identity})
+                    )
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    yield FileRecord(
+                        key,
+                        entry.path,
+                        entry_stat.st_size,
+                        entry_stat.st_mtime_ns,
+                        guess_mime_type(entry.name)
+                    )
+            stack.extend(subdirectories)
+
+    def _scan(self, path):
+        """
+        Yields the entries of a directory, or nothing if it has been
+        removed since it was found.
+        """
+        try:
+            with os.scandir(path) as entries:
+                yield from entries
+        except (FileNotFoundError, NotADirectoryError):
+            return
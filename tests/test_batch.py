@@ -0,0 +1,136 @@
+import contextvars
+import io
+import threading
+
+import pytest
+
+from src import batch, validators
+
+
+def write_settings(tmp_path, name, domain_name):
+    source_directory = tmp_path / name
+    source_directory.mkdir()
+    (source_directory / 'index.html').write_text('<html></html>')
+    settings_file = tmp_path / f'{name}_settings.py'
+    settings_file.write_text('\n'.join([
+        f'DOMAIN_NAME = {domain_name!r}',
+        f'SOURCE_FILES_DIRECTORY = {str(source_directory)!r}',
+        '',
+    ]))
+    return str(settings_file)
+
+
+@pytest.fixture
+def mock_sites(mocker):
+    mock_get_client = mocker.patch('src.batch.clients.get_client')
+    mock_get_client.return_value.list_hosted_zones_by_name.return_value = {
+        'HostedZones': [],
+        'IsTruncated': False,
+    }
+    sites = {}
+
+    def create_site(arguments):
+        site = mocker.Mock()
+        site.domain_name = arguments.DOMAIN_NAME
+        site.stack_name = 'static-website'
+        sites[site.domain_name] = site
+        return site
+
+    mocker.patch(
+        'src.batch.create.create_static_website',
+        side_effect=create_site
+    )
+    return sites
+
+
+def test_stack_names_are_derived_from_domain_names():
+    assert batch.stack_name_for('Blog.Example.com') == (
+        'static-site-blog-example-com'
+    )
+
+
+def test_settings_of_several_sites_are_kept_apart(tmp_path):
+    first = validators.Arguments(
+        'deploy',
+        write_settings(tmp_path, 'first', 'example.com')
+    )
+    second = validators.Arguments(
+        'deploy',
+        write_settings(tmp_path, 'second', 'example.org')
+    )
+
+    assert first.DOMAIN_NAME == 'example.com'
+    assert second.DOMAIN_NAME == 'example.org'
+
+
+def test_output_is_prefixed_with_site():
+    stream = io.StringIO()
+    output = batch.SiteOutput(stream)
+
+    def write(site, *parts):
+        batch.current_site.set(site)
+        for part in parts:
+            output.write(part)
+
+    contextvars.Context().run(write, 'example.com', 'Upload', 'ing\nDone\n')
+    contextvars.Context().run(write, None, 'Summary\n')
+
+    assert stream.getvalue() == ''.join([
+        '[example.com] Uploading\n',
+        '[example.com] Done\n',
+        'Summary\n',
+    ])
+
+
+def test_deploys_sites_concurrently(tmp_path, mock_sites, capsys):
+    settings_files = [
+        write_settings(tmp_path, 'first', 'example.com'),
+        write_settings(tmp_path, 'second', 'example.org'),
+    ]
+    barrier = threading.Barrier(2, timeout=5)
+    deployer = batch.BatchDeployer(settings_files, max_concurrent_sites=2)
+    sites = deployer._create_sites()
+    deployer._create_sites = lambda: sites
+    for site in sites:
+        # Neither site can finish unless both are deployed at once.
+        site.deploy_static_site.side_effect = barrier.wait
+
+    results = deployer.deploy()
+
+    assert [result.error for result in results] == [None, None]
+    assert [site.stack_name for site in sites] == [
+        'static-site-example-com',
+        'static-site-example-org',
+    ]
+    assert site.hosted_zone_resolver is sites[0].hosted_zone_resolver
+    assert 'Deployed 2 of 2 site(s)' in capsys.readouterr().out
+
+
+def test_reports_failed_sites(tmp_path, mock_sites, capsys):
+    deployer = batch.BatchDeployer([
+        write_settings(tmp_path, 'first', 'example.com'),
+        write_settings(tmp_path, 'second', 'example.org'),
+    ])
+    sites = deployer._create_sites()
+    sites[1].deploy_static_site.side_effect = SystemExit('Upload failed')
+    deployer._create_sites = lambda: sites
+
+    with pytest.raises(SystemExit):
+        deployer.deploy()
+
+    output = capsys.readouterr().out
+    assert '[example.org] Deployment failed: Upload failed' in output
+    assert 'Deployed 1 of 2 site(s)' in output
+    sites[0].deploy_static_site.assert_called_once()
+
+
+def test_duplicate_domains_are_rejected(tmp_path, mock_sites):
+    deployer = batch.BatchDeployer([
+        write_settings(tmp_path, 'first', 'example.com'),
+        write_settings(tmp_path, 'second', 'example.com'),
+    ])
+
+    with pytest.raises(SystemExit):
+        deployer.deploy()
+    for site in mock_sites.values():
+        site.deploy_static_site.assert_not_called()
@@ -0,0 +1,42 @@
+from benchmarks import run, trees
+
+
+def test_benchmarks_run_on_a_small_tree(tmp_path):
+    results = run.run_benchmarks(sizes=[30], tree_directory=str(tmp_path))
+
+    benchmarks = results['benchmarks']
+    assert set(benchmarks) == {
+        'walk_30',
+        'upload_30',
+        'list_30',
+        'synthesis',
+        'startup',
+    }
+    # One request per file and one that lists incomplete multipart
+    # uploads.
+    assert benchmarks['upload_30']['requests'] == 31
+
+
+def test_trees_are_reused(tmp_path):
+    total_size = trees.generate_tree(str(tmp_path), 20, seed=1)
+    (tmp_path / 'section-0' / 'page-0' / 'file-0.html').unlink()
+
+    assert trees.generate_tree(str(tmp_path), 20, seed=1) == total_size
+    assert not (tmp_path / 'section-0' / 'page-0' / 'file-0.html').exists()
+
+
+def test_compare_reports_only_slower_benchmarks():
+    baseline = {'benchmarks': {
+        'walk_1000': {'seconds': 1.0},
+        'synthesis': {'seconds': 1.0},
+        'removed': {'seconds': 1.0},
+    }}
+    results = {'benchmarks': {
+        'walk_1000': {'seconds': 1.2},
+        'synthesis': {'seconds': 1.5},
+        'added': {'seconds': 9.0},
+    }}
+
+    assert run.compare(results, baseline, tolerance=0.3) == [
+        ('synthesis', 1.0, 1.5)
+    ]
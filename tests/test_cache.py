@@ -0,0 +1,71 @@
+import json
+
+from src import cache
+
+
+def test_values_persist_between_caches(tmp_path):
+    filepath = tmp_path / 'state' / 'lookups.json'
+    cache.LookupCache(filepath).set('hosted-zone:example.com', '1234', 60)
+
+    assert cache.LookupCache(filepath).get('hosted-zone:example.com') == (
+        '1234'
+    )
+
+
+def test_expired_values_are_ignored(tmp_path, mocker):
+    filepath = tmp_path / 'lookups.json'
+    lookup_cache = cache.LookupCache(filepath)
+    lookup_cache.set('key', 'value', 60)
+    mocker.patch('src.cache.time.time', return_value=10 ** 12)
+
+    assert lookup_cache.get('key') is None
+    assert cache.LookupCache(filepath).get('key') is None
+
+
+def test_lookup_calls_function_only_when_needed(tmp_path, mocker):
+    lookup_cache = cache.LookupCache(tmp_path / 'lookups.json')
+    function = mocker.Mock(return_value={'S3BucketName': 'bucket'})
+
+    for _ in range(2):
+        assert lookup_cache.lookup('outputs', 60, function) == {
+            'S3BucketName': 'bucket'
+        }
+    assert function.call_count == 1
+
+
+def test_lookup_does_not_store_missing_values(tmp_path, mocker):
+    lookup_cache = cache.LookupCache(tmp_path / 'lookups.json')
+    function = mocker.Mock(return_value=None)
+
+    lookup_cache.lookup('certificate', 60, function)
+    lookup_cache.lookup('certificate', 60, function)
+
+    assert function.call_count == 2
+
+
+def test_invalidate_keeps_other_caches_values(tmp_path):
+    filepath = tmp_path / 'lookups.json'
+    first = cache.LookupCache(filepath)
+    second = cache.LookupCache(filepath)
+    first.set('first', 1, 60)
+    second.set('second', 2, 60)
+    second.invalidate('first')
+
+    assert set(json.loads(filepath.read_text())) == {'second'}
+
+
+def test_disabled_cache_ignores_stored_values(tmp_path):
+    filepath = tmp_path / 'lookups.json'
+    cache.LookupCache(filepath).set('key', 'old', 60)
+    lookup_cache = cache.LookupCache(filepath, enabled=False)
+
+    assert lookup_cache.get('key') is None
+    lookup_cache.set('key', 'new', 60)
+    assert cache.LookupCache(filepath).get('key') == 'new'
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    filepath = tmp_path / 'lookups.json'
+    filepath.write_text('{not json')
+
+    assert cache.LookupCache(filepath).get('key') is None
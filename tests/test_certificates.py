@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+
+from src import certificates
+
+
+now = datetime.now(timezone.utc)
+
+
+def make_summary(number, names, days_left, **kwargs):
+    summary = {
+        'CertificateArn': f'arn:aws:acm:us-east-1:1234:certificate/{number}',
+        'DomainName': names[0],
+        'SubjectAlternativeNameSummaries': names,
+        'NotAfter': now + timedelta(days=days_left),
+    }
+    summary.update(kwargs)
+    return summary
+
+
+def mock_client(mocker, summaries):
+    client = mocker.Mock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {'CertificateSummaryList': summaries[:1]},
+        {'CertificateSummaryList': summaries[1:]},
+    ]
+    return client
+
+
+def test_wildcard_names_cover_one_label():
+    assert certificates.name_matches('*.example.com', 'www.example.com')
+    assert not certificates.name_matches('*.example.com', 'example.com')
+    assert not certificates.name_matches('*.example.com', 'a.b.example.com')
+    assert certificates.name_matches('Example.com', 'example.com.')
+
+
+def test_finds_certificate_covering_every_domain_name(mocker):
+    client = mock_client(mocker, [
+        make_summary(1, ['example.com'], 300),
+        make_summary(2, ['example.com', 'www.example.com'], 200),
+        make_summary(3, ['example.com', '*.example.com'], 300),
+    ])
+
+    arn = certificates.find_issued_certificate(
+        client,
+        ['example.com', 'www.example.com']
+    )
+
+    assert arn.endswith('/3')
+    client.get_paginator.assert_called_once_with('list_certificates')
+
+
+def test_lists_certificates_of_every_key_type(mocker):
+    client = mock_client(mocker, [])
+
+    certificates.find_issued_certificate(client, ['example.com'])
+
+    client.get_paginator.return_value.paginate.assert_called_once_with(
+        CertificateStatuses=['ISSUED'],
+        Includes={'keyTypes': [
+            'RSA_2048',
+            'RSA_3072',
+            'RSA_4096',
+            'EC_prime256v1',
+            'EC_secp384r1',
+        ]}
+    )
+
+
+def test_ignores_certificates_that_expire_soon(mocker):
+    client = mock_client(mocker, [
+        make_summary(1, ['example.com', 'www.example.com'], 10),
+    ])
+
+    assert certificates.find_issued_certificate(
+        client,
+        ['example.com', 'www.example.com']
+    ) is None
+
+
+def test_describes_certificates_with_truncated_names(mocker):
+    client = mock_client(mocker, [
+        make_summary(
+            1,
+            ['example.com'],
+            300,
+            HasAdditionalSubjectAlternativeNames=True
+        ),
+    ])
+    client.describe_certificate.return_value = {'Certificate': {
+        'DomainName': 'example.com',
+        'SubjectAlternativeNames': ['example.com', 'www.example.com'],
+        'NotAfter': now + timedelta(days=300),
+    }}
+
+    arn = certificates.find_issued_certificate(
+        client,
+        ['example.com', 'www.example.com']
+    )
+
+    assert arn.endswith('/1')
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from src import clients
+
+
+@pytest.fixture
+def mock_session(mocker):
+    mock_session_class = mocker.patch('src.clients.boto3.session.Session')
+    session = mock_session_class.return_value
+    session.client.side_effect = lambda *args, **kwargs: mocker.Mock()
+    return mock_session_class
+
+
+def test_no_session_is_created_until_a_client_is_needed(mock_session):
+    pool = clients.ClientPool()
+    assert mock_session.call_count == 0
+
+    pool.client('s3')
+    assert mock_session.call_count == 1
+
+
+def test_clients_are_reused(mock_session):
+    pool = clients.ClientPool()
+
+    assert pool.client('acm') is pool.client('acm')
+    assert pool.client('acm') is not pool.client('route53')
+    assert pool.client('acm') is not pool.client(
+        'acm',
+        region_name='eu-west-1'
+    )
+    assert mock_session.return_value.client.call_count == 3
+
+
+def test_clients_are_configured_centrally(mock_session):
+    pool = clients.ClientPool(region_name='us-east-1', max_attempts=3)
+    pool.client('s3', max_pool_connections=25)
+
+    kwargs = mock_session.return_value.client.call_args.kwargs
+    assert kwargs['region_name'] == 'us-east-1'
+    assert kwargs['config'].max_pool_connections == 25
+    assert kwargs['config'].retries == {'max_attempts': 3, 'mode': 'standard'}
+
+
+def test_each_client_is_created_once_across_threads(mock_session):
+    pool = clients.ClientPool()
+    results = []
+
+    def get_client():
+        results.append(pool.client('cloudfront'))
+
+    threads = [threading.Thread(target=get_client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in results}) == 1
+    assert mock_session.return_value.client.call_count == 1
+
+
+def test_account_id_is_looked_up_once(mock_session):
+    pool = clients.ClientPool()
+    sts = pool.client('sts')
+    sts.get_caller_identity.return_value = {'Account': '111111111111'}
+
+    assert pool.account_id() == '111111111111'
+    assert pool.account_id() == '111111111111'
+    assert sts.get_caller_identity.call_count == 1
@@ -0,0 +1,75 @@
+import gzip
+import os
+
+import brotli
+
+from src import compress, upload
+
+
+def test_only_text_files_are_compressible():
+    assert compress.is_compressible('index.html')
+    assert compress.is_compressible('assets/APP.JS')
+    assert not compress.is_compressible('images/logo.png')
+
+
+def test_creates_deterministic_variants(tmp_path):
+    source = tmp_path / 'style.css'
+    source.write_bytes(b'body { color: red; }' * 100)
+    output = str(tmp_path / 'out' / 'style.css')
+
+    variants = compress.compress_file(str(source), output, ['br', 'gzip'])
+
+    with open(variants['br'], 'rb') as file:
+        assert brotli.decompress(file.read()) == source.read_bytes()
+    with open(variants['gzip'], 'rb') as file:
+        first_gzip = file.read()
+    assert gzip.decompress(first_gzip) == source.read_bytes()
+
+    os.remove(variants['gzip'])
+    compress.compress_file(str(source), output, ['gzip'])
+    with open(variants['gzip'], 'rb') as file:
+        assert file.read() == first_gzip
+
+
+def test_unchanged_files_are_not_compressed_again(tmp_path, mocker):
+    source = tmp_path / 'index.html'
+    source.write_bytes(b'<html></html>')
+    output = str(tmp_path / 'out' / 'index.html')
+    compress.compress_file(str(source), output, ['gzip'])
+    spy_compress = mocker.spy(compress.gzip, 'compress')
+
+    compress.compress_file(str(source), output, ['gzip'])
+
+    assert spy_compress.call_count == 0
+
+
+def test_adds_variant_jobs_with_content_encoding(tmp_path):
+    (tmp_path / 'index.html').write_bytes(b'<html></html>')
+    (tmp_path / 'logo.png').write_bytes(b'png')
+    jobs = [
+        upload.UploadJob(
+            str(tmp_path / 'index.html'),
+            'index.html',
+            {'ContentType': 'text/html'}
+        ),
+        upload.UploadJob(
+            str(tmp_path / 'logo.png'),
+            'logo.png',
+            {'ContentType': 'image/png'}
+        ),
+    ]
+    builder = compress.CompressedVariantBuilder(
+        str(tmp_path / 'compressed'),
+        max_workers=2
+    )
+
+    all_jobs = {job.key: job for job in builder.add_variants(jobs)}
+
+    assert set(all_jobs) == {
+        'index.html', 'index.html.br', 'index.html.gz', 'logo.png'
+    }
+    assert all_jobs['index.html.br'].extra_args == {
+        'ContentType': 'text/html',
+        'ContentEncoding': 'br',
+    }
+    assert all_jobs['index.html.gz'].extra_args['ContentEncoding'] == 'gzip'
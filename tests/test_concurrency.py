@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from src import concurrency, tracing
+
+
+@pytest.fixture
+def clock(mocker):
+    mock_monotonic = mocker.patch('src.concurrency.time.monotonic')
+    mock_monotonic.return_value = 0.0
+    return mock_monotonic
+
+
+def run_window(limiter, clock, latency, size=0, duration=1.0):
+    """
+    Runs as many requests as the limit, each with the given latency,
+    over the given duration.
+    """
+    count = limiter.limit
+    for _ in range(count):
+        limiter.acquire()
+    clock.return_value += duration
+    for _ in range(count):
+        limiter.release(latency, size)
+
+
+@pytest.mark.parametrize('initial, expected', [(1, 2), (5, 5), (100, 8)])
+def test_initial_limit_is_within_range(initial, expected):
+    limiter = concurrency.AdaptiveConcurrencyLimiter(
+        initial,
+        floor=2,
+        ceiling=8
+    )
+
+    assert limiter.limit == expected
+
+
+def test_rejects_empty_range():
+    with pytest.raises(ValueError):
+        concurrency.AdaptiveConcurrencyLimiter(4, floor=5, ceiling=4)
+
+
+def test_increases_limit_after_each_window(clock):
+    limiter = concurrency.AdaptiveConcurrencyLimiter(2, ceiling=4)
+
+    run_window(limiter, clock, latency=0.1)
+    assert limiter.limit == 3
+    run_window(limiter, clock, latency=0.1, duration=1.5)
+    assert limiter.limit == 4
+    run_window(limiter, clock, latency=0.1, duration=2.0)
+    assert limiter.limit == 4
+
+    assert [change.limit for change in limiter.history] == [2, 3, 4]
+
+
+def test_lowers_limit_when_latency_rises_without_more_throughput(clock):
+    limiter = concurrency.AdaptiveConcurrencyLimiter(4)
+    run_window(limiter, clock, latency=0.1)
+    assert limiter.limit == 5
+
+    # Five requests take as long as four did, each waiting much longer.
+    run_window(limiter, clock, latency=0.5, duration=1.25)
+
+    assert limiter.limit == 4
+    assert limiter.history[-1].reason == concurrency.QUEUING
+
+
+def test_halves_limit_once_for_requests_already_running(clock):
+    limiter = concurrency.AdaptiveConcurrencyLimiter(16, floor=3)
+    for _ in range(6):
+        limiter.acquire()
+
+    limiter.throttled()
+    assert limiter.limit == 8
+    for _ in range(5):
+        limiter.release()
+        limiter.throttled()
+    assert limiter.limit == 8
+
+    limiter.release()
+    limiter.throttled()
+    assert limiter.limit == 4
+    limiter.throttled()
+    assert limiter.limit == 3
+
+    assert limiter.summary() == (
+        'Upload concurrency started at 16, ranged from 3 to 16 and ended '
+        'at 3; lowered 3 time(s) after throttling'
+    )
+
+
+def test_failed_requests_are_not_measured(clock):
+    limiter = concurrency.AdaptiveConcurrencyLimiter(2)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+
+    assert limiter.limit == 2
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = concurrency.AdaptiveConcurrencyLimiter(1, ceiling=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+
+    limiter.release(0.1)
+    thread.join(timeout=5)
+    assert acquired.is_set()
+
+
+def test_records_changes_as_trace_counters(clock):
+    tracer = tracing.start()
+    try:
+        limiter = concurrency.AdaptiveConcurrencyLimiter(2)
+        run_window(limiter, clock, latency=0.1)
+    finally:
+        tracing.stop()
+
+    assert [values for _, _, values in tracer.counters] == [
+        {'limit': 2},
+        {'limit': 3},
+    ]
@@ -1,20 +1,22 @@
+from datetime import datetime, timedelta, timezone
+
 import pytest
 
-from src import create
+from src import create, upload
 
 
-# Return value of boto3.client('route53').list_hosted_zones().
+# Return value of boto3.client('route53').list_hosted_zones_by_name().
 hosted_zones = {
     'HostedZones': [{
-        'Name': 'example.com',
+        'Name': 'example.com.',
         'Id': '/hostedzone/1234',
+        'Config': {'PrivateZone': False},
     }, {
-        'Name': 'notreal.dev',
+        'Name': 'notreal.dev.',
         'Id': '/hostedzone/5678',
-    }, {
-        'Name': 'otherwebsite.net',
-        'Id': '/hostedzone/9022',
-    }]
+        'Config': {'PrivateZone': False},
+    }],
+    'IsTruncated': False,
 }
 
 
@@ -49,20 +51,46 @@ class MockArguments:
     SOURCE_FILES_DIRECTORY = 'source_dir'
     _404_FILE = None
     _500_FILE = None
+    UPLOAD_CONCURRENCY = 4
+    ADAPTIVE_CONCURRENCY = True
+    MIN_UPLOAD_CONCURRENCY = 2
+    MAX_UPLOAD_CONCURRENCY = 8
+    SYNC_FILES = False
+    DELETE_REMOVED_FILES = False
+    STATE_DIRECTORY = '.static-site-deploy'
+    PRECOMPRESS_FILES = False
+    CACHE_CONTROL_RULES = []
+    FINGERPRINT_ASSETS = False
+    FINGERPRINT_EXCLUDE = []
+    INVALIDATE_CHANGED_FILES = True
+    INVALIDATION_WILDCARD_THRESHOLD = 20
+    WAIT_FOR_INVALIDATION = True
+    rebuild_manifest = False
+    no_cache = False
+    STACK_NAME = None
+    IGNORE_PATTERNS = []
+    FOLLOW_SYMLINKS = False
 
 
 @pytest.fixture(autouse=True)
 def mock_boto3_client(mocker):
-    mock_boto3_client = mocker.patch('src.create.boto3.client')
+    mock_boto3_client = mocker.patch('src.create.clients.get_client')
     mock_acm = mocker.Mock()
     mock_acm.request_certificate.return_value = {
         'CertificateArn': 'arn:aws:acm:us-east-1:1234:certificate/5678'
     }
     mock_acm.describe_certificate.return_value = certificate_details
+    mock_acm.get_paginator.return_value.paginate.return_value = [
+        {'CertificateSummaryList': []}
+    ]
     mock_route53 = mocker.Mock()
-    mock_route53.list_hosted_zones.return_value = hosted_zones
+    mock_route53.list_hosted_zones_by_name.return_value = hosted_zones
     mock_s3 = mocker.Mock()
-    mock_boto3_client.side_effect = lambda service: {
+    mocker.patch(
+        'src.create.clients.get_account_id',
+        return_value='111111111111'
+    )
+    mock_boto3_client.side_effect = lambda service, **kwargs: {
         'acm': mock_acm,
         'route53': mock_route53,
         's3': mock_s3
@@ -76,16 +104,21 @@ def mock_boto3_client(mocker):
 
 
 @pytest.fixture(autouse=True)
-def mock_instance(mocker):
+def mock_instance(mocker, tmp_path, monkeypatch):
+    # The state directory is relative to the working directory.
+    monkeypatch.chdir(tmp_path)
     instance = create.CloudFrontDistributionStackCreator(MockArguments)
-    mock_create_stack = mocker.patch.object(instance, 'create_stack')
+    mock_deploy_stack = mocker.patch.object(instance, 'deploy_stack')
     mock_s3_bucket_name = mocker.patch.object(instance, 'get_s3_bucket_name')
     mock_s3_bucket_name.return_value = 'StaticSiteS3Bucket'
     mock_upload_files = mocker.patch.object(instance, '_upload_files')
+    mock_upload_files.return_value = ['index.html']
+    mock_invalidate_cache = mocker.patch.object(instance, '_invalidate_cache')
     return {
         'instance': instance,
-        'create_stack': mock_create_stack,
-        'upload_files': mock_upload_files
+        'deploy_stack': mock_deploy_stack,
+        'upload_files': mock_upload_files,
+        'invalidate_cache': mock_invalidate_cache
     }
 
 
@@ -112,20 +145,22 @@ def test_deploy_static_site_method_creates_CloudFormationTemplate_object(
         _404_page='404.html',
         _500_page='500.html',
         hosted_zone='1234',
-        certificate_arn='arn:aws:acm:us-east-1:1234:certificate/5678'
+        certificate_arn='arn:aws:acm:us-east-1:1234:certificate/5678',
+        precompressed_variants=None,
+        compressible_extensions=('.html', '.css', '.js', '.svg', '.json')
     )
 
 
-def test_deploy_static_site_method_calls_create_stack_method(
+def test_deploy_static_site_method_calls_deploy_stack_method(
     mock_boto3_client,
     mock_instance
 ):
-    assert mock_instance['create_stack'].call_count == 0
+    assert mock_instance['deploy_stack'].call_count == 0
 
     mock_instance['instance'].deploy_static_site()
 
-    assert mock_instance['create_stack'].call_count == 1
-    mock_instance['create_stack'].assert_called_once_with(
+    assert mock_instance['deploy_stack'].call_count == 1
+    mock_instance['deploy_stack'].assert_called_once_with(
         template=mock_instance['instance'].template,
         stack_name='static-website'
     )
@@ -143,3 +178,120 @@ def test_deploy_static_site_method_calls_upload_file_method(
     mock_instance['upload_files'].assert_called_once_with(
         s3_bucket_name='StaticSiteS3Bucket'
     )
+
+
+def test_deploy_static_site_method_invalidates_changed_files(
+    mock_boto3_client,
+    mock_instance
+):
+    mock_instance['instance'].deploy_static_site()
+
+    mock_instance['invalidate_cache'].assert_called_once_with(
+        changed_keys=['index.html']
+    )
+
+
+def test_deploy_static_site_method_skips_invalidation_without_sync(
+    mock_boto3_client,
+    mock_instance,
+    capsys
+):
+    mock_instance['instance'].invalidate_changed_files = None
+
+    mock_instance['instance'].deploy_static_site()
+
+    mock_instance['invalidate_cache'].assert_not_called()
+    assert 'SYNC_FILES is off' in capsys.readouterr().out
+
+
+def test_deploy_static_site_method_invalidates_by_default_in_sync_mode(
+    mock_boto3_client,
+    mock_instance,
+    mocker
+):
+    mocker.patch.object(mock_instance['instance'], '_prepare_files')
+    mock_instance['instance'].invalidate_changed_files = None
+    mock_instance['instance'].sync_files = True
+
+    mock_instance['instance'].deploy_static_site()
+
+    mock_instance['invalidate_cache'].assert_called_once_with(
+        changed_keys=['index.html']
+    )
+
+
+def test_deploy_static_site_method_reuses_issued_certificate(
+    mock_boto3_client,
+    mock_instance,
+    mocker
+):
+    mock_acm = mock_boto3_client['acm']
+    mock_acm.get_paginator.return_value.paginate.return_value = [{
+        'CertificateSummaryList': [{
+            'CertificateArn': 'arn:aws:acm:us-east-1:1234:certificate/9999',
+            'DomainName': 'example.com',
+            'SubjectAlternativeNameSummaries': [
+                'example.com',
+                '*.example.com',
+            ],
+            'NotAfter': datetime.now(timezone.utc) + timedelta(days=300),
+        }],
+    }]
+    mock_class = mocker.patch('definitions.CloudFormationTemplate')
+
+    mock_instance['instance'].deploy_static_site()
+
+    mock_acm.request_certificate.assert_not_called()
+    mock_acm.describe_certificate.assert_not_called()
+    mock_route53 = mock_boto3_client['route53']
+    mock_route53.change_resource_record_sets.assert_not_called()
+    assert mock_class.call_args.kwargs['certificate_arn'] == (
+        'arn:aws:acm:us-east-1:1234:certificate/9999'
+    )
+
+
+@pytest.fixture
+def sync_upload(mocker):
+    instance = create.CloudFrontDistributionStackCreator(MockArguments)
+    instance.sync_files = True
+    instance.upload_directory = 'source_dir'
+    instance.file_manifest = mocker.Mock()
+    mocker.patch.object(instance, '_list_upload_jobs', return_value=[
+        mocker.Mock(key='index.html'),
+        mocker.Mock(key='style.css'),
+    ])
+    mocker.patch('src.create.sync.BucketSynchronizer.list_remote_objects')
+    mocker.patch('src.create.multipart.UploadJournal')
+    mocker.patch('src.create.progress.UploadProgress')
+    uploader = mocker.patch('src.create.upload.S3Uploader').return_value
+    uploader.abort_orphaned_uploads.return_value = 0
+    return instance, uploader
+
+
+def test_failed_upload_keeps_manifest_entries_of_unseen_files(sync_upload):
+    instance, uploader = sync_upload
+
+    def upload_one(jobs, should_upload):
+        next(jobs)
+        raise RuntimeError('upload failed')
+
+    uploader.upload.side_effect = upload_one
+
+    with pytest.raises(RuntimeError):
+        instance._upload_files('bucket')
+    instance.file_manifest.save.assert_called_once_with(keep_keys=None)
+
+
+def test_upload_prunes_manifest_entries_of_removed_files(sync_upload):
+    instance, uploader = sync_upload
+
+    def upload_all(jobs, should_upload):
+        list(jobs)
+        return upload.UploadResult(['index.html'], ['style.css'], [])
+
+    uploader.upload.side_effect = upload_all
+
+    instance._upload_files('bucket')
+    instance.file_manifest.save.assert_called_once_with(
+        keep_keys={'index.html', 'style.css'}
+    )
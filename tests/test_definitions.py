@@ -1,6 +1,9 @@
+import re
+
 from troposphere import Template
 
 import definitions
+from src import utils
 
 
 def test_generates_proper_template():
@@ -14,15 +17,77 @@ def test_generates_proper_template():
         hosted_zone='1234',
         certificate_arn='arn:aws:acm:us-east-1:1234:certificate/5678'
     )
-    actual_content = template.to_yaml().splitlines(keepends=True)
-    # Must delete line that contains random string.
-    del actual_content[24]
-    actual_content = ''.join(actual_content)
+    actual_content = template.to_yaml()
 
     with open('tests/expected_cloudfront_template.yml', 'r') as output_file:
-        expected_content = output_file.readlines()
-        # Must delete line that contains random string.
-        del expected_content[24]
-        expected_content = ''.join(expected_content)
+        expected_content = output_file.read()
 
     assert actual_content == expected_content
+
+
+def synthesize(domain_name):
+    template = Template()
+    cloudformation_template = definitions.CloudFormationTemplate(
+        domain_name=domain_name,
+        template=template,
+        homepage='index.html',
+        _404_page='404.html',
+        _500_page='500.html',
+        hosted_zone='1234',
+        certificate_arn='arn:aws:acm:us-east-1:1234:certificate/5678'
+    )
+    return cloudformation_template
+
+
+def test_synthesis_is_deterministic():
+    first = synthesize('example.com')
+    second = synthesize('example.com')
+
+    # The fingerprint a stack is deployed with only changes when the
+    # inputs do.
+    assert first.template.to_yaml() == second.template.to_yaml()
+    assert utils.template_fingerprint(first.template.to_yaml()) != (
+        utils.template_fingerprint(
+            synthesize('example.org').template.to_yaml()
+        )
+    )
+
+
+def test_precompressed_variants_are_selected_by_cloudfront_function():
+    template = Template()
+    definitions.CloudFormationTemplate(
+        domain_name='example.com',
+        template=template,
+        homepage='index.html',
+        _404_page='404.html',
+        _500_page='500.html',
+        hosted_zone='1234',
+        certificate_arn='arn:aws:acm:us-east-1:1234:certificate/5678',
+        precompressed_variants=[('br', '.br'), ('gzip', '.gz')],
+        compressible_extensions=('.html', '.css')
+    )
+    resources = template.to_dict()['Resources']
+    function = resources['CloudFrontEncodingSelectorFunction']
+    function_code = function['Properties']['FunctionCode']
+    distribution_config = (
+        resources['StaticSiteCloudFrontDistribution']['Properties']
+        ['DistributionConfig']
+    )
+
+    assert "var VARIANTS = [['br', '.br'], ['gzip', '.gz']];" in function_code
+    assert 'var COMPRESSIBLE = /\\.(html|css)$/i;' in function_code
+    assert distribution_config['DefaultCacheBehavior'][
+        'FunctionAssociations'
+    ][0]['EventType'] == 'viewer-request'
+
+
+def test_encoding_selector_name_fits_cloudfront_limit():
+    short = synthesize('example.com')
+    long = synthesize(f'{"a" * 60}.example.com')
+
+    assert short.encoding_selector_name.startswith('example-com-')
+    assert len(long.encoding_selector_name) == 64
+    assert re.fullmatch(r'[a-zA-Z0-9_-]+', long.encoding_selector_name)
+    assert long.encoding_selector_name != synthesize(
+        f'{"a" * 60}.example.org'
+    ).encoding_selector_name
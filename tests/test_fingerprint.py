@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from src import fingerprint
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'css').mkdir(parents=True)
+    (source / 'images').mkdir()
+    (source / 'blog').mkdir()
+    (source / 'images' / 'logo.png').write_bytes(b'logo')
+    (source / 'css' / 'base.css').write_text(
+        'body { background: url("../images/logo.png"); }'
+    )
+    (source / 'css' / 'site.css').write_text('@import "base.css";')
+    (source / 'app.js').write_text('console.log("hi");')
+    (source / 'worker.js').write_text('onmessage = () => {};')
+    (source / 'favicon.ico').write_bytes(b'icon')
+    (source / 'robots.txt').write_text('User-agent: *')
+    (source / 'index.html').write_text(
+        '<link href="/css/site.css" rel="stylesheet">'
+        '<script src="app.js?v=1"></script>'
+        '<img srcset="images/logo.png 1x, images/logo.png 2x">'
+        '<a href="https://example.com/app.js">external</a>'
+    )
+    (source / 'blog' / 'post.html').write_text(
+        '<img src="../images/logo.png">'
+    )
+    return source
+
+
+@pytest.fixture
+def build(tmp_path, source_dir):
+    fingerprinter = fingerprint.AssetFingerprinter(
+        str(source_dir),
+        str(tmp_path / 'build'),
+        exclude_patterns=['favicon.ico'],
+        max_workers=2
+    )
+    mapping = fingerprinter.build(str(tmp_path / 'asset-manifest.json'))
+    return (tmp_path / 'build', mapping)
+
+
+def test_fingerprints_assets_but_not_html_or_excluded_files(build):
+    build_dir, mapping = build
+
+    assert set(mapping) == {
+        'app.js', 'css/base.css', 'css/site.css', 'images/logo.png'
+    }
+    for new_path in mapping.values():
+        assert (build_dir / new_path).exists()
+    assert (build_dir / 'index.html').exists()
+    # Scripts that no HTML file loads are left alone.
+    assert (build_dir / 'worker.js').exists()
+    assert 'worker.js' not in mapping
+    assert (build_dir / 'favicon.ico').exists()
+    assert (build_dir / 'robots.txt').exists()
+
+
+def test_keeps_assets_under_original_names(source_dir, build):
+    build_dir, _ = build
+
+    # References that are not rewritten, such as meta tags, still work.
+    assert (build_dir / 'images' / 'logo.png').read_bytes() == b'logo'
+    assert (build_dir / 'css' / 'base.css').read_text() == (
+        source_dir / 'css' / 'base.css'
+    ).read_text()
+
+
+def test_rewrites_references_in_html(build):
+    build_dir, mapping = build
+    index = (build_dir / 'index.html').read_text()
+    post = (build_dir / 'blog' / 'post.html').read_text()
+    logo = mapping['images/logo.png'].split('/')[-1]
+
+    assert f'href="/{mapping["css/site.css"]}"' in index
+    assert f'src="{mapping["app.js"]}?v=1"' in index
+    assert f'srcset="images/{logo} 1x, images/{logo} 2x"' in index
+    assert 'href="https://example.com/app.js"' in index
+    assert f'src="../images/{logo}"' in post
+
+
+def test_rewrites_references_in_stylesheets_in_dependency_order(build):
+    build_dir, mapping = build
+    base = (build_dir / mapping['css/base.css']).read_text()
+    site = (build_dir / mapping['css/site.css']).read_text()
+
+    assert f'url("../{mapping["images/logo.png"]}")' in base
+    assert site == f'@import "{mapping["css/base.css"].split("/")[-1]}";'
+
+
+def test_writes_manifest_of_mapping(tmp_path, build):
+    _, mapping = build
+
+    with open(tmp_path / 'asset-manifest.json') as manifest_file:
+        assert json.load(manifest_file) == mapping
+
+
+def test_rebuild_removes_stale_assets(tmp_path, source_dir, build):
+    build_dir, mapping = build
+    old_path = mapping['images/logo.png']
+    (source_dir / 'images' / 'logo.png').write_bytes(b'new logo')
+
+    fingerprinter = fingerprint.AssetFingerprinter(
+        str(source_dir),
+        str(build_dir),
+        max_workers=2
+    )
+    new_mapping = fingerprinter.build(str(tmp_path / 'asset-manifest.json'))
+
+    new_path = new_mapping['images/logo.png']
+    assert new_path != old_path
+    assert not (build_dir / old_path).exists()
+    assert (build_dir / 'images' / 'logo.png').read_bytes() == b'new logo'
+    assert new_path.split('/')[-1] in (build_dir / 'index.html').read_text()
+
+
+def test_reuses_cached_digests_of_unchanged_assets(mocker, tmp_path,
+                                                   source_dir):
+    # Files modified within the last few seconds are not cached.
+    for filepath in source_dir.rglob('*'):
+        os.utime(filepath, ns=(0, 0))
+    logo = source_dir / 'images' / 'logo.png'
+    build_dir = tmp_path / 'build'
+    cache_filepath = str(tmp_path / 'asset-digests.json')
+    manifest_filepath = str(tmp_path / 'asset-manifest.json')
+
+    def build():
+        return fingerprint.AssetFingerprinter(
+            str(source_dir),
+            str(build_dir),
+            max_workers=2,
+            cache_filepath=cache_filepath
+        ).build(manifest_filepath)
+
+    mapping = build()
+    spy = mocker.spy(fingerprint, 'file_digest')
+
+    assert build() == mapping
+    assert spy.call_count == 0
+
+    logo.write_bytes(b'new logo')
+    os.utime(logo, ns=(0, 0))
+
+    assert build()['images/logo.png'] != mapping['images/logo.png']
+    assert spy.call_count == 1
+
+
+def test_hashes_assets_in_blocks(mocker, tmp_path):
+    mocker.patch('src.sync.READ_BLOCK_SIZE', 3)
+    filepath = tmp_path / 'video.mp4'
+    filepath.write_bytes(b'0123456789')
+
+    assert fingerprint.file_digest(str(filepath)) == (
+        hashlib.sha256(b'0123456789').hexdigest()
+    )
@@ -0,0 +1,91 @@
+from src import hosted_zones
+
+
+def make_zone(name, zone_id, private=False):
+    return {
+        'Name': name,
+        'Id': f'/hostedzone/{zone_id}',
+        'Config': {'PrivateZone': private},
+    }
+
+
+def test_candidate_names_exclude_top_level_domain():
+    assert hosted_zones.candidate_names('Blog.Example.com') == [
+        'blog.example.com.',
+        'example.com.',
+    ]
+
+
+def test_resolves_domain_with_one_request(mocker):
+    client = mocker.Mock()
+    client.list_hosted_zones_by_name.return_value = {
+        'HostedZones': [
+            make_zone('example.com.', 'PRIVATE', private=True),
+            make_zone('example.com.', 'PUBLIC'),
+            make_zone('www.example.com.', 'OTHER'),
+        ],
+        'IsTruncated': True,
+        'NextDNSName': 'z.example.com.',
+        'NextHostedZoneId': 'NEXT',
+    }
+    resolver = hosted_zones.HostedZoneResolver(client)
+
+    assert resolver.resolve('example.com') == 'PUBLIC'
+    client.list_hosted_zones_by_name.assert_called_once_with(
+        DNSName='example.com.',
+        MaxItems='10'
+    )
+
+
+def test_falls_back_to_parent_zone(mocker):
+    client = mocker.Mock()
+    client.list_hosted_zones_by_name.side_effect = [
+        {
+            'HostedZones': [make_zone('other.com.', 'OTHER')],
+            'IsTruncated': False,
+        },
+        {
+            'HostedZones': [make_zone('example.com.', 'PARENT')],
+            'IsTruncated': False,
+        },
+    ]
+    resolver = hosted_zones.HostedZoneResolver(client)
+
+    assert resolver.resolve('blog.example.com') == 'PARENT'
+    # The result is remembered.
+    assert resolver.resolve('blog.example.com') == 'PARENT'
+    assert client.list_hosted_zones_by_name.call_count == 2
+
+
+def test_ignores_private_zones(mocker):
+    client = mocker.Mock()
+    client.list_hosted_zones_by_name.return_value = {
+        'HostedZones': [make_zone('example.com.', 'PRIVATE', private=True)],
+        'IsTruncated': False,
+    }
+    resolver = hosted_zones.HostedZoneResolver(client)
+
+    assert resolver.resolve('example.com') is None
+
+
+def test_index_resolves_several_domains(mocker):
+    client = mocker.Mock()
+    client.list_hosted_zones_by_name.side_effect = [
+        {
+            'HostedZones': [make_zone('example.com.', 'ONE')],
+            'IsTruncated': True,
+            'NextDNSName': 'example.org.',
+            'NextHostedZoneId': 'TWO',
+        },
+        {
+            'HostedZones': [make_zone('example.org.', 'TWO')],
+            'IsTruncated': False,
+        },
+    ]
+    resolver = hosted_zones.HostedZoneResolver(client)
+    resolver.load_all()
+
+    assert resolver.resolve('www.example.com') == 'ONE'
+    assert resolver.resolve('example.org') == 'TWO'
+    assert resolver.resolve('example.net') is None
+    assert client.list_hosted_zones_by_name.call_count == 2
@@ -0,0 +1,91 @@
+import pytest
+
+from src import invalidation
+
+
+def test_lists_each_changed_file():
+    assert invalidation.plan_invalidation_paths(
+        ['about.html', 'css/site.css']
+    ) == ['/about.html', '/css/site.css']
+
+
+def test_invalidates_root_when_homepage_changes():
+    assert invalidation.plan_invalidation_paths(
+        ['index.html'],
+        homepage='index.html'
+    ) == ['/', '/index.html']
+
+
+def test_uses_wildcard_for_crowded_directory():
+    changed_keys = [f'blog/post-{i}.html' for i in range(6)] + ['about.html']
+
+    assert invalidation.plan_invalidation_paths(
+        changed_keys,
+        wildcard_threshold=5
+    ) == ['/about.html', '/blog/*']
+
+
+def test_escapes_special_characters():
+    assert invalidation.plan_invalidation_paths(['my file*.html']) == [
+        '/my%20file%2A.html'
+    ]
+
+
+def test_stays_within_path_limit():
+    changed_keys = [f'dir-{i}/file-{j}.html' for i in range(400)
+                    for j in range(10)]
+    paths = invalidation.plan_invalidation_paths(
+        changed_keys,
+        wildcard_threshold=100
+    )
+
+    assert len(paths) <= invalidation.MAX_PATHS
+    assert sum(path.endswith('*') for path in paths) <= (
+        invalidation.MAX_WILDCARD_PATHS
+    )
+    # Every changed key must still be covered.
+    for key in changed_keys:
+        assert any(
+            '/' + key == path
+            or (path.endswith('*') and ('/' + key).startswith(path[:-1]))
+            for path in paths
+        )
+
+
+def test_collapses_to_site_wildcard_when_nothing_smaller_fits():
+    changed_keys = [f'dir-{i}/index.html' for i in range(20)]
+    changed_keys += [f'dir-{i}/other.html' for i in range(20)]
+
+    assert invalidation.plan_invalidation_paths(
+        changed_keys,
+        wildcard_threshold=1
+    ) == ['/*']
+
+
+def test_waits_for_invalidation_to_complete(mocker):
+    mocker.patch('src.polling.time.sleep')
+    client = mocker.Mock()
+    client.create_invalidation.return_value = {'Invalidation': {'Id': 'I1'}}
+    client.get_invalidation.side_effect = [
+        {'Invalidation': {'Status': 'InProgress'}},
+        {'Invalidation': {'Status': 'Completed'}},
+    ]
+    invalidator = invalidation.CloudFrontInvalidator(client, 'E123')
+
+    assert invalidator.invalidate(['/index.html']) == 'I1'
+    assert client.get_invalidation.call_count == 2
+    batch = client.create_invalidation.call_args.kwargs['InvalidationBatch']
+    assert batch['Paths'] == {'Quantity': 1, 'Items': ['/index.html']}
+
+
+def test_exits_when_invalidation_times_out(mocker):
+    mocker.patch('src.polling.time.sleep')
+    client = mocker.Mock()
+    client.create_invalidation.return_value = {'Invalidation': {'Id': 'I1'}}
+    client.get_invalidation.return_value = {
+        'Invalidation': {'Status': 'InProgress'}
+    }
+    invalidator = invalidation.CloudFrontInvalidator(client, 'E123')
+
+    with pytest.raises(SystemExit):
+        invalidator.invalidate(['/index.html'], timeout=0)
@@ -0,0 +1,118 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks import fake_s3
+from src import listing
+
+
+SINGLE_PART_ETAG = '0123456789abcdef0123456789abcdef'
+MULTIPART_ETAG = 'fedcba9876543210fedcba9876543210-3'
+
+
+def test_index_returns_remote_objects():
+    modified = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    index = listing.ObjectIndex()
+    index.add('index.html', 13, f'"{SINGLE_PART_ETAG}"', modified)
+    index.add('video.mp4', 30000000, MULTIPART_ETAG)
+
+    assert index['index.html'] == listing.RemoteObject(
+        13,
+        SINGLE_PART_ETAG,
+        modified
+    )
+    assert index.get('video.mp4') == listing.RemoteObject(
+        30000000,
+        MULTIPART_ETAG,
+        None
+    )
+    assert index.get('missing.html') is None
+    with pytest.raises(KeyError):
+        index['missing.html']
+
+
+@pytest.mark.parametrize('etag', [
+    'not-an-md5',
+    'ABCDEF',
+    'x123456789abcdef0123456789abcdef',
+    f'{SINGLE_PART_ETAG}-parts',
+])
+def test_index_keeps_irregular_etags(etag):
+    index = listing.ObjectIndex()
+    index.add('file', 1, etag)
+
+    assert index['file'].etag == etag
+
+
+def test_index_replaces_existing_entries():
+    index = listing.ObjectIndex()
+    index.add('file', 1, 'irregular')
+    index.add('other', 2, SINGLE_PART_ETAG)
+    index.add('file', 3, MULTIPART_ETAG)
+
+    assert len(index) == 2
+    assert set(index) == {'file', 'other'}
+    assert 'file' in index
+    assert index['file'] == listing.RemoteObject(3, MULTIPART_ETAG)
+    assert index['other'] == listing.RemoteObject(2, SINGLE_PART_ETAG)
+
+
+def test_lists_shards_found_at_each_delimiter(mocker):
+    pages = {
+        ('', '/'): [{
+            'Contents': [{'Key': 'index.html', 'Size': 1, 'ETag': 'a'}],
+            'CommonPrefixes': [{'Prefix': 'blog/'}, {'Prefix': 'img/'}],
+        }],
+        ('blog/', '/'): [{
+            'Contents': [{'Key': 'blog/index.html', 'Size': 2, 'ETag': 'b'}],
+            'CommonPrefixes': [{'Prefix': 'blog/2024/'}],
+        }],
+        ('img/', '/'): [{
+            'Contents': [{'Key': 'img/logo.png', 'Size': 3, 'ETag': 'c'}],
+        }],
+        ('blog/2024/', None): [{
+            'Contents': [{'Key': 'blog/2024/a.html', 'Size': 4, 'ETag': 'd'}],
+        }, {
+            'Contents': [{'Key': 'blog/2024/b.html', 'Size': 5, 'ETag': 'e'}],
+        }],
+    }
+    client = mocker.Mock()
+    client.get_paginator.return_value.paginate.side_effect = (
+        lambda Bucket, Prefix, Delimiter=None: pages[(Prefix, Delimiter)]
+    )
+    mocker.patch('src.listing.MAX_DISCOVERY_DEPTH', 2)
+    lister = listing.BucketLister(client, 'bucket', max_workers=4)
+
+    index = lister.list()
+
+    assert {key: index[key].size for key in index} == {
+        'index.html': 1,
+        'blog/index.html': 2,
+        'img/logo.png': 3,
+        'blog/2024/a.html': 4,
+        'blog/2024/b.html': 5,
+    }
+
+
+@pytest.mark.parametrize('max_workers', [1, 3, 16])
+def test_lists_every_object_in_bucket(max_workers):
+    s3 = fake_s3.FakeS3()
+    expected = {}
+    for index in range(1200):
+        expected[f'assets/{index % 3}/{index}.js'] = (index, SINGLE_PART_ETAG)
+    for index in range(5):
+        expected[f'page-{index}.html'] = (index, MULTIPART_ETAG)
+    expected['docs/guide/intro/index.html'] = (7, SINGLE_PART_ETAG)
+    s3.objects.update(expected)
+    lister = listing.BucketLister(
+        s3.client(),
+        'bucket',
+        max_workers=max_workers
+    )
+
+    index = lister.list()
+
+    assert len(index) == len(expected)
+    assert {
+        key: (index[key].size, index[key].etag) for key in index
+    } == expected
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+
+import pytest
+
+from src import manifest, sync
+
+
+@pytest.fixture
+def old_file(tmp_path):
+    filepath = tmp_path / 'index.html'
+    filepath.write_bytes(b'<html></html>')
+    # Files modified in the last few seconds are never cached.
+    os.utime(filepath, (1_000_000_000, 1_000_000_000))
+    return filepath
+
+
+@pytest.fixture
+def spy_compute_etag(mocker):
+    return mocker.spy(sync, 'compute_etag')
+
+
+def test_reuses_etag_of_unchanged_file(tmp_path, old_file, spy_compute_etag):
+    database = tmp_path / 'state' / 'manifest.sqlite3'
+    first_manifest = manifest.FileManifest(str(database))
+    etag = first_manifest.get_etag(
+        'index.html', old_file, os.stat(old_file)
+    )
+    first_manifest.save()
+
+    second_manifest = manifest.FileManifest(str(database))
+
+    assert second_manifest.get_etag(
+        'index.html', old_file, os.stat(old_file)
+    ) == etag
+    assert spy_compute_etag.call_count == 1
+
+
+def test_rehashes_file_whose_stat_data_changed(
+    tmp_path,
+    old_file,
+    spy_compute_etag
+):
+    database = tmp_path / 'manifest.sqlite3'
+    file_manifest = manifest.FileManifest(str(database))
+    file_manifest.get_etag('index.html', old_file, os.stat(old_file))
+    old_file.write_bytes(b'<html>changed</html>')
+    os.utime(old_file, (1_000_000_100, 1_000_000_100))
+    file_manifest.get_etag('index.html', old_file, os.stat(old_file))
+
+    assert spy_compute_etag.call_count == 2
+
+
+def test_rebuild_discards_cached_entries(
+    tmp_path,
+    old_file,
+    spy_compute_etag
+):
+    database = tmp_path / 'manifest.sqlite3'
+    file_manifest = manifest.FileManifest(str(database))
+    file_manifest.get_etag('index.html', old_file, os.stat(old_file))
+    file_manifest.save()
+
+    rebuilt_manifest = manifest.FileManifest(str(database), rebuild=True)
+    rebuilt_manifest.get_etag('index.html', old_file, os.stat(old_file))
+
+    assert spy_compute_etag.call_count == 2
+
+
+def test_corrupt_database_is_discarded(tmp_path, old_file):
+    database = tmp_path / 'manifest.sqlite3'
+    database.write_bytes(b'this is not an SQLite database' * 100)
+    file_manifest = manifest.FileManifest(str(database))
+    file_manifest.get_etag('index.html', old_file, os.stat(old_file))
+    file_manifest.save()
+
+    connection = sqlite3.connect(database)
+    rows = connection.execute('SELECT key FROM files').fetchall()
+    connection.close()
+    assert rows == [('index.html',)]
+
+
+def test_save_removes_keys_that_are_not_kept(tmp_path, old_file):
+    database = tmp_path / 'manifest.sqlite3'
+    file_manifest = manifest.FileManifest(str(database))
+    file_manifest.get_etag('index.html', old_file, os.stat(old_file))
+    file_manifest.get_etag('other.html', old_file, os.stat(old_file))
+    file_manifest.save(keep_keys={'index.html'})
+
+    connection = sqlite3.connect(database)
+    rows = connection.execute('SELECT key FROM files').fetchall()
+    connection.close()
+    assert rows == [('index.html',)]
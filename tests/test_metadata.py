@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+from src import metadata
+
+
+rules = metadata.MetadataRules([
+    ('assets/**', {'CacheControl': 'public, max-age=31536000, immutable'}),
+    ('*.html', {'CacheControl': 'no-cache'}),
+    ('downloads/*.pdf', {
+        'CacheControl': 'max-age=3600',
+        'ContentDisposition': 'attachment',
+    }),
+])
+
+
+def test_double_star_matches_nested_directories():
+    assert rules.metadata_for('assets/js/vendor/app.js') == {
+        'CacheControl': 'public, max-age=31536000, immutable'
+    }
+
+
+def test_pattern_without_slash_matches_file_name_in_any_directory():
+    assert rules.metadata_for('index.html') == {'CacheControl': 'no-cache'}
+    assert rules.metadata_for('blog/post/index.html') == {
+        'CacheControl': 'no-cache'
+    }
+
+
+def test_single_star_does_not_match_across_directories():
+    assert rules.metadata_for('downloads/guide.pdf')['ContentDisposition'] \
+        == 'attachment'
+    assert rules.metadata_for('downloads/old/guide.pdf') == {}
+
+
+def test_first_matching_rule_is_used():
+    assert rules.metadata_for('assets/page.html') == {
+        'CacheControl': 'public, max-age=31536000, immutable'
+    }
+
+
+def test_integer_expires_is_seconds_from_now():
+    expiring_rules = metadata.MetadataRules([('*', {'Expires': 60})])
+    expires = expiring_rules.metadata_for('index.html')['Expires']
+
+    delta = expires - datetime.now(timezone.utc)
+    assert 55 < delta.total_seconds() <= 60
@@ -0,0 +1,219 @@
+from datetime import timedelta
+import hashlib
+import io
+import os
+
+import pytest
+
+from benchmarks import fake_s3
+from src import concurrency, multipart, progress, upload
+
+
+PART_SIZE = 1000
+
+
+@pytest.fixture
+def s3():
+    return fake_s3.FakeS3()
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return multipart.UploadJournal(str(tmp_path / 'state' / 'uploads.db'))
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    filepath = tmp_path / 'video.mp4'
+    filepath.write_bytes(os.urandom(3500))
+    return filepath
+
+
+def make_uploader(s3, journal):
+    return multipart.MultipartUploader(
+        s3.client(),
+        'bucket',
+        journal,
+        part_size=PART_SIZE
+    )
+
+
+def make_job(filepath):
+    return upload.UploadJob(str(filepath), 'video.mp4', {
+        'ContentType': 'video/mp4',
+    })
+
+
+def expected_etag(content):
+    digests = b''.join(
+        hashlib.md5(content[start:start + PART_SIZE]).digest()
+        for start in range(0, len(content), PART_SIZE)
+    )
+    part_count = -(-len(content) // PART_SIZE)
+    return f'{hashlib.md5(digests).hexdigest()}-{part_count}'
+
+
+def interrupt_at_part(mocker, uploader, failing_part):
+    upload_part = uploader._upload_part
+
+    def fail(job, upload_id, part_number, callback):
+        if part_number == failing_part:
+            raise ConnectionError('connection lost')
+        return upload_part(job, upload_id, part_number, callback)
+
+    mocker.patch.object(uploader, '_upload_part', side_effect=fail)
+
+
+def test_uploads_file_in_parts(s3, journal, large_file):
+    sent = []
+    uploader = make_uploader(s3, journal)
+
+    uploader.upload(make_job(large_file), 3500, callback=sent.append)
+
+    content = large_file.read_bytes()
+    assert s3.objects['video.mp4'] == (3500, expected_etag(content))
+    assert sorted(sent) == [500, 1000, 1000, 1000]
+    assert journal.get('bucket', 'video.mp4') is None
+
+
+def test_resumes_interrupted_upload(mocker, s3, journal, large_file):
+    first_attempt = make_uploader(s3, journal)
+    interrupt_at_part(mocker, first_attempt, 3)
+    with pytest.raises(ConnectionError):
+        first_attempt.upload(make_job(large_file), 3500)
+    first_attempt.close()
+    entry = journal.get('bucket', 'video.mp4')
+    assert 3 not in entry.parts
+
+    second_attempt = make_uploader(s3, journal)
+    spy = mocker.spy(second_attempt.client, 'upload_part')
+    second_attempt.upload(make_job(large_file), 3500)
+
+    sent_parts = {call.kwargs['PartNumber'] for call in spy.call_args_list}
+    assert sent_parts == {1, 2, 3, 4} - set(entry.parts)
+    assert s3.objects['video.mp4'][1] == expected_etag(
+        large_file.read_bytes()
+    )
+    assert journal.get('bucket', 'video.mp4') is None
+
+
+def test_starts_again_if_file_changed(mocker, s3, journal, large_file):
+    first_attempt = make_uploader(s3, journal)
+    interrupt_at_part(mocker, first_attempt, 4)
+    with pytest.raises(ConnectionError):
+        first_attempt.upload(make_job(large_file), 3500)
+    first_attempt.close()
+    large_file.write_bytes(os.urandom(2500))
+
+    make_uploader(s3, journal).upload(make_job(large_file), 2500)
+
+    assert s3.objects['video.mp4'][1] == expected_etag(
+        large_file.read_bytes()
+    )
+    # The earlier upload was aborted.
+    assert s3._uploads == {}
+
+
+def test_starts_again_if_upload_no_longer_exists(mocker, s3, journal,
+                                                 large_file):
+    first_attempt = make_uploader(s3, journal)
+    interrupt_at_part(mocker, first_attempt, 2)
+    with pytest.raises(ConnectionError):
+        first_attempt.upload(make_job(large_file), 3500)
+    first_attempt.close()
+    s3._uploads.clear()
+
+    make_uploader(s3, journal).upload(make_job(large_file), 3500)
+
+    assert s3.objects['video.mp4'][0] == 3500
+
+
+def test_aborts_orphaned_uploads(mocker, s3, journal, large_file):
+    client = s3.client()
+    for key in ('old.mp4', 'recent.mp4'):
+        client.create_multipart_upload(Bucket='bucket', Key=key)
+    for upload_state in s3._uploads.values():
+        if upload_state['key'] == 'old.mp4':
+            upload_state['initiated'] -= timedelta(days=2)
+    interrupted = make_uploader(s3, journal)
+    interrupt_at_part(mocker, interrupted, 1)
+    with pytest.raises(ConnectionError):
+        interrupted.upload(make_job(large_file), 3500)
+    interrupted.close()
+
+    aborted = make_uploader(s3, journal).abort_orphaned_uploads()
+
+    assert aborted == 2
+    assert [state['key'] for state in s3._uploads.values()] == ['recent.mp4']
+    assert journal.uploads('bucket') == {}
+
+
+def test_journal_records_uploads_and_parts(journal):
+    journal.start('bucket', 'a.mp4', 'upload-1', 3500, 123, PART_SIZE)
+    journal.record_part('upload-1', 2, '"etag-2"')
+    journal.record_part('upload-1', 1, '"etag-1"')
+    journal.start('other-bucket', 'a.mp4', 'upload-2', 10, 5, PART_SIZE)
+
+    assert journal.get('bucket', 'a.mp4') == multipart.JournalEntry(
+        'upload-1',
+        3500,
+        123,
+        PART_SIZE,
+        {1: '"etag-1"', 2: '"etag-2"'}
+    )
+    assert journal.uploads('bucket') == {'a.mp4': 'upload-1'}
+
+    journal.remove('bucket', 'a.mp4')
+
+    assert journal.get('bucket', 'a.mp4') is None
+    assert journal.uploads('other-bucket') == {'a.mp4': 'upload-2'}
+
+
+def test_discards_unreadable_journal(tmp_path, capsys):
+    filepath = tmp_path / 'uploads.db'
+    filepath.write_bytes(b'not a database' * 100)
+    journal = multipart.UploadJournal(str(filepath))
+
+    assert journal.get('bucket', 'a.mp4') is None
+    assert 'Discarding unreadable upload journal' in capsys.readouterr().out
+
+
+def test_throttled_parts_reach_limiter_and_progress(mocker, tmp_path, s3,
+                                                    large_file):
+    mocker.patch('src.upload.MULTIPART_THRESHOLD', PART_SIZE)
+    mocker.patch('src.upload.MULTIPART_CHUNKSIZE', PART_SIZE)
+    # Keep retries immediate.
+    mocker.patch('botocore.endpoint.time.sleep')
+    client = s3.client()
+    throttled_parts = []
+
+    def throttle_first_part(request, **kwargs):
+        if 'partNumber' in request.url and not throttled_parts:
+            throttled_parts.append(request.url)
+            return s3._response(
+                request,
+                '<Error><Code>SlowDown</Code></Error>',
+                status_code=503
+            )
+        return None
+
+    client.meta.events.register_first(
+        'before-send.s3',
+        throttle_first_part
+    )
+    limiter = concurrency.AdaptiveConcurrencyLimiter(8)
+    tracker = progress.UploadProgress(io.StringIO())
+    uploader = upload.S3Uploader(
+        'bucket',
+        client=client,
+        progress=tracker,
+        concurrency=limiter,
+        journal=multipart.UploadJournal(str(tmp_path / 'uploads.db'))
+    )
+
+    result = uploader.upload([make_job(large_file)])
+
+    assert result.uploaded == ['video.mp4']
+    assert len(throttled_parts) == 1
+    assert limiter.history[-1].reason == concurrency.THROTTLED
+    assert tracker.retries == 1
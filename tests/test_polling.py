@@ -0,0 +1,78 @@
+import contextvars
+import threading
+import time
+
+from botocore.exceptions import ClientError
+import pytest
+
+from src import polling
+
+
+@pytest.fixture
+def mock_sleep(mocker):
+    return mocker.patch('src.polling.time.sleep')
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code}}, 'DescribeStacks')
+
+
+def test_returns_first_result_that_is_not_none(mock_sleep):
+    results = iter([None, None, 'CREATE_COMPLETE'])
+    poller = polling.Poller(initial_delay=1, max_delay=30)
+
+    assert poller.poll(lambda: next(results)) == 'CREATE_COMPLETE'
+    assert mock_sleep.call_count == 2
+
+
+def test_delay_grows_exponentially_up_to_maximum(mock_sleep):
+    results = iter([None] * 6 + [True])
+    poller = polling.Poller(initial_delay=1, max_delay=8)
+    poller.poll(lambda: next(results))
+
+    delays = [call.args[0] for call in mock_sleep.call_args_list]
+    upper_bounds = [1, 2, 4, 8, 8, 8]
+    for delay, upper_bound in zip(delays, upper_bounds):
+        assert upper_bound / 2 <= delay <= upper_bound
+
+
+def test_retries_throttled_requests(mock_sleep):
+    calls = []
+
+    def check():
+        calls.append(1)
+        if len(calls) < 3:
+            raise client_error('Throttling')
+        return 'done'
+
+    assert polling.Poller().poll(check) == 'done'
+
+
+def test_other_errors_are_raised(mock_sleep):
+    def check():
+        raise client_error('ValidationError')
+
+    with pytest.raises(ClientError):
+        polling.Poller().poll(check)
+
+
+def test_raises_timeout_after_deadline(mock_sleep):
+    poller = polling.Poller(initial_delay=10, timeout=5)
+
+    with pytest.raises(polling.PollingTimeout):
+        poller.poll(lambda: None, 'stack')
+
+
+def test_stops_waiting_once_stop_event_is_set():
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    poller = polling.Poller(initial_delay=60, max_delay=60)
+
+    def poll():
+        polling.stop_event.set(stop)
+        return poller.poll(lambda: None, 'certificate validation')
+
+    start = time.monotonic()
+    with pytest.raises(polling.PollingCancelled):
+        contextvars.Context().run(poll)
+    assert time.monotonic() - start < 5
@@ -0,0 +1,151 @@
+import io
+
+import pytest
+
+from src import progress
+
+
+class Terminal(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+@pytest.fixture
+def stream():
+    return io.StringIO()
+
+
+def upload(tracker, key, size, reported=None):
+    transfer = tracker.start_file()
+    transfer(size if reported is None else reported)
+    tracker.file_uploaded(key, size, transfer)
+
+
+@pytest.mark.parametrize('count, expected', [
+    (512, '512 B'),
+    (2048, '2.0 KB'),
+    (5 * 1024 * 1024, '5.0 MB'),
+])
+def test_format_bytes(count, expected):
+    assert progress.format_bytes(count) == expected
+
+
+@pytest.mark.parametrize('seconds, expected', [
+    (0.25, '250 ms'),
+    (4.25, '4.2s'),
+    (185, '3m05s'),
+    (7500, '2h05m'),
+])
+def test_format_duration(seconds, expected):
+    assert progress.format_duration(seconds) == expected
+
+
+def test_counts_files_and_bytes(stream):
+    tracker = progress.UploadProgress(stream)
+    for _ in range(3):
+        tracker.file_found()
+    upload(tracker, 'a.html', 100)
+    upload(tracker, 'b.html', 200)
+    tracker.file_skipped()
+
+    assert tracker.files_uploaded == 2
+    assert tracker.files_skipped == 1
+    assert tracker.bytes_uploaded == 300
+    assert tracker.status_line().startswith('3/3+ files, 300 B')
+
+
+def test_bytes_are_exact_once_files_finish(stream):
+    tracker = progress.UploadProgress(stream)
+
+    # Some bytes were not reported and some were sent twice.
+    upload(tracker, 'a.html', 100, reported=40)
+    upload(tracker, 'b.html', 100, reported=150)
+
+    assert tracker.bytes_uploaded == 200
+
+
+def test_failed_files_do_not_count_towards_bytes(stream):
+    tracker = progress.UploadProgress(stream)
+    transfer = tracker.start_file()
+    transfer(100)
+
+    tracker.file_failed(transfer)
+
+    assert tracker.bytes_uploaded == 0
+    assert tracker.files_failed == 1
+
+
+def test_estimates_time_remaining_once_every_file_is_found(stream):
+    tracker = progress.UploadProgress(stream)
+    for _ in range(4):
+        tracker.file_found()
+    upload(tracker, 'a.html', 100)
+    assert 'ETA' not in tracker.status_line()
+
+    tracker.all_files_found()
+
+    assert '1/4 files' in tracker.status_line()
+    assert 'ETA' in tracker.status_line()
+
+
+def test_reports_retries(stream):
+    tracker = progress.UploadProgress(stream)
+    assert 'retries' not in tracker.status_line()
+
+    tracker.add_retries(2)
+
+    assert '2 retries' in tracker.status_line()
+
+
+def test_throttles_redraws(stream):
+    tracker = progress.UploadProgress(stream, interval=60)
+    for index in range(100):
+        upload(tracker, f'{index}.html', 10)
+
+    assert stream.getvalue() == ''
+
+
+def test_prints_new_lines_when_not_a_terminal(stream):
+    tracker = progress.UploadProgress(stream, interval=0)
+    upload(tracker, 'a.html', 10)
+
+    assert stream.getvalue().startswith('Upload progress: ')
+    assert stream.getvalue().endswith('\n')
+
+
+def test_redraws_status_line_in_place_on_a_terminal():
+    terminal = Terminal()
+    tracker = progress.UploadProgress(terminal, interval=0)
+    upload(tracker, 'a.html', 10)
+
+    assert terminal.getvalue().startswith('\r')
+    assert '\n' not in terminal.getvalue()
+
+
+def test_summary_includes_histogram_and_slowest_files(stream, mocker):
+    mock_monotonic = mocker.patch('src.progress.time.monotonic')
+    mock_monotonic.return_value = 0
+    tracker = progress.UploadProgress(stream, slowest_file_count=2)
+    for key, duration in [('a', 0.005), ('b', 0.3), ('c', 2), ('d', 0.006)]:
+        mock_monotonic.return_value = 0
+        transfer = tracker.start_file()
+        mock_monotonic.return_value = duration
+        tracker.file_uploaded(key, 10, transfer)
+
+    lines = tracker.summary()
+
+    assert lines[1] == 'Upload time per file:'
+    assert lines[2].split()[-2:] == ['2', '#' * progress.HISTOGRAM_WIDTH]
+    assert len(lines[2:lines.index('Slowest files:')]) == 3
+    slowest = lines[lines.index('Slowest files:') + 1:]
+    assert [line.split()[-1] for line in slowest] == ['c', 'b']
+
+
+def test_finish_prints_summary(stream):
+    tracker = progress.UploadProgress(stream)
+    upload(tracker, 'a.html', 10)
+
+    tracker.finish()
+
+    assert 'Slowest files:' in stream.getvalue()
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from src import stack_events
+
+
+start = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def make_event(number, logical_id, status, seconds):
+    return {
+        'EventId': f'event-{number}',
+        'LogicalResourceId': logical_id,
+        'ResourceType': 'AWS::CloudFront::Distribution',
+        'ResourceStatus': status,
+        'Timestamp': start + timedelta(seconds=seconds),
+    }
+
+
+def test_fetches_only_events_newer_than_last_seen(mocker):
+    client = mocker.Mock()
+    first_events = [make_event(1, 'Distribution', 'CREATE_IN_PROGRESS', 0)]
+    second_events = [
+        make_event(3, 'Distribution', 'CREATE_COMPLETE', 300),
+        make_event(2, 'Bucket', 'CREATE_IN_PROGRESS', 10),
+    ]
+    client.describe_stack_events.side_effect = [
+        {'StackEvents': first_events},
+        # Newest events first; the tailer stops at the last seen event
+        # without requesting the next page.
+        {'StackEvents': second_events + first_events, 'NextToken': 'more'},
+    ]
+    tailer = stack_events.StackEventTailer(client, 'static-website')
+
+    assert [event['EventId'] for event in tailer.fetch_new_events()] == [
+        'event-1'
+    ]
+    assert [event['EventId'] for event in tailer.fetch_new_events()] == [
+        'event-2', 'event-3'
+    ]
+    assert client.describe_stack_events.call_count == 2
+
+
+def test_follows_pages_until_last_seen_event(mocker):
+    client = mocker.Mock()
+    client.describe_stack_events.side_effect = [
+        {
+            'StackEvents': [make_event(2, 'Bucket', 'CREATE_COMPLETE', 5)],
+            'NextToken': 'page-2',
+        },
+        {'StackEvents': [make_event(1, 'Bucket', 'CREATE_IN_PROGRESS', 0)]},
+    ]
+    tailer = stack_events.StackEventTailer(client, 'static-website')
+
+    assert len(tailer.fetch_new_events()) == 2
+    client.describe_stack_events.assert_called_with(
+        StackName='static-website',
+        NextToken='page-2'
+    )
+
+
+def test_records_timeline_of_each_resource(mocker):
+    client = mocker.Mock()
+    client.describe_stack_events.return_value = {'StackEvents': [
+        make_event(4, 'Distribution', 'CREATE_COMPLETE', 300),
+        make_event(3, 'Bucket', 'CREATE_COMPLETE', 20),
+        make_event(2, 'Distribution', 'CREATE_IN_PROGRESS', 15),
+        make_event(1, 'Bucket', 'CREATE_IN_PROGRESS', 0),
+    ]}
+    tailer = stack_events.StackEventTailer(client, 'static-website')
+    tailer.fetch_new_events()
+
+    timeline = tailer.timeline()
+    assert [timing.logical_id for timing in timeline] == [
+        'Bucket', 'Distribution'
+    ]
+    assert (timeline[1].end - timeline[1].start).total_seconds() == 285
+    report = stack_events.format_timeline(timeline)
+    assert report[0] == 'Resource timeline:'
+    assert '285.0s' in report[2]
@@ -0,0 +1,81 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# The longest each command may spend importing modules, in milliseconds.
+# Both are several times what they take on a developer's machine, so
+# that only a real regression, such as an eager import of boto3, fails.
+IAM_IMPORT_BUDGET_MS = 400
+DEPLOY_IMPORT_BUDGET_MS = 1500
+
+
+def import_times(statement):
+    """
+    Runs the statement in a new interpreter with -X importtime and
+    returns a dictionary mapping the name of each module imported to
+    its cumulative import time in microseconds and whether it was
+    imported at the top level.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        top_level = not name[1:].startswith(' ')
+        times[name.strip()] = (int(cumulative), top_level)
+    return times
+
+
+def total_import_time_ms(statement, runs=3):
+    """
+    Returns the shortest time taken to import everything the statement
+    imports, in milliseconds, over several runs.
+    """
+    return min(
+        sum(
+            cumulative for cumulative, top_level
+            in import_times(statement).values() if top_level
+        ) / 1000
+        for _ in range(runs)
+    )
+
+
+def test_main_imports_no_aws_or_template_libraries():
+    modules = import_times('import main')
+
+    assert not [
+        module for module in modules
+        if module.split('.')[0] in ('boto3', 'botocore', 'troposphere')
+    ]
+
+
+def test_iam_command_does_not_import_boto3():
+    modules = import_times('import main, src.iam')
+
+    assert 'troposphere' in modules
+    assert not [
+        module for module in modules
+        if module.split('.')[0] in ('boto3', 'botocore')
+    ]
+
+
+def test_iam_command_imports_within_budget():
+    assert total_import_time_ms('import main, src.iam') < (
+        IAM_IMPORT_BUDGET_MS
+    )
+
+
+def test_deploy_command_imports_within_budget():
+    assert total_import_time_ms('import main, src.create') < (
+        DEPLOY_IMPORT_BUDGET_MS
+    )
@@ -0,0 +1,118 @@
+import hashlib
+
+import pytest
+
+from src import sync, upload
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    (tmp_path / 'index.html').write_bytes(b'<html></html>')
+    (tmp_path / 'style.css').write_bytes(b'body {}')
+    return tmp_path
+
+
+@pytest.fixture
+def mock_client(mocker, source_dir):
+    client = mocker.Mock()
+    paginator = client.get_paginator.return_value
+    paginator.paginate.return_value = [{
+        'Contents': [{
+            'Key': 'index.html',
+            'Size': 13,
+            'ETag': f'"{hashlib.md5(b"<html></html>").hexdigest()}"',
+        }, {
+            'Key': 'style.css',
+            'Size': 7,
+            'ETag': '"00000000000000000000000000000000"',
+        }, {
+            'Key': 'old.html',
+            'Size': 10,
+            'ETag': '"11111111111111111111111111111111"',
+        }]
+    }]
+    client.delete_objects.return_value = {}
+    return client
+
+
+def make_job(source_dir, key):
+    return upload.UploadJob(str(source_dir / key), key, {})
+
+
+def test_computes_etag_of_single_part_upload(source_dir):
+    etag = sync.compute_etag(source_dir / 'index.html', 13)
+
+    assert etag == hashlib.md5(b'<html></html>').hexdigest()
+
+
+def test_computes_etag_of_multipart_upload(tmp_path):
+    chunk_size = upload.MULTIPART_CHUNKSIZE
+    content = b'a' * chunk_size + b'b' * 10
+    filepath = tmp_path / 'video.mp4'
+    filepath.write_bytes(content)
+
+    expected_digest = hashlib.md5(
+        hashlib.md5(content[:chunk_size]).digest()
+        + hashlib.md5(content[chunk_size:]).digest()
+    ).hexdigest()
+    assert sync.compute_etag(filepath, len(content)) == (
+        f'{expected_digest}-2'
+    )
+
+
+def test_only_changed_files_need_uploading(mock_client, source_dir):
+    synchronizer = sync.BucketSynchronizer(mock_client, 'bucket')
+    synchronizer.list_remote_objects()
+
+    assert not synchronizer.has_changed(make_job(source_dir, 'index.html'))
+    assert synchronizer.has_changed(make_job(source_dir, 'style.css'))
+
+    (source_dir / 'new.html').write_bytes(b'new')
+    assert synchronizer.has_changed(make_job(source_dir, 'new.html'))
+
+
+def test_deletes_objects_that_no_longer_exist_locally(
+    mock_client,
+    source_dir
+):
+    synchronizer = sync.BucketSynchronizer(mock_client, 'bucket')
+    synchronizer.list_remote_objects()
+    jobs = [
+        make_job(source_dir, 'index.html'),
+        make_job(source_dir, 'style.css'),
+    ]
+    list(synchronizer.track_local_files(jobs))
+    deleted, errors = synchronizer.delete_removed_objects()
+
+    assert deleted == ['old.html']
+    assert errors == []
+    mock_client.delete_objects.assert_called_once_with(
+        Bucket='bucket',
+        Delete={'Objects': [{'Key': 'old.html'}], 'Quiet': True}
+    )
+
+
+def test_records_whether_every_local_file_was_tracked(source_dir):
+    synchronizer = sync.BucketSynchronizer(None, 'bucket')
+    jobs = synchronizer.track_local_files([
+        make_job(source_dir, 'index.html'),
+        make_job(source_dir, 'style.css'),
+    ])
+
+    next(jobs)
+    assert not synchronizer.tracked_all_local_files
+    list(jobs)
+    assert synchronizer.tracked_all_local_files
+
+
+def test_deletes_objects_in_batches(mocker):
+    client = mocker.Mock()
+    client.delete_objects.return_value = {}
+    synchronizer = sync.BucketSynchronizer(client, 'bucket')
+    synchronizer.remote_objects = {
+        f'{i}.html': sync.RemoteObject(1, 'etag') for i in range(2500)
+    }
+    deleted, _ = synchronizer.delete_removed_objects()
+
+    assert len(deleted) == 2500
+    assert client.delete_objects.call_count == 3
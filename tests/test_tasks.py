@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from src import polling, tasks
+
+
+def test_passes_dependency_results_as_keyword_arguments():
+    graph = tasks.TaskGraph()
+    graph.add('a', lambda: 1)
+    graph.add('b', lambda: 2)
+    graph.add('total', lambda a, b: a + b, ['a', 'b'])
+
+    assert graph.run()['total'] == 3
+
+
+def test_runs_independent_tasks_concurrently():
+    # Both tasks wait for each other, so the graph only finishes if
+    # they run at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+    graph = tasks.TaskGraph()
+    graph.add('first', barrier.wait)
+    graph.add('second', barrier.wait)
+
+    graph.run()
+
+
+def test_waits_for_tasks_named_in_after():
+    order = []
+    graph = tasks.TaskGraph()
+    graph.add('setup', lambda: order.append('setup'))
+    graph.add('work', lambda: order.append('work'), after=['setup'])
+
+    graph.run()
+
+    assert order == ['setup', 'work']
+
+
+def test_failure_cancels_dependent_tasks():
+    ran = []
+    graph = tasks.TaskGraph()
+
+    def fail():
+        raise SystemExit('certificate request failed')
+
+    graph.add('certificate', fail)
+    graph.add('independent', lambda: ran.append('independent'))
+    graph.add('stack', lambda: ran.append('stack'), after=['certificate'])
+    graph.add('upload', lambda: ran.append('upload'), after=['stack'])
+
+    with pytest.raises(SystemExit, match='certificate request failed'):
+        graph.run()
+    assert ran == ['independent']
+
+
+def test_failure_cancels_independent_waiting_tasks():
+    ran = []
+    preparing_failed = threading.Event()
+    graph = tasks.TaskGraph()
+
+    def prepare():
+        preparing_failed.set()
+        raise SystemExit('preparing files failed')
+
+    def wait_for_certificate():
+        # Still running when the failure is noticed.
+        preparing_failed.wait(5)
+        time.sleep(0.1)
+        ran.append('certificate')
+
+    graph.add('prepare', prepare)
+    graph.add('certificate', wait_for_certificate)
+    graph.add('stack', lambda: ran.append('stack'), after=['certificate'])
+    graph.add('upload', lambda: ran.append('upload'), after=['prepare'])
+
+    with pytest.raises(SystemExit, match='preparing files failed'):
+        graph.run()
+    assert ran == ['certificate']
+
+
+def test_rejects_unknown_dependencies():
+    graph = tasks.TaskGraph()
+
+    with pytest.raises(ValueError):
+        graph.add('stack', lambda template: None, ['template'])
+
+
+def poll_until_stopped(stopped):
+    try:
+        polling.Poller(initial_delay=60, max_delay=60).poll(lambda: None)
+    except polling.PollingCancelled:
+        stopped.set()
+        raise
+
+
+def test_failure_stops_tasks_that_are_polling():
+    polling_started = threading.Event()
+    stopped = threading.Event()
+    graph = tasks.TaskGraph()
+
+    def wait_for_certificate():
+        polling_started.set()
+        poll_until_stopped(stopped)
+
+    def prepare():
+        polling_started.wait(5)
+        raise SystemExit('preparing files failed')
+
+    graph.add('certificate', wait_for_certificate)
+    graph.add('prepare', prepare)
+
+    start = time.monotonic()
+    with pytest.raises(SystemExit, match='preparing files failed'):
+        graph.run()
+    assert stopped.is_set()
+    assert time.monotonic() - start < 5
+
+
+def test_interruption_stops_tasks_that_are_polling(mocker):
+    polling_started = threading.Event()
+    stopped = threading.Event()
+    graph = tasks.TaskGraph()
+
+    def wait_for_certificate():
+        polling_started.set()
+        poll_until_stopped(stopped)
+
+    def interrupt(*args, **kwargs):
+        polling_started.wait(5)
+        raise KeyboardInterrupt
+
+    mocker.patch('src.tasks.futures.wait', side_effect=interrupt)
+    graph.add('certificate', wait_for_certificate)
+
+    with pytest.raises(KeyboardInterrupt):
+        graph.run()
+    assert stopped.wait(5)
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from src import tasks, tracing
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.start()
+    yield tracer
+    tracing.stop()
+
+
+def test_records_nothing_without_a_tracer():
+    assert tracing.stop() is None
+    with tracing.span('step') as span:
+        pass
+
+    assert not isinstance(span, tracing.Span)
+
+
+def test_records_span_name_category_and_arguments(tracer):
+    with tracing.span('upload', tracing.STEP, files=3):
+        pass
+
+    [(name, category, start, duration, _, args)] = tracer.spans
+    assert (name, category, args) == ('upload', tracing.STEP, {'files': 3})
+    assert start >= 0
+    assert duration >= 0
+
+
+def test_records_error_of_failed_span(tracer):
+    with pytest.raises(ValueError):
+        with tracing.span('step'):
+            raise ValueError()
+
+    assert tracer.spans[0][5] == {'error': 'ValueError'}
+
+
+def test_only_records_file_spans_if_detailed(tracer):
+    with tracing.span('upload_file', tracing.FILE, key='index.html'):
+        pass
+    assert tracer.spans == []
+
+    detailed_tracer = tracing.start(detailed=True)
+    with tracing.span('upload_file', tracing.FILE, key='index.html'):
+        pass
+    assert len(detailed_tracer.spans) == 1
+
+
+def test_nested_spans_lie_within_their_parent(tracer):
+    with tracing.span('outer'):
+        with tracing.span('inner'):
+            pass
+
+    spans = {span[0]: span for span in tracer.spans}
+    _, _, outer_start, outer_duration, _, _ = spans['outer']
+    _, _, inner_start, inner_duration, _, _ = spans['inner']
+    assert outer_start <= inner_start
+    assert inner_start + inner_duration <= outer_start + outer_duration
+
+
+def test_task_graph_records_a_phase_for_each_task(tracer):
+    graph = tasks.TaskGraph()
+    graph.add('first', lambda: 1)
+    graph.add('second', lambda first: first + 1, ['first'])
+
+    graph.run()
+
+    phases = sorted(
+        span[0] for span in tracer.spans if span[1] == tracing.PHASE
+    )
+    assert phases == ['first', 'second']
+
+
+def test_writes_chrome_trace(tracer, tmp_path):
+    with tracing.span('step', key='index.html'):
+        pass
+    filepath = tmp_path / 'trace.json'
+
+    tracer.write_chrome_trace(filepath)
+
+    trace = json.loads(filepath.read_text())
+    [metadata] = [e for e in trace['traceEvents'] if e['ph'] == 'M']
+    [event] = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert metadata['name'] == 'thread_name'
+    assert metadata['tid'] == event['tid']
+    assert event['name'] == 'step'
+    assert event['cat'] == tracing.STEP
+    assert event['args'] == {'key': 'index.html'}
+    assert {'ts', 'dur', 'pid'} <= set(event)
+
+
+def test_phase_summary_lists_phases_in_order_of_start(tracer):
+    with tracing.span('certificate', tracing.PHASE):
+        pass
+    with tracing.span('upload', tracing.PHASE):
+        with tracing.span('upload_files'):
+            pass
+
+    lines = tracer.phase_summary()
+
+    assert lines[0] == 'Phase timings:'
+    assert [line.split()[0] for line in lines[1:]] == [
+        'certificate',
+        'upload',
+        'total',
+    ]
+
+
+def test_phase_summary_is_empty_without_phases(tracer):
+    assert tracer.phase_summary() == []
+
+
+def test_writes_counters(tracer):
+    tracing.counter('upload_concurrency', limit=4)
+    tracing.counter('upload_concurrency', limit=8)
+
+    events = tracer.chrome_trace()['traceEvents']
+
+    assert [(e['ph'], e['args']) for e in events] == [
+        ('C', {'limit': 4}),
+        ('C', {'limit': 8}),
+    ]
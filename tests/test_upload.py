@@ -0,0 +1,217 @@
+import contextvars
+import io
+import threading
+import time
+
+import pytest
+
+from src import batch, concurrency, multipart, progress, upload
+
+
+@pytest.fixture
+def mock_s3_client(mocker):
+    mock_get_client = mocker.patch('src.upload.clients.get_client')
+    return mock_get_client.return_value
+
+
+def make_jobs(count):
+    return [
+        upload.UploadJob(f'source_dir/{i}.html', f'{i}.html', {})
+        for i in range(count)
+    ]
+
+
+def test_connection_pool_matches_worker_count(mocker):
+    mock_get_client = mocker.patch('src.upload.clients.get_client')
+    upload.S3Uploader('bucket', max_workers=7)
+
+    mock_get_client.assert_called_once_with('s3', max_pool_connections=7)
+
+
+def test_uploads_every_file(mock_s3_client):
+    uploader = upload.S3Uploader('bucket', max_workers=3)
+    result = uploader.upload(make_jobs(20))
+
+    assert result.failures == []
+    assert len(result.uploaded) == 20
+    assert mock_s3_client.upload_file.call_count == 20
+    uploaded_keys = {
+        call.args[2] for call in mock_s3_client.upload_file.call_args_list
+    }
+    assert uploaded_keys == {f'{i}.html' for i in range(20)}
+
+
+def test_number_of_concurrent_uploads_is_bounded(mock_s3_client):
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def slow_upload(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    mock_s3_client.upload_file.side_effect = slow_upload
+    uploader = upload.S3Uploader('bucket', max_workers=2)
+    uploader.upload(make_jobs(10))
+
+    assert peak[0] <= 2
+
+
+def test_collects_every_failure(mock_s3_client):
+    def fail_on_odd_files(filepath, bucket, key, **kwargs):
+        if int(key.split('.')[0]) % 2:
+            raise OSError(f'could not read {filepath}')
+
+    mock_s3_client.upload_file.side_effect = fail_on_odd_files
+    uploader = upload.S3Uploader('bucket', max_workers=4)
+    result = uploader.upload(make_jobs(10))
+
+    assert sorted(failure.key for failure in result.failures) == [
+        '1.html', '3.html', '5.html', '7.html', '9.html'
+    ]
+    assert all(
+        isinstance(failure.error, OSError) for failure in result.failures
+    )
+    assert len(result.uploaded) == 5
+
+
+def test_skips_files_rejected_by_should_upload(mock_s3_client):
+    uploader = upload.S3Uploader('bucket', max_workers=2)
+    result = uploader.upload(
+        make_jobs(4),
+        should_upload=lambda job: job.key != '2.html'
+    )
+
+    assert result.skipped == ['2.html']
+    assert mock_s3_client.upload_file.call_count == 3
+
+
+def test_reports_progress(mock_s3_client, tmp_path):
+    jobs = []
+    for index in range(3):
+        filepath = tmp_path / f'{index}.html'
+        filepath.write_bytes(b'x' * 100)
+        jobs.append(upload.UploadJob(str(filepath), f'{index}.html', {}))
+    tracker = progress.UploadProgress(io.StringIO())
+    uploader = upload.S3Uploader('bucket', progress=tracker)
+
+    uploader.upload(jobs, should_upload=lambda job: job.key != '0.html')
+
+    assert tracker.files_found == 3
+    assert tracker.finished_finding
+    assert tracker.files_uploaded == 2
+    assert tracker.files_skipped == 1
+    assert tracker.bytes_uploaded == 200
+    callbacks = [
+        call.kwargs['Callback']
+        for call in mock_s3_client.upload_file.call_args_list
+    ]
+    assert all(isinstance(c, progress.FileTransfer) for c in callbacks)
+
+
+def test_counts_retries_of_requests_made_for_the_upload(mocker):
+    tracker = progress.UploadProgress(io.StringIO())
+    token = upload._current_uploader.set(mocker.Mock(progress=tracker))
+    try:
+        upload._count_retries(parsed={'ResponseMetadata': {
+            'RetryAttempts': 2,
+        }})
+    finally:
+        upload._current_uploader.reset(token)
+    upload._count_retries(parsed={'ResponseMetadata': {'RetryAttempts': 1}})
+
+    assert tracker.retries == 2
+
+
+def test_uploads_within_concurrency_limit(mocker, mock_s3_client, tmp_path):
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def slow_upload(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    mock_s3_client.upload_file.side_effect = slow_upload
+    jobs = []
+    for index in range(20):
+        filepath = tmp_path / f'{index}.html'
+        filepath.write_bytes(b'x')
+        jobs.append(upload.UploadJob(str(filepath), f'{index}.html', {}))
+    limiter = concurrency.AdaptiveConcurrencyLimiter(2, ceiling=4)
+    # Keep the limit where it starts.
+    mocker.patch.object(limiter, '_record')
+    uploader = upload.S3Uploader('bucket', max_workers=1, concurrency=limiter)
+
+    result = uploader.upload(jobs)
+
+    assert uploader.max_workers == 4
+    assert len(result.uploaded) == 20
+    assert peak[0] <= 2
+
+
+@pytest.mark.parametrize('status_code, error_code, throttled', [
+    (503, 'SlowDown', True),
+    (400, 'RequestLimitExceeded', True),
+    (400, 'InvalidArgument', False),
+    (200, None, False),
+])
+def test_detects_throttled_requests(mocker, status_code, error_code,
+                                    throttled):
+    limiter = concurrency.AdaptiveConcurrencyLimiter(8)
+    token = upload._current_uploader.set(mocker.Mock(concurrency=limiter))
+    parsed = {'Error': {'Code': error_code}} if error_code else {}
+    try:
+        upload._detect_throttling(
+            response=(mocker.Mock(status_code=status_code), parsed)
+        )
+    finally:
+        upload._current_uploader.reset(token)
+
+    assert (limiter.limit == 4) == throttled
+
+
+def test_uploads_large_files_through_journal(mocker, mock_s3_client,
+                                             tmp_path):
+    mocker.patch('src.upload.MULTIPART_THRESHOLD', 10)
+    small_file = tmp_path / 'index.html'
+    small_file.write_bytes(b'x' * 10)
+    large_file = tmp_path / 'video.mp4'
+    large_file.write_bytes(b'x' * 11)
+    uploader = upload.S3Uploader(
+        'bucket',
+        journal=multipart.UploadJournal(str(tmp_path / 'uploads.db'))
+    )
+    mock_multipart = mocker.patch.object(uploader, 'multipart')
+
+    uploader.upload([
+        upload.UploadJob(str(small_file), 'index.html', {}),
+        upload.UploadJob(str(large_file), 'video.mp4', {}),
+    ])
+
+    assert mock_s3_client.upload_file.call_args.args[2] == 'index.html'
+    job, size = mock_multipart.upload.call_args.args
+    assert (job.key, size) == ('video.mp4', 11)
+
+
+def test_uploads_files_in_context_of_caller(mock_s3_client):
+    sites = []
+    mock_s3_client.upload_file.side_effect = (
+        lambda *args, **kwargs: sites.append(batch.current_site.get())
+    )
+
+    def deploy():
+        batch.current_site.set('example.com')
+        upload.S3Uploader('bucket', max_workers=2).upload(make_jobs(3))
+
+    contextvars.Context().run(deploy)
+
+    assert sites == ['example.com'] * 3
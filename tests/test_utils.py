@@ -0,0 +1,266 @@
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+import pytest
+from troposphere import Template
+
+from src import cache, stack_events, utils
+
+
+def make_template(description='body'):
+    template = Template()
+    template.set_description(description)
+    return template
+
+
+def fingerprint_of(description='body'):
+    return utils.template_fingerprint(make_template(description).to_yaml())
+
+
+@pytest.fixture
+def stack_creator(mocker):
+    instance = utils.CloudFormationStackCreator()
+    client = mocker.patch('src.utils.clients.get_client').return_value
+    mocker.patch.object(instance, '_wait_for_stack')
+    return instance, client
+
+
+def describe_stacks_response(fingerprint=None, status='CREATE_COMPLETE'):
+    stack = {'StackName': 'static-website', 'StackStatus': status}
+    if fingerprint is not None:
+        stack['Outputs'] = [{
+            'OutputKey': utils.FINGERPRINT_OUTPUT,
+            'OutputValue': fingerprint,
+        }]
+    return {'Stacks': [stack]}
+
+
+def test_fingerprint_depends_on_template_and_parameters():
+    fingerprint = utils.template_fingerprint('body', {'a': '1', 'b': '2'})
+
+    assert fingerprint == utils.template_fingerprint(
+        'body',
+        {'b': '2', 'a': '1'}
+    )
+    assert fingerprint != utils.template_fingerprint('body', {'a': '1'})
+    assert fingerprint != utils.template_fingerprint('other', {'a': '1'})
+
+
+def test_creates_stack_that_does_not_exist(stack_creator):
+    instance, client = stack_creator
+    client.describe_stacks.side_effect = ClientError(
+        {'Error': {
+            'Code': 'ValidationError',
+            'Message': 'Stack with id static-website does not exist',
+        }},
+        'DescribeStacks'
+    )
+    instance._wait_for_stack.return_value = 'CREATE_COMPLETE'
+
+    status = instance.deploy_stack(make_template(), 'static-website')
+
+    assert status == utils.STACK_CREATED
+    kwargs = client.create_stack.call_args.kwargs
+    # The fingerprint is kept off the stack's tags, which CloudFormation
+    # would copy to every resource.
+    assert 'Tags' not in kwargs
+    assert f'Value: {fingerprint_of()}' in kwargs['TemplateBody']
+    client.create_change_set.assert_not_called()
+
+
+def test_skips_stack_deployed_from_same_template(stack_creator):
+    instance, client = stack_creator
+    client.describe_stacks.return_value = describe_stacks_response(
+        fingerprint_of()
+    )
+
+    status = instance.deploy_stack(make_template(), 'static-website')
+
+    assert status == utils.STACK_UNCHANGED
+    client.create_stack.assert_not_called()
+    client.create_change_set.assert_not_called()
+
+
+def test_fingerprint_does_not_depend_on_its_own_output(stack_creator):
+    instance, _ = stack_creator
+    template = make_template()
+
+    first = instance._render_template(template, None)
+
+    assert instance._render_template(template, None) == first
+    assert first[1] == fingerprint_of()
+
+
+def test_updates_changed_stack_with_change_set(stack_creator, capsys):
+    instance, client = stack_creator
+    client.describe_stacks.return_value = describe_stacks_response('old')
+    client.describe_stack_events.return_value = {'StackEvents': []}
+    client.describe_change_set.return_value = {
+        'Status': 'CREATE_COMPLETE',
+        'Changes': [{
+            'ResourceChange': {
+                'Action': 'Modify',
+                'LogicalResourceId': 'S3Bucket',
+                'ResourceType': 'AWS::S3::Bucket',
+                'Replacement': 'True',
+            },
+        }],
+    }
+    instance._wait_for_stack.return_value = 'UPDATE_COMPLETE'
+
+    status = instance.deploy_stack(make_template(), 'static-website')
+
+    assert status == utils.STACK_UPDATED
+    kwargs = client.create_change_set.call_args.kwargs
+    assert 'Tags' not in kwargs
+    assert f'Value: {fingerprint_of()}' in kwargs['TemplateBody']
+    client.execute_change_set.assert_called_once()
+    output = capsys.readouterr().out
+    assert 'S3Bucket (AWS::S3::Bucket) [REPLACEMENT]' in output
+
+
+def test_deletes_change_set_without_changes(stack_creator):
+    instance, client = stack_creator
+    client.describe_stacks.return_value = describe_stacks_response('old')
+    client.describe_change_set.return_value = {
+        'Status': 'FAILED',
+        'StatusReason': (
+            "The submitted information didn't contain changes. Submit "
+            'different information to create a change set.'
+        ),
+    }
+
+    status = instance.deploy_stack(make_template(), 'static-website')
+
+    assert status == utils.STACK_UNCHANGED
+    client.delete_change_set.assert_called_once()
+    client.execute_change_set.assert_not_called()
+
+
+def test_refuses_to_update_stack_in_progress(stack_creator):
+    instance, client = stack_creator
+    client.describe_stacks.return_value = describe_stacks_response(
+        'old',
+        status='UPDATE_IN_PROGRESS'
+    )
+
+    with pytest.raises(SystemExit):
+        instance.deploy_stack(make_template(), 'static-website')
+    client.create_change_set.assert_not_called()
+
+
+def test_stack_outputs_are_read_once(stack_creator, tmp_path, mocker):
+    mocker.patch(
+        'src.utils.clients.get_account_id',
+        return_value='111111111111'
+    )
+    instance, client = stack_creator
+    instance.lookup_cache = cache.LookupCache(tmp_path / 'lookups.json')
+    response = describe_stacks_response()
+    response['Stacks'][0]['Outputs'] = [
+        {'OutputKey': 'S3BucketName', 'OutputValue': 'bucket'},
+        {'OutputKey': 'CloudFrontDistributionId', 'OutputValue': 'E123'},
+    ]
+    client.describe_stacks.return_value = response
+
+    assert instance._get_stack_output('static-website', 'S3BucketName') == (
+        'bucket'
+    )
+    assert instance._get_stack_output(
+        'static-website',
+        'CloudFrontDistributionId'
+    ) == 'E123'
+    assert client.describe_stacks.call_count == 1
+
+
+def test_stack_outputs_are_cached_per_account(stack_creator, tmp_path,
+                                              mocker):
+    get_account_id = mocker.patch('src.utils.clients.get_account_id')
+    instance, client = stack_creator
+    instance.lookup_cache = cache.LookupCache(tmp_path / 'lookups.json')
+    response = describe_stacks_response()
+    response['Stacks'][0]['Outputs'] = [
+        {'OutputKey': 'S3BucketName', 'OutputValue': 'bucket'},
+    ]
+    client.describe_stacks.return_value = response
+
+    get_account_id.return_value = '111111111111'
+    instance._get_stack_output('static-website', 'S3BucketName')
+    get_account_id.return_value = '222222222222'
+    instance._get_stack_output('static-website', 'S3BucketName')
+
+    assert client.describe_stacks.call_count == 2
+
+
+STACK_ID = 'arn:aws:cloudformation:us-east-1:1234:stack/static-website/1'
+
+
+def stack_event(number, logical_id, status):
+    return {
+        'EventId': f'event-{number}',
+        'LogicalResourceId': logical_id,
+        'ResourceType': 'AWS::CloudFormation::Stack',
+        'ResourceStatus': status,
+        'Timestamp': datetime(2024, 1, 1, 12, 0, number),
+    }
+
+
+def stack_does_not_exist(operation_name):
+    return ClientError(
+        {'Error': {
+            'Code': 'ValidationError',
+            'Message': 'Stack with id static-website does not exist',
+        }},
+        operation_name
+    )
+
+
+def test_reports_failed_creation_of_deleted_stack(mocker, capsys):
+    mocker.patch('src.polling.time.sleep')
+    client = mocker.patch('src.utils.clients.get_client').return_value
+    instance = utils.CloudFormationStackCreator()
+    client.create_stack.return_value = {'StackId': STACK_ID}
+    client.describe_stacks.side_effect = stack_does_not_exist(
+        'DescribeStacks'
+    )
+    pages = iter([
+        [
+            stack_event(3, 'static-website', 'DELETE_IN_PROGRESS'),
+            stack_event(2, 'Bucket', 'CREATE_FAILED'),
+            stack_event(1, 'static-website', 'CREATE_IN_PROGRESS'),
+        ],
+        [
+            stack_event(4, 'static-website', 'DELETE_COMPLETE'),
+            stack_event(3, 'static-website', 'DELETE_IN_PROGRESS'),
+        ],
+    ])
+
+    def describe_stack_events(StackName):
+        # Deleted stacks can only be found by their ID.
+        if StackName != STACK_ID:
+            raise stack_does_not_exist('DescribeStackEvents')
+        return {'StackEvents': next(pages)}
+
+    client.describe_stack_events.side_effect = describe_stack_events
+
+    with pytest.raises(SystemExit, match='Stack creation failed'):
+        instance.deploy_stack(make_template(), 'static-website')
+    assert 'CREATE_FAILED' in capsys.readouterr().out
+
+
+def test_stack_that_can_no_longer_be_described_was_deleted(mocker):
+    mocker.patch('src.polling.time.sleep')
+    client = mocker.patch('src.utils.clients.get_client').return_value
+    instance = utils.CloudFormationStackCreator()
+    client.describe_stack_events.return_value = {'StackEvents': [
+        stack_event(1, 'static-website', 'ROLLBACK_COMPLETE'),
+    ]}
+    client.describe_stacks.side_effect = stack_does_not_exist(
+        'DescribeStacks'
+    )
+    tailer = stack_events.StackEventTailer(client, STACK_ID)
+
+    status = instance._wait_for_stack('static-website', tailer, STACK_ID)
+
+    assert status == 'DELETE_COMPLETE'
+    client.describe_stacks.assert_called_once_with(StackName=STACK_ID)
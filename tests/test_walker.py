@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from src import walker
+
+
+def write_file(path, content='content'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def walk_keys(root, **kwargs):
+    return sorted(
+        record.key
+        for record in walker.SourceTreeWalker(root, **kwargs).walk()
+    )
+
+
+def test_keys_are_relative_to_root(tmp_path):
+    # The name of the root directory appears again inside the tree.
+    root = tmp_path / 'site'
+    write_file(root / 'index.html')
+    write_file(root / 'blog' / 'site' / 'post.html')
+
+    assert walk_keys(root) == ['blog/site/post.html', 'index.html']
+
+
+def test_records_describe_files(tmp_path):
+    write_file(tmp_path / 'css' / 'style.css', 'body {}')
+    write_file(tmp_path / 'data.unknownextension')
+
+    records = {
+        record.key: record
+        for record in walker.SourceTreeWalker(tmp_path).walk()
+    }
+
+    style = records['css/style.css']
+    assert style.path == os.path.join(tmp_path, 'css', 'style.css')
+    assert style.size == 7
+    assert style.mtime_ns == os.stat(style.path).st_mtime_ns
+    assert style.mime_type == 'text/css'
+    assert records['data.unknownextension'].mime_type == (
+        'application/octet-stream'
+    )
+
+
+def test_ignores_default_and_custom_patterns(tmp_path):
+    write_file(tmp_path / 'index.html')
+    write_file(tmp_path / '.git' / 'HEAD')
+    write_file(tmp_path / 'images' / '.DS_Store')
+    write_file(tmp_path / 'drafts' / 'post.html')
+    write_file(tmp_path / 'notes.md')
+
+    assert walk_keys(
+        tmp_path,
+        ignore_patterns=['drafts', '*.md']
+    ) == ['index.html']
+
+
+def test_symlinked_directories_are_only_followed_when_enabled(tmp_path):
+    root = tmp_path / 'site'
+    write_file(root / 'index.html')
+    write_file(tmp_path / 'shared' / 'logo.svg')
+    try:
+        os.symlink(tmp_path / 'shared', root / 'shared')
+        # A link back to the root must not be followed forever.
+        os.symlink(root, root / 'loop')
+        os.symlink(tmp_path / 'shared' / 'logo.svg', root / 'logo.svg')
+        os.symlink(tmp_path / 'missing', root / 'broken')
+    except OSError:
+        pytest.skip('Symbolic links are not supported')
+
+    assert walk_keys(root) == ['index.html', 'logo.svg']
+    assert walk_keys(root, follow_symlinks=True) == [
+        'index.html',
+        'logo.svg',
+        'shared/logo.svg',
+    ]
+
+
+def test_files_are_yielded_before_the_tree_is_read(tmp_path):
+    write_file(tmp_path / 'index.html')
+    write_file(tmp_path / 'blog' / 'post.html')
+    records = walker.SourceTreeWalker(tmp_path).walk()
+
+    first = next(records)
+    # Directories that have not been read yet can still change.
+    write_file(tmp_path / 'blog' / 'new.html')
+
+    assert first.key == 'index.html'
+    assert sorted(record.key for record in records) == [
+        'blog/new.html',
+        'blog/post.html',
+    ]